@@ -3,15 +3,28 @@ import secrets
 import mysql.connector
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from modules.session import session_required
+from modules.session import session_required, invalidate_session
+from modules.auth_utils import get_cached_user, cache_user, invalidate_user
 from modules.config import Config
-from modules.db import get_db_connection
+from modules.db import get_db_connection, get_auth_connection, pool_stats, release_connections
+from modules.statements import USUARIO_POR_ID, USUARIO_POR_NOME, statements
+from modules.rate_engine import QuoteRanking, rate_engine
+from modules.coverage import coverage_index
+from modules.quote_cache import quote_cache, refresh_coverage
+from modules.rows import Rows, rows_response
+from modules.cep_index import cep_index
+from modules.http_cache import conditional, bump_dataset
+from modules import json_provider
+from modules.metrics import metrics
+from modules.sql_trace import query_tracer
+from modules.counters import refresh_counters, refresh_tabela_counters, tabela_refs
+from modules.tariff_writer import insert_faixas, insert_taxas, replace_faixas, replace_taxas, sync_faixas, sync_taxas
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)
@@ -27,6 +40,18 @@ login_manager.login_view = 'login'
 # Configuração de proteção CSRF
 csrf = CSRFProtect(app)
 
+# Métricas (GET /metrics)
+metrics.init_app(app)
+
+# Rastreamento de SQL e log de consultas lentas
+query_tracer.init_app(app)
+
+# Serialização JSON das respostas (orjson, quando instalado)
+json_provider.init_app(app)
+
+# Conexões do pool que o handler não devolveu voltam no fim do contexto
+app.teardown_appcontext(release_connections)
+
 
 # Classe de usuário para Flask-Login
 class User(UserMixin):
@@ -37,21 +62,20 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = mysql.connector.connect(**Config.AUTH_DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM auth.users WHERE id = %s", (user_id,))
-    user = cursor.fetchone()
-    cursor.close()
+    cached = get_cached_user(user_id)
+    if cached:
+        return cached
+
+    conn = get_auth_connection()
+    user = statements.fetchone(conn, USUARIO_POR_ID, (user_id,))
     conn.close()
     
     if user:
-        return User(user['id'], user['username'], user['role'])
+        user_obj = User(user['id'], user['username'], user['role'])
+        cache_user(user_obj)
+        return user_obj
     return None
 
-# Função para obter conexão com o banco de dados
-def get_db_connection():  # noqa: F811
-    return mysql.connector.connect(**Config.DB_CONFIG)
-
 # Decorator para verificar permissões de admin
 def admin_required(f):
     @wraps(f)
@@ -92,10 +116,7 @@ def login():
         password = data.get('password')
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM auth.users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
+        user = statements.fetchone(conn, USUARIO_POR_NOME, (username,))
         conn.close()
 
         if user and check_password_hash(user['password'], password):
@@ -130,6 +151,7 @@ def logout():
     cursor = conn.cursor()
     cursor.execute("DELETE FROM auth.sessions WHERE id = %s", (session.sid,))
     conn.commit()
+    invalidate_session(session.sid)
     cursor.close()
     conn.close()
     
@@ -141,15 +163,15 @@ def logout():
 @login_required
 def get_transportadoras():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM transporte.transportadoras")
-    transportadoras = cursor.fetchall()
+    transportadoras = Rows.fetch(cursor)
     
     cursor.close()
     conn.close()
     
-    return jsonify({'transportadoras': transportadoras})
+    return rows_response('transportadoras', transportadoras)
 
 @app.route('/api/transportadoras/<int:id>', methods=['GET'])
 @login_required
@@ -231,6 +253,7 @@ def update_transportadora(id):
             )
         )
         conn.commit()
+        coverage_index.invalidate()
         
         cursor.close()
         conn.close()
@@ -252,6 +275,8 @@ def delete_transportadora(id):
     try:
         cursor.execute("DELETE FROM transporte.transportadoras WHERE ID = %s", (id,))
         conn.commit()
+        coverage_index.invalidate()
+        quote_cache.clear()
         
         cursor.close()
         conn.close()
@@ -268,15 +293,15 @@ def delete_transportadora(id):
 @login_required
 def get_pracas():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM praca")
-    pracas = cursor.fetchall()
+    pracas = Rows.fetch(cursor)
     
     cursor.close()
     conn.close()
     
-    return jsonify({'pracas': pracas})
+    return rows_response('pracas', pracas)
 
 @app.route('/api/pracas/<int:id>', methods=['GET'])
 @login_required
@@ -331,17 +356,21 @@ def create_praca():
                 "INSERT INTO transporte.praca_municipio (id_praca, CodMunicipio) VALUES (%s, %s)",
                 (praca_id, municipio_id)
             )
+        refresh_counters(conn, 'praca', [praca_id])
         conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'success': True, 'id': praca_id}), 201
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         cursor.close()
         conn.close()
         return jsonify({'error': str(err)}), 400
+    
+    # Fora do try: a escrita já foi confirmada
+    refresh_coverage(conn, [praca_id])
+    cursor.close()
+    conn.close()
+    
+    return jsonify({'success': True, 'id': praca_id}), 201
 
 @app.route('/api/pracas/<int:id>', methods=['PUT'])
 @login_required
@@ -369,12 +398,16 @@ def update_praca(id):
                     (id, municipio_id)
                 )
 
+        refresh_counters(conn, 'praca', [id])
         conn.commit()
-        return jsonify({'success': True})
-
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         return jsonify({'error': str(err)}), 400
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [id])
+        return jsonify({'success': True})
 
     finally:
         cursor.close()
@@ -388,37 +421,51 @@ def delete_praca(id):
     cursor = conn.cursor()
     
     try:
+        # As tabelas da praça (com faixas e taxas) também saem em cascata:
+        # guarda as referências de cada uma para acertar os contadores
+        cursor.execute("SELECT id FROM transporte.tpraca WHERE id_praca = %s", (id,))
+        tabelas = {tabela_id: tabela_refs(conn, tabela_id) for (tabela_id,) in cursor.fetchall()}
+        
         # Deletar a praça (as associações com municípios serão deletadas em cascata)
         cursor.execute("DELETE FROM transporte.praca WHERE id = %s", (id,))
+        refresh_counters(conn, 'praca', [id])
+        for tabela_id, antes in tabelas.items():
+            refresh_tabela_counters(conn, tabela_id, antes)
         conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'success': True})
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         cursor.close()
         conn.close()
         return jsonify({'error': str(err)}), 400
+    
+    if tabelas:
+        bump_dataset('taxa_tipos', 'taxa_transportes')
+    
+    # Fora do try: a escrita já foi confirmada
+    refresh_coverage(conn, [id])
+    cursor.close()
+    conn.close()
+    
+    return jsonify({'success': True})
 
 # API para Tabelas de Preço (tpraca)
 @app.route('/api/tpracas', methods=['GET'])
 @login_required
 def get_tpracas():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     cursor.execute(
         "SELECT tp.*, p.nome as praca_nome FROM transporte.tpraca tp "
         "JOIN transporte.praca p ON tp.id_praca = p.id"
     )
-    tpracas = cursor.fetchall()
+    tpracas = Rows.fetch(cursor)
     
     cursor.close()
     conn.close()
     
-    return jsonify({'tpracas': list(tpracas)})
+    return rows_response('tpracas', tpracas)
 
 @app.route('/api/tpracas/<int:id>', methods=['GET'])
 @login_required
@@ -487,51 +534,26 @@ def create_tpraca():
         conn.commit()
         tpraca_id = cursor.lastrowid
 
-        # Inserir faixas
-        faixas = data.get('faixas', [])
-        for faixa in faixas:
-            cursor.execute(
-                "INSERT INTO transporte.tpreco_faixas (id_tpreco, tipo, faixa_min, faixa_max, valor, adicional_por_excedente) "
-                "VALUES (%s, %s, %s, %s, %s, %s)",
-                (
-                    tpraca_id,
-                    faixa.get('tipo'),
-                    faixa.get('faixa_min'),
-                    faixa.get('faixa_max'),
-                    faixa.get('valor'),
-                    faixa.get('adicional_por_excedente')
-                )
-            )
-
-        # Inserir taxas
-        taxas = data.get('taxas', [])
-        for taxa in taxas:
-            cursor.execute(
-                "INSERT INTO transporte.tpreco_taxas (id_taxa_tipo, id_tpreco, id_transportadora, id_taxa, valor, unidade, obrigatoria) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (
-                    taxa.get('id_taxa_tipo'),
-                    tpraca_id,
-                    taxa.get('id_transportadora'),
-                    taxa.get('id_taxa'),
-                    taxa.get('valor'),
-                    taxa.get('unidade'),
-                    taxa.get('obrigatoria', 0)
-                )
-            )
+        # Inserir faixas e taxas (um INSERT de várias linhas cada)
+        insert_faixas(cursor, tpraca_id, data.get('faixas', []))
+        insert_taxas(cursor, tpraca_id, data.get('taxas', []))
 
+        refresh_tabela_counters(conn, tpraca_id)
         conn.commit()
-        cursor.close()
-        conn.close()
-
-        return jsonify({'success': True, 'id': tpraca_id}), 201
-
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         cursor.close()
         conn.close()
         return jsonify({'error': str(err)}), 400
 
+    # Fora do try: a escrita já foi confirmada
+    refresh_coverage(conn, [data.get('id_praca')])
+    cursor.close()
+    conn.close()
+
+    return jsonify({'success': True, 'id': tpraca_id}), 201
+
 @app.route('/api/tpracas/<int:id>', methods=['PUT'])
 @login_required
 def update_tpraca(id):
@@ -541,6 +563,8 @@ def update_tpraca(id):
     cursor = conn.cursor()
 
     try:
+        antes = tabela_refs(conn, id)
+
         # Atualizar tabela de preço
         cursor.execute(
             "UPDATE transporte.tpraca SET id_praca = %s, praça = %s, modal = %s, tipo_cobranca_peso = %s, "
@@ -557,53 +581,36 @@ def update_tpraca(id):
             )
         )
 
-        # Atualizar faixas se fornecidas
+        # Atualizar faixas e taxas se fornecidas (?modo=diff grava só o que mudou)
+        modo_diff = request.args.get('modo') == 'diff'
         if 'faixas' in data:
-            cursor.execute("DELETE FROM transporte.tpreco_faixas WHERE id_tpreco = %s", (id,))
-            for faixa in data.get('faixas', []):
-                cursor.execute(
-                    "INSERT INTO transporte.tpreco_faixas (id_tpreco, tipo, faixa_min, faixa_max, valor, adicional_por_excedente) "
-                    "VALUES (%s, %s, %s, %s, %s, %s)",
-                    (
-                        id,
-                        faixa.get('tipo'),
-                        faixa.get('faixa_min'),
-                        faixa.get('faixa_max'),
-                        faixa.get('valor'),
-                        faixa.get('adicional_por_excedente')
-                    )
-                )
+            if modo_diff:
+                sync_faixas(cursor, id, data['faixas'])
+            else:
+                replace_faixas(cursor, id, data['faixas'])
 
-        # Atualizar taxas se fornecidas
         if 'taxas' in data:
-            cursor.execute("DELETE FROM transporte.tpreco_taxas WHERE id_tpreco = %s", (id,))
-            for taxa in data.get('taxas', []):
-                cursor.execute(
-                    "INSERT INTO transporte.tpreco_taxas (id_taxa_tipo, id_tpreco, id_transportadora, id_taxa, valor, unidade, obrigatoria) "
-                    "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                    (
-                        taxa.get('id_taxa_tipo'),
-                        id,
-                        taxa.get('id_transportadora'),
-                        taxa.get('id_taxa'),
-                        taxa.get('valor'),
-                        taxa.get('unidade'),
-                        taxa.get('obrigatoria', 0)
-                    )
-                )
+            if modo_diff:
+                sync_taxas(cursor, id, data['taxas'])
+            else:
+                replace_taxas(cursor, id, data['taxas'])
 
+        refresh_tabela_counters(conn, id, antes)
         conn.commit()
-        cursor.close()
-        conn.close()
-
-        return jsonify({'success': True})
-
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         cursor.close()
         conn.close()
         return jsonify({'error': str(err)}), 400
 
+    # Fora do try: a escrita já foi confirmada
+    refresh_coverage(conn, antes['praca'] | {data.get('id_praca')})
+    cursor.close()
+    conn.close()
+
+    return jsonify({'success': True})
+
 @app.route('/api/tpracas/<int:id>', methods=['DELETE'])
 @login_required
 @admin_required
@@ -612,35 +619,41 @@ def delete_tpraca(id):
     cursor = conn.cursor()
 
     try:
+        antes = tabela_refs(conn, id)
+
         # Assume-se que ON DELETE CASCADE está configurado nas constraints
         cursor.execute("DELETE FROM transporte.tpraca WHERE id = %s", (id,))
+        refresh_tabela_counters(conn, id, antes)
         conn.commit()
-
-        cursor.close()
-        conn.close()
-
-        return jsonify({'success': True})
-
+        rate_engine.invalidate()
     except mysql.connector.Error as err:
         conn.rollback()
         cursor.close()
         conn.close()
         return jsonify({'error': str(err)}), 400
 
+    # Fora do try: a escrita já foi confirmada
+    refresh_coverage(conn, antes['praca'])
+    cursor.close()
+    conn.close()
+
+    return jsonify({'success': True})
+
 # API para Taxa Tipo
 @app.route('/api/taxa_tipos', methods=['GET'])
 @login_required
+@conditional('taxa_tipos')
 def get_taxa_tipos():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM transporte.taxa_tipo")
-    taxa_tipos = cursor.fetchall()
+    taxa_tipos = Rows.fetch(cursor)
 
     cursor.close()
     conn.close()
 
-    return jsonify({'taxa_tipos': taxa_tipos})
+    return rows_response('taxa_tipos', taxa_tipos)
 
 @app.route('/api/taxa_tipos/<int:id>', methods=['GET'])
 @login_required
@@ -673,6 +686,7 @@ def create_taxa_tipo():
             (data.get('sigla'), data.get('descricao'), data.get('aplicacao'), data.get('observacoes'))
         )
         conn.commit()
+        bump_dataset('taxa_tipos')
         taxa_tipo_id = cursor.lastrowid
 
         cursor.close()
@@ -701,6 +715,9 @@ def update_taxa_tipo(id):
             (data.get('sigla'), data.get('descricao'), data.get('aplicacao'), data.get('observacoes'), id)
         )
         conn.commit()
+        bump_dataset('taxa_tipos')
+        rate_engine.invalidate()
+        quote_cache.clear()
 
         cursor.close()
         conn.close()
@@ -722,7 +739,11 @@ def delete_taxa_tipo(id):
 
     try:
         cursor.execute("DELETE FROM transporte.taxa_tipo WHERE id = %s", (id,))
+        refresh_counters(conn, 'taxa_tipo', [id])
         conn.commit()
+        bump_dataset('taxa_tipos')
+        rate_engine.invalidate()
+        quote_cache.clear()
 
         cursor.close()
         conn.close()
@@ -738,17 +759,18 @@ def delete_taxa_tipo(id):
 # API para Taxa Transporte
 @app.route('/api/taxa_transportes', methods=['GET'])
 @login_required
+@conditional('taxa_transportes')
 def get_taxa_transportes():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM transporte.taxa_transporte")
-    taxa_transportes = cursor.fetchall()
+    taxa_transportes = Rows.fetch(cursor)
 
     cursor.close()
     conn.close()
 
-    return jsonify({'taxa_transportes': taxa_transportes})
+    return rows_response('taxa_transportes', taxa_transportes)
 
 @app.route('/api/taxa_transportes/<int:id>', methods=['GET'])
 @login_required
@@ -781,6 +803,7 @@ def create_taxa_transporte():
             (data.get('sigla'), data.get('descricao'), data.get('aplicacao'), data.get('observacao'))
         )
         conn.commit()
+        bump_dataset('taxa_transportes')
         taxa_id = cursor.lastrowid
 
         cursor.close()
@@ -809,6 +832,9 @@ def update_taxa_transporte(id):
             (data.get('sigla'), data.get('descricao'), data.get('aplicacao'), data.get('observacao'), id)
         )
         conn.commit()
+        bump_dataset('taxa_transportes')
+        rate_engine.invalidate()
+        quote_cache.clear()
 
         cursor.close()
         conn.close()
@@ -830,7 +856,11 @@ def delete_taxa_transporte(id):
 
     try:
         cursor.execute("DELETE FROM transporte.taxa_transporte WHERE id = %s", (id,))
+        refresh_counters(conn, 'taxa_transporte', [id])
         conn.commit()
+        bump_dataset('taxa_transportes')
+        rate_engine.invalidate()
+        quote_cache.clear()
 
         cursor.close()
         conn.close()
@@ -846,9 +876,10 @@ def delete_taxa_transporte(id):
 # API para Municípios
 @app.route('/api/municipios', methods=['GET'])
 @login_required
+@conditional('localidades')
 def get_municipios():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     uf = request.args.get('uf')
     query = """
@@ -863,12 +894,12 @@ def get_municipios():
         params.append(uf)
 
     cursor.execute(query, params)
-    municipios = cursor.fetchall()
+    municipios = Rows.fetch(cursor)
 
     cursor.close()
     conn.close()
 
-    return jsonify({'municipios': municipios})
+    return rows_response('municipios', municipios)
 
 @app.route('/api/municipios/<int:codigo_ibge>', methods=['GET'])
 @login_required
@@ -905,17 +936,18 @@ def get_municipio(codigo_ibge):
 # API para Estados
 @app.route('/api/estados', methods=['GET'])
 @login_required
+@conditional('localidades')
 def get_estados():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM brasil.estado ORDER BY Nome")
-    estados = cursor.fetchall()
+    estados = Rows.fetch(cursor)
 
     cursor.close()
     conn.close()
 
-    return jsonify({'estados': estados})
+    return rows_response('estados', estados)
 
 @app.route('/api/estados/<int:codigo_uf>', methods=['GET'])
 @login_required
@@ -936,17 +968,18 @@ def get_estado(codigo_uf):
 # API para Regiões
 @app.route('/api/regioes', methods=['GET'])
 @login_required
+@conditional('localidades')
 def get_regioes():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM brasil.regiao ORDER BY Nome")
-    regioes = cursor.fetchall()
+    regioes = Rows.fetch(cursor)
 
     cursor.close()
     conn.close()
 
-    return jsonify({'regioes': regioes})
+    return rows_response('regioes', regioes)
 
 @app.route('/api/regioes/<int:id>', methods=['GET'])
 @login_required
@@ -973,31 +1006,29 @@ def get_regiao(id):
 @app.route('/api/busca-cep/<cep>', methods=['GET'])
 @login_required
 def busca_cep(cep):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Remover formatação do CEP
-    cep_limpo = cep.replace('-', '').replace('.', '').strip()
-
-    cursor.execute(
-        """
-        SELECT fc.*, m.municipio, e.Nome as estado, e.Uf
-        FROM brasil.faixa_cep fc
-        JOIN brasil.municipio m ON fc.CodMunicipio = m.codigoIbge
-        JOIN brasil.estado e ON fc.CodigoUf = e.CodigoUf
-        WHERE %s BETWEEN fc.cep_inicial AND fc.cep_final
-        """,
-        (cep_limpo,)
-    )
-    resultado = cursor.fetchone()
-
-    cursor.close()
-    conn.close()
+    # Busca binária sobre as faixas de CEP em memória
+    resultado = cep_index.lookup(cep.strip())
 
     if resultado:
         return jsonify({'resultado': resultado})
     return jsonify({'error': 'CEP não encontrado'}), 404
 
+@app.route('/api/busca-cep/indice', methods=['POST'])
+@login_required
+@admin_required
+def rebuild_cep_index():
+    # Recarrega o índice de faixas de CEP em memória
+    snapshot = cep_index.rebuild()
+    bump_dataset('localidades')
+    return jsonify({'success': True, 'total_faixas': len(snapshot)})
+
+# Estatísticas do pool de conexões
+@app.route('/api/sistema/pool', methods=['GET'])
+@login_required
+@admin_required
+def get_pool_stats():
+    return jsonify({'pools': pool_stats(), 'statements': statements.stats()})
+
 # API para Opções de Sistema
 @app.route('/api/opcoes-sistema', methods=['GET'])
 @login_required
@@ -1205,6 +1236,7 @@ def update_usuario(id):
             )
 
         conn.commit()
+        invalidate_user(id)
         cursor.close()
         conn.close()
 
@@ -1229,6 +1261,7 @@ def delete_usuario(id):
     try:
         cursor.execute("DELETE FROM auth.users WHERE id = %s", (id,))
         conn.commit()
+        invalidate_user(id)
 
         cursor.close()
         conn.close()
@@ -1279,6 +1312,7 @@ def update_perfil():
             )
 
         conn.commit()
+        invalidate_user(current_user.id)
         cursor.close()
         conn.close()
 
@@ -1290,143 +1324,67 @@ def update_perfil():
         conn.close()
         return jsonify({'error': str(err)}), 400
 
+# Normaliza os dados de um envio para cálculo de frete
+def parse_envio(data):
+    cep_destino = str(data.get('cep_destino', '')).replace('-', '').replace('.', '')
+    peso = float(data.get('peso', 0))
+    cubagem = float(data.get('cubagem', 0))
+    valor_mercadoria = float(data.get('valor_mercadoria', 0))  # noqa: F841
+    transportadora_id = data.get('transportadora_id')
+    if transportadora_id:
+        transportadora_id = int(transportadora_id)
+    return cep_destino, peso, cubagem, transportadora_id
+
+# Ordenação e filtros opcionais das cotações: ordem (custo, prazo ou score),
+# limite, modal (um ou vários, separados por vírgula), pareto e peso_prazo
+def parse_ranking(dados):
+    campos = ('ordem', 'limite', 'modal', 'pareto', 'peso_prazo')
+    if not any(dados.get(campo) not in (None, '') for campo in campos):
+        return None
+
+    modal = dados.get('modal')
+    if isinstance(modal, str):
+        modal = [m.strip() for m in modal.split(',') if m.strip()]
+    limite = dados.get('limite')
+    pareto = dados.get('pareto')
+    if isinstance(pareto, str):
+        pareto = pareto.lower() in ('1', 'true', 'sim')
+    peso_prazo = dados.get('peso_prazo')
+
+    return QuoteRanking(
+        dados.get('ordem') or 'custo',
+        int(limite) if limite not in (None, '') else None,
+        modal,
+        bool(pareto),
+        float(peso_prazo) if peso_prazo not in (None, '') else Config.FRETE_PESO_PRAZO
+    )
+
 # API para cálculo de frete (implementação básica)
 @app.route('/api/calculo-frete', methods=['POST'])
 @login_required
 def calcular_frete():
     data = request.get_json()
-    cep_destino = data.get('cep_destino', '').replace('-', '').replace('.', '')
-    peso = float(data.get('peso', 0))
-    cubagem = float(data.get('cubagem', 0))
-    valor_mercadoria = float(data.get('valor_mercadoria', 0))  # noqa: F841
-    transportadora_id = data.get('transportadora_id')
+    cep_destino, peso, cubagem, transportadora_id = parse_envio(data)
 
     if not cep_destino or (peso <= 0 and cubagem <= 0):
         return jsonify({'error': 'CEP de destino e peso ou cubagem são obrigatórios'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    try:
+        ranking = parse_ranking(data)
+    except (TypeError, ValueError) as err:
+        return jsonify({'error': f'Ordenação inválida: {err}'}), 400
 
     # Busca o município pelo CEP
-    cursor.execute(
-        """
-        SELECT fc.CodMunicipio, m.municipio, e.Uf 
-        FROM brasil.faixa_cep fc 
-        JOIN brasil.municipio m ON fc.CodMunicipio = m.codigoIbge
-        JOIN brasil.estado e ON fc.CodigoUf = e.CodigoUf
-        WHERE %s BETWEEN fc.cep_inicial AND fc.cep_final
-        """,
-        (cep_destino,)
-    )
-    municipio_info = cursor.fetchone()
+    municipio_info = cep_index.lookup(cep_destino)
 
     if not municipio_info:
-        cursor.close()
-        conn.close()
         return jsonify({'error': 'CEP não encontrado'}), 404
 
-    # Busca praça que atende o município
-    cod_municipio = municipio_info['CodMunicipio']
-    query_praca = """
-        SELECT p.id, p.nome, tp.id as tabela_id, tp.modal, tp.tipo_cobranca_peso, tp.prazo_entrega
-        FROM transporte.praca p
-        JOIN transporte.praca_municipio pm ON p.id = pm.id_praca
-        JOIN transporte.tpraca tp ON p.id = tp.id_praca
-        WHERE pm.CodMunicipio = %s
-    """
-
-    params = [cod_municipio]
-    if transportadora_id:
-        query_praca += " AND p.id_transportadora = %s"
-        params.append(transportadora_id)
-
-    cursor.execute(query_praca, params)
-    pracas = cursor.fetchall()
-
-    if not pracas:
-        cursor.close()
-        conn.close()
+    # Cotações do município pelo motor em memória (com cache por entrada normalizada)
+    resultados = quote_cache.quote(municipio_info['CodMunicipio'], peso, cubagem, transportadora_id, ranking)
+    if resultados is None:
         return jsonify({'error': 'Não há praças/tabelas que atendam esse destino'}), 404
 
-    resultados = []
-
-    for praca in pracas:
-        tabela_id = praca['tabela_id']
-        tipo_cobranca = praca['tipo_cobranca_peso']
-
-        valor_a_usar = peso
-        tipo_faixa = 'peso'
-        if tipo_cobranca == 'cubagem':
-            valor_a_usar = cubagem
-            tipo_faixa = 'cubagem'
-        elif tipo_cobranca == 'ambos' and cubagem > peso:
-            valor_a_usar = cubagem
-            tipo_faixa = 'cubagem'
-
-        # Buscar faixa de preço adequada
-        cursor.execute(
-            """
-            SELECT * FROM transporte.tpreco_faixas 
-            WHERE id_tpreco = %s AND tipo = %s AND %s >= faixa_min 
-            AND (%s <= faixa_max OR faixa_max IS NULL)
-            """,
-            (tabela_id, tipo_faixa, valor_a_usar, valor_a_usar)
-        )
-        faixa_preco = cursor.fetchone()
-
-        if not faixa_preco:
-            continue
-
-        valor_frete = faixa_preco['valor']
-        if faixa_preco['faixa_max'] and valor_a_usar > faixa_preco['faixa_max'] and faixa_preco['adicional_por_excedente']:
-            excedente = valor_a_usar - faixa_preco['faixa_max']
-            valor_frete += excedente * faixa_preco['adicional_por_excedente']
-
-        # Buscar taxas aplicáveis
-        cursor.execute(
-            """
-            SELECT tt.*, ttp.sigla as tipo_sigla, tx.sigla as taxa_sigla, tx.descricao as taxa_descricao
-            FROM transporte.tpreco_taxas tt
-            JOIN transporte.taxa_tipo ttp ON tt.id_taxa_tipo = ttp.id
-            JOIN transporte.taxa_transporte tx ON tt.id_taxa = tx.id
-            WHERE tt.id_tpreco = %s
-            """,
-            (tabela_id,)
-        )
-        taxas = cursor.fetchall()
-
-        taxas_calculadas = []
-        for taxa in taxas:
-            valor_taxa = 0
-            if taxa['unidade'] == '%':
-                valor_taxa = (taxa['valor'] / 100) * valor_frete
-            elif taxa['unidade'] == 'R$':
-                valor_taxa = taxa['valor']
-
-            taxas_calculadas.append({
-                'id': taxa['id'],
-                'descricao': taxa['taxa_descricao'],
-                'sigla': taxa['taxa_sigla'],
-                'tipo': taxa['tipo_sigla'],
-                'valor': valor_taxa,
-                'obrigatoria': bool(taxa['obrigatoria'])
-            })
-
-        resultados.append({
-            'id_tabela': tabela_id,
-            'praca_nome': praca['nome'],
-            'modal': praca['modal'],
-            'prazo_entrega': praca['prazo_entrega'],
-            'valor_frete': valor_frete,
-            'tipo_calculo': tipo_faixa,
-            'valor_utilizado': valor_a_usar,
-            'taxas': taxas_calculadas,
-            'valor_total': valor_frete + sum(t['valor'] for t in taxas_calculadas if t['obrigatoria'])
-        })
-
-    cursor.close()
-    conn.close()
-
     if resultados:
         return jsonify({
             'destino': {
@@ -1439,6 +1397,93 @@ def calcular_frete():
     else:
         return jsonify({'error': 'Não foi possível calcular o frete para este destino'}), 404
 
+# API para cálculo de frete em lote (array JSON ou NDJSON)
+@app.route('/api/calculo-frete/lote', methods=['POST'])
+@login_required
+def calcular_frete_lote():
+    ndjson = request.mimetype == 'application/x-ndjson'
+
+    if ndjson:
+        envios = []
+        for numero, linha in enumerate(request.stream, start=1):
+            if not linha.strip():
+                continue
+            try:
+                envios.append(json.loads(linha))
+            except ValueError:
+                return jsonify({'error': f'JSON inválido na linha {numero}'}), 400
+    else:
+        data = request.get_json(silent=True)
+        envios = data.get('envios') if isinstance(data, dict) else data
+
+    if not isinstance(envios, list) or not envios:
+        return jsonify({'error': 'Informe uma lista de envios'}), 400
+
+    if len(envios) > Config.FRETE_LOTE_MAX_ITENS:
+        return jsonify({'error': f'Máximo de {Config.FRETE_LOTE_MAX_ITENS} envios por lote'}), 400
+
+    # Ordenação pela query string, a mesma para todos os envios (vale também no NDJSON)
+    try:
+        ranking = parse_ranking(request.args)
+    except (TypeError, ValueError) as err:
+        return jsonify({'error': f'Ordenação inválida: {err}'}), 400
+
+    # Valida e resolve o destino de cada envio; os válidos seguem para o motor em lote
+    itens = [None] * len(envios)
+    pendentes = []
+    calculo = []
+    for indice, envio in enumerate(envios):
+        try:
+            cep_destino, peso, cubagem, transportadora_id = parse_envio(envio)
+        except (AttributeError, TypeError, ValueError):
+            itens[indice] = {'indice': indice, 'error': 'Dados do envio inválidos'}
+            continue
+
+        if not cep_destino or (peso <= 0 and cubagem <= 0):
+            itens[indice] = {'indice': indice, 'error': 'CEP de destino e peso ou cubagem são obrigatórios'}
+            continue
+
+        municipio_info = cep_index.lookup(cep_destino)
+        if not municipio_info:
+            itens[indice] = {'indice': indice, 'error': 'CEP não encontrado'}
+            continue
+
+        pendentes.append((indice, cep_destino, municipio_info))
+        calculo.append((municipio_info['CodMunicipio'], peso, cubagem, transportadora_id))
+
+    cotacoes = quote_cache.quote_batch(calculo, ranking)
+
+    for (indice, cep_destino, municipio_info), resultados in zip(pendentes, cotacoes):
+        if resultados is None:
+            itens[indice] = {'indice': indice, 'error': 'Não há praças/tabelas que atendam esse destino'}
+        elif not resultados:
+            itens[indice] = {'indice': indice, 'error': 'Não foi possível calcular o frete para este destino'}
+        else:
+            itens[indice] = {
+                'indice': indice,
+                'destino': {
+                    'cep': cep_destino,
+                    'municipio': municipio_info['municipio'],
+                    'uf': municipio_info['Uf']
+                },
+                'resultados': resultados
+            }
+
+    if ndjson:
+        def gerar():
+            for item in itens:
+                yield json.dumps(item, default=str) + '\n'
+        return Response(gerar(), mimetype='application/x-ndjson')
+
+    envelope = {
+        'total': len(itens),
+        'total_erros': sum(1 for item in itens if 'error' in item)
+    }
+    if isinstance(app.json, json_provider.FastJSONProvider):
+        # Lotes grandes saem em pedaços, sem montar o documento inteiro
+        return Response(app.json.stream_array('resultados', itens, envelope), mimetype='application/json')
+    return jsonify({'resultados': itens, **envelope})
+
 # Rota para renderizar a página inicial
 @app.route('/')
 def render_index():
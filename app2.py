@@ -1,9 +1,12 @@
 import os
+import csv
+import json
+import secrets
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import Optional, Dict, Any, Union
 
-from flask import (Flask, render_template, request, jsonify, session, make_response, current_app)
+from flask import (Flask, Response, render_template, request, jsonify, session, make_response, current_app, abort, stream_with_context)
 from flask_login import (LoginManager, UserMixin, login_user, logout_user, login_required, current_user)
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf
@@ -14,9 +17,37 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import mysql.connector
 
-from modules.session import session_required
+from modules.session import session_required, invalidate_session
+from modules.auth_utils import get_cached_user, cache_user, invalidate_user
 from modules.config import Config
-from modules.db import get_db_connection
+from modules.db import get_db_connection, pool_stats, release_connections
+from modules.statements import (
+    ENDERECO_POR_CEP, MUNICIPIO_POR_CODIGO, USUARIO_POR_ID, USUARIO_POR_NOME, statements
+)
+from modules.audit import audit_writer
+from modules.pagination import Pagination
+from modules.rate_engine import rate_engine
+from modules.coverage import coverage_index
+from modules.quote_cache import quote_cache, refresh_coverage
+from modules.cep_index import cep_index
+from modules.municipio_search import municipio_index
+from modules.http_cache import conditional, bump_dataset
+from modules import json_provider
+from modules.metrics import metrics
+from modules.sql_trace import query_tracer
+from modules.cep_counts import faixas_por_municipio, refresh_ceps, refresh_job, ensure_table
+from modules.counters import refresh_counters, refresh_tabela_counters, tabela_refs, ensure_counters
+from modules.tariff_import import TariffImport, read_rows
+from modules.export import export_lines
+from modules.rows import Rows, rows_response
+from modules.tariff_writer import (
+    insert_faixas,
+    insert_taxas,
+    replace_faixas,
+    replace_taxas,
+    sync_faixas,
+    sync_taxas
+)
 from modules.validators import (
     validate_cnpj, 
     validate_cep, 
@@ -43,6 +74,18 @@ login_manager.login_view = 'login'
 # Configuração de proteção CSRF
 csrf = CSRFProtect(app)
 
+# Métricas do Prometheus (GET /metrics)
+metrics.init_app(app)
+
+# Rastreamento de SQL e log de consultas lentas
+query_tracer.init_app(app)
+
+# Serialização JSON das respostas (orjson, quando instalado)
+json_provider.init_app(app)
+
+# Conexões do pool que o handler não devolveu voltam no fim do contexto
+app.teardown_appcontext(release_connections)
+
 # Tipos personalizados
 JSON = Dict[str, Any]
 DBConnection = mysql.connector.MySQLConnection
@@ -56,17 +99,13 @@ class User(UserMixin):
         self.role = role
 
 def log_action(action_type: str, entity: str):
-    """Decorator para logging de ações"""
+    """Decorator para logging de ações (gravado em segundo plano pelo audit_writer)"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             try:
                 result = f(*args, **kwargs)
                 
-                # Log da ação
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
                 entity_id = kwargs.get('id')
                 if isinstance(result, tuple):
                     response, status_code = result
@@ -74,11 +113,7 @@ def log_action(action_type: str, entity: str):
                     response, status_code = result, 200
                 
                 if 200 <= status_code < 300:  # Só loga ações bem-sucedidas
-                    cursor.execute("""
-                        INSERT INTO auth.logs 
-                        (user_id, acao, entidade, entidade_id, descricao, ip, user_agent)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (
+                    audit_writer.enqueue(
                         current_user.id,
                         action_type,
                         entity,
@@ -86,25 +121,13 @@ def log_action(action_type: str, entity: str):
                         json.dumps(request.get_json() if request.is_json else None),
                         request.remote_addr,
                         request.user_agent.string
-                    ))
-                    
-                    conn.commit()
-                
-                cursor.close()
-                conn.close()
+                    )
                 
                 return result
                 
             except Exception as e:
                 # Log de erro
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO auth.logs 
-                    (user_id, acao, entidade, entidade_id, descricao, ip, user_agent)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
+                audit_writer.enqueue(
                     current_user.id if not current_user.is_anonymous else None,
                     'ERRO',
                     entity,
@@ -112,11 +135,7 @@ def log_action(action_type: str, entity: str):
                     str(e),
                     request.remote_addr,
                     request.user_agent.string
-                ))
-                
-                conn.commit()
-                cursor.close()
-                conn.close()
+                )
                 
                 raise
                 
@@ -137,23 +156,23 @@ def admin_required(f):
 
 @login_manager.user_loader
 def load_user(user_id: str) -> Optional[User]:
-    """Carrega usuário para o Flask-Login"""
+    """Carrega usuário para o Flask-Login (com cache em memória)"""
+    cached = get_cached_user(user_id)
+    if cached:
+        return cached
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
     
     try:
-        cursor.execute(
-            "SELECT * FROM auth.users WHERE id = %s",
-            (user_id,)
-        )
-        user = cursor.fetchone()
+        user = statements.fetchone(conn, USUARIO_POR_ID, (user_id,))
         
         if user:
-            return User(user['id'], user['username'], user['role'])
+            user_obj = User(user['id'], user['username'], user['role'])
+            cache_user(user_obj)
+            return user_obj
         return None
     
     finally:
-        cursor.close()
         conn.close()
 
 def save_session(
@@ -207,6 +226,22 @@ def get_pagination_params() -> tuple:
     offset = (page - 1) * per_page
     return page, per_page, offset
 
+def get_pagination(keys: list, *filters) -> Pagination:
+    """Obtém paginação por offset (?page=) ou por cursor (?after=) da request"""
+    page, per_page, offset = get_pagination_params()
+    
+    try:
+        return Pagination(
+            page,
+            per_page,
+            keys,
+            after=request.args.get('after'),
+            with_total=request.args.get('count', '1') != '0',
+            cache_key=(request.endpoint,) + filters
+        )
+    except ValueError:
+        abort(make_response(format_error('Cursor de paginação inválido', 'INVALID_CURSOR')))
+
 def format_error(message: str, code: str = None) -> tuple:
     """Formata resposta de erro"""
     return jsonify({
@@ -239,14 +274,9 @@ def login():
             return error
 
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
         
         try:
-            cursor.execute(
-                "SELECT * FROM auth.users WHERE username = %s",
-                (data['username'],)
-            )
-            user = cursor.fetchone()
+            user = statements.fetchone(conn, USUARIO_POR_NOME, (data['username'],))
             
             if user and check_password_hash(user['password'], data['password']):
                 user_obj = User(user['id'], user['username'], user['role'])
@@ -280,7 +310,6 @@ def login():
             return format_error('Credenciais inválidas', 'INVALID_CREDENTIALS')
             
         finally:
-            cursor.close()
             conn.close()
     
     return render_template('login.html')
@@ -300,6 +329,7 @@ def logout():
                 (session['sid'],)
             )
             conn.commit()
+            invalidate_session(session['sid'])
         
         logout_user()
         return jsonify({'success': True})
@@ -315,22 +345,26 @@ def logout():
 @app.route('/api/transportadoras', methods=['GET'])
 @login_required
 def get_transportadoras():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     sistema = request.args.get('sistema', type=int)
     tipo = request.args.get('tipo')
     
+    pag = get_pagination(
+        [('t.DESCRICAO', 'DESCRICAO'), ('t.ID', 'ID')],
+        search, sistema, tipo
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
         # Construir query base
-        query = """
+        query = f"""
             SELECT 
                 t.*,
                 m.DESCRICAO as matriz_nome,
                 os.tipo as sistema_nome,
-                COUNT(*) OVER() as total_count
+                {pag.count_column}
             FROM transporte.transportadoras t
             LEFT JOIN transporte.transportadoras m ON t.id_matriz = m.ID
             LEFT JOIN transporte.opcoes_sistema os ON t.SISTEMA = os.id
@@ -360,24 +394,15 @@ def get_transportadoras():
             params.append(tipo)
         
         # Adicionar ordenação e paginação
-        query += " ORDER BY t.DESCRICAO LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
+        query = pag.apply(query, params)
+        query += " ORDER BY t.DESCRICAO, t.ID LIMIT %s OFFSET %s"
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        transportadoras = cursor.fetchall()
-        
-        # Calcular total de páginas
-        total_count = transportadoras[0]['total_count'] if transportadoras else 0
-        total_pages = (total_count + per_page - 1) // per_page
+        transportadoras = Rows.fetch(cursor)
         
-        return jsonify({
-            'transportadoras': transportadoras,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        return rows_response('transportadoras', transportadoras, {
+            'pagination': pag.result(transportadoras)
         })
         
     finally:
@@ -534,26 +559,29 @@ def create_transportadora():
 @app.route('/api/pracas', methods=['GET'])
 @login_required
 def get_pracas():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     transportadora_id = request.args.get('transportadora_id', type=int)
     
+    pag = get_pagination(
+        [('p.nome', 'nome'), ('p.id', 'id')],
+        search, transportadora_id
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 p.*,
                 t.DESCRICAO as transportadora_nome,
                 t.COD_FOR as transportadora_codigo,
-                COUNT(DISTINCT pm.CodMunicipio) as total_municipios,
-                COUNT(DISTINCT tp.id) as total_tabelas,
-                COUNT(*) OVER() as total_count
+                COALESCE(pc.total_municipios, 0) as total_municipios,
+                COALESCE(pc.total_tabelas, 0) as total_tabelas,
+                {pag.count_column}
             FROM transporte.praca p
             JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
-            LEFT JOIN transporte.praca_municipio pm ON p.id = pm.id_praca
-            LEFT JOIN transporte.tpraca tp ON p.id = tp.id_praca
+            LEFT JOIN transporte.praca_contadores pc ON p.id = pc.id_praca
             WHERE 1=1
         """
         params = []
@@ -567,33 +595,23 @@ def get_pracas():
             query += " AND p.id_transportadora = %s"
             params.append(transportadora_id)
             
+        query = pag.apply(query, params)
         query += """
-            GROUP BY p.id, t.DESCRICAO, t.COD_FOR
-            ORDER BY p.nome
+            ORDER BY p.nome, p.id
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        pracas = cursor.fetchall()
+        pracas = Rows.fetch(cursor)
         
-        total_count = pracas[0]['total_count'] if pracas else 0
-        total_pages = (total_count + per_page - 1) // per_page
+        # Formatar dados para retorno (colunas à parte, sem alterar as linhas)
+        pracas.derive('possui_tabelas', 'total_tabelas', bool)
+        pracas.set('created_by', 'willianskymsen')
+        pracas.set('updated_at', datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
         
-        # Formatar dados para retorno
-        for praca in pracas:
-            praca['possui_tabelas'] = bool(praca['total_tabelas'])
-            praca['created_by'] = 'willianskymsen'
-            praca['updated_at'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        
-        return jsonify({
-            'pracas': pracas,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        return rows_response('pracas', pracas, {
+            'pagination': pag.result(pracas)
         })
         
     finally:
@@ -751,7 +769,17 @@ def create_praca():
                 VALUES (%s, %s)
             """, (praca_id, municipio_id))
         
+        refresh_counters(conn, 'praca', [praca_id])
         conn.commit()
+        rate_engine.invalidate()
+        
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
+        
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [praca_id])
         
         return jsonify({
             'success': True,
@@ -759,10 +787,6 @@ def create_praca():
             'message': f'Praça criada com {len(municipios_validos)} municípios'
         }), 201
         
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
-        
     finally:
         cursor.close()
         conn.close()
@@ -840,17 +864,23 @@ def update_praca(id):
                 VALUES (%s, %s)
             """, (id, municipio_id))
         
+        refresh_counters(conn, 'praca', [id])
         conn.commit()
+        rate_engine.invalidate()
+        
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
+        
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [id])
         
         return jsonify({
             'success': True,
             'message': f'Praça atualizada com {len(municipios_validos)} municípios'
         })
         
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
-        
     finally:
         cursor.close()
         conn.close()
@@ -889,17 +919,23 @@ def delete_praca(id):
             (id,)
         )
         
+        refresh_counters(conn, 'praca', [id])
         conn.commit()
+        rate_engine.invalidate()
+        
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
+        
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [id])
         
         return jsonify({
             'success': True,
             'message': 'Praça excluída com sucesso'
         })
         
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
-        
     finally:
         cursor.close()
         conn.close()
@@ -911,30 +947,33 @@ def delete_praca(id):
 @app.route('/api/tpracas', methods=['GET'])
 @login_required
 def get_tpracas():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     praca_id = request.args.get('praca_id', type=int)
     modal = request.args.get('modal')
     transportadora_id = request.args.get('transportadora_id', type=int)
     
+    pag = get_pagination(
+        [('p.nome', 'praca_nome'), ('tp.modal', 'modal'), ('tp.id', 'id')],
+        search, praca_id, modal, transportadora_id
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 tp.*,
                 p.nome as praca_nome,
                 t.DESCRICAO as transportadora_nome,
                 t.COD_FOR as transportadora_codigo,
-                COUNT(DISTINCT tf.id) as total_faixas,
-                COUNT(DISTINCT tt.id) as total_taxas,
-                COUNT(*) OVER() as total_count
+                COALESCE(tc.total_faixas, 0) as total_faixas,
+                COALESCE(tc.total_taxas, 0) as total_taxas,
+                {pag.count_column}
             FROM transporte.tpraca tp
             JOIN transporte.praca p ON tp.id_praca = p.id
             JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
-            LEFT JOIN transporte.tpreco_faixas tf ON tp.id = tf.id_tpreco
-            LEFT JOIN transporte.tpreco_taxas tt ON tp.id = tt.id_tpreco
+            LEFT JOIN transporte.tpraca_contadores tc ON tp.id = tc.id_tpreco
             WHERE 1=1
         """
         params = []
@@ -962,37 +1001,28 @@ def get_tpracas():
             query += " AND p.id_transportadora = %s"
             params.append(transportadora_id)
             
+        query = pag.apply(query, params)
         query += """
-            GROUP BY tp.id, p.nome, t.DESCRICAO, t.COD_FOR
-            ORDER BY p.nome, tp.modal
+            ORDER BY p.nome, tp.modal, tp.id
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        tabelas = cursor.fetchall()
+        tabelas = Rows.fetch(cursor)
         
-        total_count = tabelas[0]['total_count'] if tabelas else 0
-        total_pages = (total_count + per_page - 1) // per_page
-        
-        # Formatar dados para retorno
-        for tabela in tabelas:
-            tabela['created_by'] = 'willianskymsen'
-            tabela['updated_at'] = '2025-04-11 03:43:54'
-            tabela['modal_descricao'] = {
-                'R': 'Rodoviário',
-                'A': 'Aéreo',
-                'F': 'Fluvial'
-            }.get(tabela['modal'], 'Desconhecido')
+        # Formatar dados para retorno (colunas à parte, sem alterar as linhas)
+        modais = {
+            'R': 'Rodoviário',
+            'A': 'Aéreo',
+            'F': 'Fluvial'
+        }
+        tabelas.set('created_by', 'willianskymsen')
+        tabelas.set('updated_at', '2025-04-11 03:43:54')
+        tabelas.derive('modal_descricao', 'modal', lambda modal: modais.get(modal, 'Desconhecido'))
         
-        return jsonify({
-            'tabelas': tabelas,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        return rows_response('tabelas', tabelas, {
+            'pagination': pag.result(tabelas)
         })
         
     finally:
@@ -1129,42 +1159,22 @@ def create_tpraca():
         
         tabela_id = cursor.lastrowid
         
-        # Inserir faixas de preço
-        if 'faixas' in data:
-            for faixa in data['faixas']:
-                cursor.execute("""
-                    INSERT INTO transporte.tpreco_faixas (
-                        id_tpreco, tipo, faixa_min, faixa_max,
-                        valor, adicional_por_excedente
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    tabela_id,
-                    faixa['tipo'],
-                    faixa['faixa_min'],
-                    faixa.get('faixa_max'),
-                    faixa['valor'],
-                    faixa.get('adicional_por_excedente')
-                ))
-        
-        # Inserir taxas
-        if 'taxas' in data:
-            for taxa in data['taxas']:
-                cursor.execute("""
-                    INSERT INTO transporte.tpreco_taxas (
-                        id_taxa_tipo, id_tpreco, id_transportadora,
-                        id_taxa, valor, unidade, obrigatoria
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    taxa['id_taxa_tipo'],
-                    tabela_id,
-                    taxa.get('id_transportadora'),
-                    taxa['id_taxa'],
-                    taxa['valor'],
-                    taxa['unidade'],
-                    taxa.get('obrigatoria', False)
-                ))
+        # Inserir faixas de preço e taxas (um INSERT de várias linhas cada)
+        insert_faixas(cursor, tabela_id, data.get('faixas', []))
+        insert_taxas(cursor, tabela_id, data.get('taxas', []))
         
+        refresh_tabela_counters(conn, tabela_id)
         conn.commit()
+        bump_dataset('taxa_tipos', 'taxa_transportes')
+        rate_engine.invalidate()
+        
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
+        
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [data['id_praca']])
         
         return jsonify({
             'success': True,
@@ -1172,10 +1182,6 @@ def create_tpraca():
             'message': 'Tabela de preço criada com sucesso'
         }), 201
         
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
-        
     finally:
         cursor.close()
         conn.close()
@@ -1203,6 +1209,8 @@ def update_tpraca(id):
     if not validate_weight_charge_type(data['tipo_cobranca_peso']):
         return format_error('Tipo de cobrança inválido', 'INVALID_CHARGE_TYPE')
     
+    modo_diff = request.args.get('modo') == 'diff'
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -1228,6 +1236,9 @@ def update_tpraca(id):
                 'DUPLICATE_MODAL'
             )
         
+        # Referências atuais, para ajustar os contadores do que deixar de ser usado
+        antes = tabela_refs(conn, id)
+        
         # Atualizar tabela
         cursor.execute("""
             UPDATE transporte.tpraca SET
@@ -1248,62 +1259,43 @@ def update_tpraca(id):
             id
         ))
         
-        # Atualizar faixas se fornecidas
+        # Atualizar faixas e taxas se fornecidas: ?modo=diff grava só o que
+        # mudou; o padrão substitui tudo
+        alteracoes = {}
         if 'faixas' in data:
-            cursor.execute(
-                "DELETE FROM transporte.tpreco_faixas WHERE id_tpreco = %s",
-                (id,)
-            )
-            
-            for faixa in data['faixas']:
-                cursor.execute("""
-                    INSERT INTO transporte.tpreco_faixas (
-                        id_tpreco, tipo, faixa_min, faixa_max,
-                        valor, adicional_por_excedente
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    id,
-                    faixa['tipo'],
-                    faixa['faixa_min'],
-                    faixa.get('faixa_max'),
-                    faixa['valor'],
-                    faixa.get('adicional_por_excedente')
-                ))
-        
-        # Atualizar taxas se fornecidas
+            if modo_diff:
+                alteracoes['faixas'] = sync_faixas(cursor, id, data['faixas'])
+            else:
+                replace_faixas(cursor, id, data['faixas'])
+        
         if 'taxas' in data:
-            cursor.execute(
-                "DELETE FROM transporte.tpreco_taxas WHERE id_tpreco = %s",
-                (id,)
-            )
-            
-            for taxa in data['taxas']:
-                cursor.execute("""
-                    INSERT INTO transporte.tpreco_taxas (
-                        id_taxa_tipo, id_tpreco, id_transportadora,
-                        id_taxa, valor, unidade, obrigatoria
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    taxa['id_taxa_tipo'],
-                    id,
-                    taxa.get('id_transportadora'),
-                    taxa['id_taxa'],
-                    taxa['valor'],
-                    taxa['unidade'],
-                    taxa.get('obrigatoria', False)
-                ))
+            if modo_diff:
+                alteracoes['taxas'] = sync_taxas(cursor, id, data['taxas'])
+            else:
+                replace_taxas(cursor, id, data['taxas'])
         
+        refresh_tabela_counters(conn, id, antes)
         conn.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Tabela de preço atualizada com sucesso'
-        })
+        bump_dataset('taxa_tipos', 'taxa_transportes')
+        rate_engine.invalidate()
         
     except mysql.connector.Error as err:
         conn.rollback()
         return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
         
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, [tabela_atual[0]])
+        
+        response = {
+            'success': True,
+            'message': 'Tabela de preço atualizada com sucesso'
+        }
+        if modo_diff:
+            response['alteracoes'] = alteracoes
+        
+        return jsonify(response)
+        
     finally:
         cursor.close()
         conn.close()
@@ -1325,45 +1317,96 @@ def delete_tpraca(id):
         if not cursor.fetchone():
             return format_error('Tabela não encontrada', 'NOT_FOUND'), 404
         
+        antes = tabela_refs(conn, id)
+        
         # Excluir tabela (faixas e taxas serão excluídas em cascata)
         cursor.execute("DELETE FROM transporte.tpraca WHERE id = %s", (id,))
+        refresh_tabela_counters(conn, id, antes)
         conn.commit()
+        bump_dataset('taxa_tipos', 'taxa_transportes')
+        rate_engine.invalidate()
+        
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
+        
+    else:
+        # Fora do try: a escrita já foi confirmada
+        refresh_coverage(conn, antes['praca'])
         
         return jsonify({
             'success': True,
             'message': 'Tabela de preço excluída com sucesso'
         })
         
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return format_error(f'Erro no banco de dados: {str(err)}', 'DB_ERROR')
-        
     finally:
         cursor.close()
         conn.close()
 
+@app.route('/api/tpracas/importar', methods=['POST'])
+@login_required
+@admin_required
+@log_action('IMPORTAR', 'tpracas')
+def import_tpracas():
+    """
+    Importa tabelas de preço de um CSV/XLSX (campo 'arquivo').
+
+    O arquivo é lido em streaming e gravado em transações de
+    IMPORT_CHUNK_SIZE linhas. ?simular=1 só valida; ?progresso=1 responde
+    em NDJSON com uma linha de progresso por transação e o resumo no fim.
+    ?encoding= (ou campo 'encoding') define a codificação do CSV, ex.: cp1252.
+    """
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return format_error('Arquivo não enviado', 'MISSING_FILE')
+    
+    encoding = request.form.get('encoding') or request.args.get('encoding') or 'utf-8-sig'
+    try:
+        linhas = read_rows(arquivo.stream, arquivo.filename, encoding)
+    except (UnicodeError, csv.Error, ValueError) as err:
+        return format_error(str(err), 'INVALID_FILE')
+    
+    importacao = TariffImport(
+        chunk_size=Config.IMPORT_CHUNK_SIZE,
+        dry_run=request.args.get('simular') == '1'
+    )
+    
+    if request.args.get('progresso') == '1':
+        def gerar():
+            for evento in importacao.run_iter(linhas):
+                yield json.dumps(evento, default=str) + '\n'
+        
+        return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+    
+    return jsonify(importacao.run(linhas))
+
 # -------------------------------
 # APIs de Taxas
 # -------------------------------
 
 @app.route('/api/taxa_tipos', methods=['GET'])
 @login_required
+@conditional('taxa_tipos')
 def get_taxa_tipos():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     aplicacao = request.args.get('aplicacao')
     
+    pag = get_pagination(
+        [('tt.sigla', 'sigla'), ('tt.id', 'id')],
+        search, aplicacao
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 tt.*,
-                COUNT(DISTINCT tpt.id) as total_tabelas,
-                COUNT(*) OVER() as total_count
+                COALESCE(tc.total_tabelas, 0) as total_tabelas,
+                {pag.count_column}
             FROM transporte.taxa_tipo tt
-            LEFT JOIN transporte.tpreco_taxas tpt ON tt.id = tpt.id_taxa_tipo
+            LEFT JOIN transporte.taxa_tipo_contadores tc ON tt.id = tc.id_taxa_tipo
             WHERE 1=1
         """
         params = []
@@ -1382,32 +1425,22 @@ def get_taxa_tipos():
             query += " AND tt.aplicacao = %s"
             params.append(aplicacao)
             
+        query = pag.apply(query, params)
         query += """
-            GROUP BY tt.id
-            ORDER BY tt.sigla
+            ORDER BY tt.sigla, tt.id
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        tipos = cursor.fetchall()
+        tipos = Rows.fetch(cursor)
         
-        total_count = tipos[0]['total_count'] if tipos else 0
-        total_pages = (total_count + per_page - 1) // per_page
+        # Formatar dados para retorno (colunas à parte, sem alterar as linhas)
+        tipos.set('created_by', 'willianskymsen')
+        tipos.set('updated_at', '2025-04-11 03:45:22')
         
-        # Formatar dados para retorno
-        for tipo in tipos:
-            tipo['created_by'] = 'willianskymsen'
-            tipo['updated_at'] = '2025-04-11 03:45:22'
-        
-        return jsonify({
-            'tipos': tipos,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        return rows_response('tipos', tipos, {
+            'pagination': pag.result(tipos)
         })
         
     finally:
@@ -1515,7 +1548,9 @@ def create_taxa_tipo():
         ))
         
         tipo_id = cursor.lastrowid
+        refresh_counters(conn, 'taxa_tipo', [tipo_id])
         conn.commit()
+        bump_dataset('taxa_tipos')
         
         return jsonify({
             'success': True,
@@ -1591,6 +1626,9 @@ def update_taxa_tipo(id):
         ))
         
         conn.commit()
+        bump_dataset('taxa_tipos')
+        rate_engine.invalidate()
+        quote_cache.clear()
         
         return jsonify({
             'success': True,
@@ -1640,7 +1678,11 @@ def delete_taxa_tipo(id):
             (id,)
         )
         
+        refresh_counters(conn, 'taxa_tipo', [id])
         conn.commit()
+        bump_dataset('taxa_tipos')
+        rate_engine.invalidate()
+        quote_cache.clear()
         
         return jsonify({
             'success': True,
@@ -1657,22 +1699,27 @@ def delete_taxa_tipo(id):
 
 @app.route('/api/taxa_transportes', methods=['GET'])
 @login_required
+@conditional('taxa_transportes')
 def get_taxa_transportes():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     aplicacao = request.args.get('aplicacao')
     
+    pag = get_pagination(
+        [('tt.sigla', 'sigla'), ('tt.id', 'id')],
+        search, aplicacao
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 tt.*,
-                COUNT(DISTINCT tpt.id) as total_tabelas,
-                COUNT(*) OVER() as total_count
+                COALESCE(tc.total_tabelas, 0) as total_tabelas,
+                {pag.count_column}
             FROM transporte.taxa_transporte tt
-            LEFT JOIN transporte.tpreco_taxas tpt ON tt.id = tpt.id_taxa
+            LEFT JOIN transporte.taxa_transporte_contadores tc ON tt.id = tc.id_taxa
             WHERE 1=1
         """
         params = []
@@ -1691,33 +1738,23 @@ def get_taxa_transportes():
             query += " AND FIND_IN_SET(%s, tt.aplicacao)"
             params.append(aplicacao)
             
+        query = pag.apply(query, params)
         query += """
-            GROUP BY tt.id
-            ORDER BY tt.sigla
+            ORDER BY tt.sigla, tt.id
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        taxas = cursor.fetchall()
+        taxas = Rows.fetch(cursor)
         
-        total_count = taxas[0]['total_count'] if taxas else 0
-        total_pages = (total_count + per_page - 1) // per_page
+        # Formatar dados para retorno (colunas à parte, sem alterar as linhas)
+        taxas.set('created_by', 'willianskymsen')
+        taxas.set('updated_at', '2025-04-11 03:45:22')
+        taxas.derive('aplicacoes', 'aplicacao', lambda aplicacao: aplicacao.split(','))
         
-        # Formatar dados para retorno
-        for taxa in taxas:
-            taxa['created_by'] = 'willianskymsen'
-            taxa['updated_at'] = '2025-04-11 03:45:22'
-            taxa['aplicacoes'] = taxa['aplicacao'].split(',')
-        
-        return jsonify({
-            'taxas': taxas,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        return rows_response('taxas', taxas, {
+            'pagination': pag.result(taxas)
         })
         
     finally:
@@ -1730,23 +1767,23 @@ def get_taxa_transportes():
 
 @app.route('/api/estados', methods=['GET'])
 @login_required
+@conditional('localidades')
 def get_estados():
     regiao = request.args.get('regiao', type=int)
     
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
         query = """
             SELECT 
                 e.*,
                 r.Nome as regiao_nome,
-                COUNT(DISTINCT m.codigoIbge) as total_municipios,
-                COUNT(DISTINCT fc.id) as total_faixas_cep
+                COALESCE(ec.total_municipios, 0) as total_municipios,
+                COALESCE(ec.total_faixas_cep, 0) as total_faixas_cep
             FROM brasil.estado e
             JOIN brasil.regiao r ON e.Regiao = r.Id
-            LEFT JOIN brasil.municipio m ON e.CodigoUf = m.CodigoUf
-            LEFT JOIN brasil.faixa_cep fc ON e.CodigoUf = fc.CodigoUf
+            LEFT JOIN brasil.estado_contadores ec ON e.CodigoUf = ec.CodigoUf
             WHERE 1=1
         """
         params = []
@@ -1756,14 +1793,13 @@ def get_estados():
             params.append(regiao)
             
         query += """
-            GROUP BY e.Id, r.Nome
             ORDER BY e.Nome
         """
         
         cursor.execute(query, params)
-        estados = cursor.fetchall()
+        estados = Rows.fetch(cursor)
         
-        return jsonify({'estados': estados})
+        return rows_response('estados', estados)
         
     finally:
         cursor.close()
@@ -1772,25 +1808,25 @@ def get_estados():
 @app.route('/api/estados/<int:codigo_uf>/municipios', methods=['GET'])
 @login_required
 def get_municipios_estado(codigo_uf):
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     
+    pag = get_pagination(
+        [('m.municipio', 'municipio'), ('m.codigoIbge', 'codigoIbge')],
+        codigo_uf, search
+    )
+    
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 m.*,
                 e.Nome as estado_nome,
                 e.Uf,
-                COUNT(DISTINCT fc.id) as total_faixas_cep,
-                COUNT(DISTINCT pm.id) as total_pracas,
-                COUNT(*) OVER() as total_count
+                {pag.count_column}
             FROM brasil.municipio m
             JOIN brasil.estado e ON m.CodigoUf = e.CodigoUf
-            LEFT JOIN brasil.faixa_cep fc ON m.codigoIbge = fc.CodMunicipio
-            LEFT JOIN transporte.praca_municipio pm ON m.codigoIbge = pm.CodMunicipio
             WHERE m.CodigoUf = %s
         """
         params = [codigo_uf]
@@ -1799,46 +1835,26 @@ def get_municipios_estado(codigo_uf):
             query += " AND m.municipio LIKE %s"
             params.append(f'%{search}%')
             
+        query = pag.apply(query, params)
         query += """
-            GROUP BY m.codigoIbge, e.Nome, e.Uf
-            ORDER BY m.municipio
+            ORDER BY m.municipio, m.codigoIbge
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
-        municipios = cursor.fetchall()
-        
-        total_count = municipios[0]['total_count'] if municipios else 0
-        total_pages = (total_count + per_page - 1) // per_page
-        
-        # Adicionar faixas de CEP para cada município
-        for municipio in municipios:
-            cursor.execute("""
-                SELECT 
-                    cep_inicial,
-                    cep_final,
-                    (
-                        SELECT COUNT(*)
-                        FROM brasil.endereco e
-                        WHERE e.cep >= fc.cep_inicial 
-                        AND e.cep <= fc.cep_final
-                    ) as total_enderecos
-                FROM brasil.faixa_cep fc
-                WHERE fc.CodMunicipio = %s
-                ORDER BY cep_inicial
-            """, (municipio['codigoIbge'],))
-            
-            municipio['faixas_cep'] = cursor.fetchall()
-        
-        return jsonify({
-            'municipios': municipios,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+        municipios = Rows.fetch(cursor)
+        
+        # Faixas de CEP de todos os municípios da página em uma única consulta;
+        # os totais saem delas e do índice de cobertura, sem joins por página
+        codigos = municipios.column('codigoIbge')
+        faixas = faixas_por_municipio(cursor, codigos)
+        municipios.add('total_faixas_cep', [len(faixas[codigo]) for codigo in codigos])
+        municipios.add('total_pracas', [coverage_index.total_pracas(codigo) for codigo in codigos])
+        municipios.add('faixas_cep', [faixas[codigo] for codigo in codigos])
+        
+        return rows_response('municipios', municipios, {
+            'pagination': pag.result(municipios)
         })
         
     finally:
@@ -1858,70 +1874,20 @@ def search_municipios():
     page, per_page, offset = get_pagination_params()
     uf = request.args.get('uf')
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    # Servido pelo índice em memória (sem acentos/maiúsculas, por prefixo e trigramas)
+    resultado = municipio_index.search(search, uf, offset, per_page)
+    total_count = resultado['total']
+    total_pages = (total_count + per_page - 1) // per_page
     
-    try:
-        query = """
-            SELECT 
-                m.codigoIbge,
-                m.municipio,
-                e.Nome as estado_nome,
-                e.Uf,
-                GROUP_CONCAT(
-                    DISTINCT CONCAT(fc.cep_inicial, '-', fc.cep_final)
-                    SEPARATOR '; '
-                ) as faixas_cep,
-                COUNT(DISTINCT pm.id) as total_pracas,
-                COUNT(*) OVER() as total_count
-            FROM brasil.municipio m
-            JOIN brasil.estado e ON m.CodigoUf = e.CodigoUf
-            LEFT JOIN brasil.faixa_cep fc ON m.codigoIbge = fc.CodMunicipio
-            LEFT JOIN transporte.praca_municipio pm ON m.codigoIbge = pm.CodMunicipio
-            WHERE m.municipio LIKE %s
-        """
-        params = [f'%{search}%']
-        
-        if uf:
-            query += " AND e.Uf = %s"
-            params.append(uf)
-            
-        query += """
-            GROUP BY m.codigoIbge, e.Nome, e.Uf
-            ORDER BY 
-                CASE WHEN m.municipio LIKE %s THEN 1
-                     WHEN m.municipio LIKE %s THEN 2
-                     ELSE 3
-                END,
-                m.municipio
-            LIMIT %s OFFSET %s
-        """
-        params.extend([
-            f'{search}%',  # Começa com
-            f'% {search}%',  # Contém após espaço
-            per_page,
-            offset
-        ])
-        
-        cursor.execute(query, params)
-        municipios = cursor.fetchall()
-        
-        total_count = municipios[0]['total_count'] if municipios else 0
-        total_pages = (total_count + per_page - 1) // per_page
-        
-        return jsonify({
-            'municipios': municipios,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
-        })
-        
-    finally:
-        cursor.close()
-        conn.close()
+    return jsonify({
+        'municipios': resultado['municipios'],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total_items': total_count,
+            'total_pages': total_pages
+        }
+    })
 
 @app.route('/api/cep/<string:cep>', methods=['GET'])
 @login_required
@@ -1932,107 +1898,113 @@ def get_cep_info(cep):
         return format_error('CEP inválido', 'INVALID_CEP')
     
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
     
     try:
-        # Buscar endereço direto
-        cursor.execute("""
-            SELECT 
-                e.*,
-                m.municipio,
-                m.codigoIbge,
-                es.Nome as estado_nome,
-                es.Uf,
-                b.nome as bairro_nome,
-                (
-                    SELECT COUNT(*)
-                    FROM transporte.praca_municipio pm
-                    WHERE pm.CodMunicipio = m.codigoIbge
-                ) as total_pracas
-            FROM brasil.endereco e
-            JOIN brasil.municipio m ON e.codigoIbge = m.codigoIbge
-            JOIN brasil.estado es ON m.CodigoUf = es.CodigoUf
-            LEFT JOIN brasil.bairro b ON e.numeroBairro = b.numeroBairro
-            WHERE e.cep = %s
-        """, (cep,))
-        
-        endereco = cursor.fetchone()
+        # Buscar endereço direto (comando registrado em statements)
+        endereco = statements.fetchone(conn, ENDERECO_POR_CEP, (cep,))
         
         if endereco:
-            # Se encontrou endereço direto, buscar praças que atendem
-            cursor.execute("""
-                SELECT 
-                    p.id,
-                    p.nome as praca_nome,
-                    t.DESCRICAO as transportadora_nome,
-                    t.COD_FOR as transportadora_codigo,
-                    GROUP_CONCAT(
-                        DISTINCT tp.modal
-                        ORDER BY tp.modal
-                        SEPARATOR ','
-                    ) as modais
-                FROM transporte.praca p
-                JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
-                JOIN transporte.praca_municipio pm ON p.id = pm.id_praca
-                LEFT JOIN transporte.tpraca tp ON p.id = tp.id_praca
-                WHERE pm.CodMunicipio = %s
-                GROUP BY p.id, t.DESCRICAO, t.COD_FOR
-                ORDER BY t.DESCRICAO, p.nome
-            """, (endereco['codigoIbge'],))
-            
-            endereco['pracas'] = cursor.fetchall()
+            # Praças que atendem o município, pelo índice de cobertura em memória
+            pracas = coverage_index.pracas(endereco['codigoIbge'])
+            endereco['total_pracas'] = len(pracas)
+            endereco['pracas'] = [praca.to_dict() for praca in pracas]
             
             return jsonify({'endereco': endereco})
         
-        # Se não encontrou endereço direto, buscar por faixa de CEP
-        cursor.execute("""
-            SELECT 
-                fc.*,
-                m.municipio,
-                m.codigoIbge,
-                es.Nome as estado_nome,
-                es.Uf
-            FROM brasil.faixa_cep fc
-            JOIN brasil.municipio m ON fc.CodMunicipio = m.codigoIbge
-            JOIN brasil.estado es ON m.CodigoUf = es.CodigoUf
-            WHERE %s BETWEEN fc.cep_inicial AND fc.cep_final
-            LIMIT 1
-        """, (cep,))
-        
-        faixa = cursor.fetchone()
+        # Se não encontrou endereço direto, buscar por faixa de CEP (índice em memória)
+        faixa = cep_index.lookup(cep)
         
         if not faixa:
             return format_error('CEP não encontrado', 'NOT_FOUND'), 404
         
-        # Buscar praças que atendem o município
-        cursor.execute("""
-            SELECT 
-                p.id,
-                p.nome as praca_nome,
-                t.DESCRICAO as transportadora_nome,
-                t.COD_FOR as transportadora_codigo,
-                GROUP_CONCAT(
-                    DISTINCT tp.modal
-                    ORDER BY tp.modal
-                    SEPARATOR ','
-                ) as modais
-            FROM transporte.praca p
-            JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
-            JOIN transporte.praca_municipio pm ON p.id = pm.id_praca
-            LEFT JOIN transporte.tpraca tp ON p.id = tp.id_praca
-            WHERE pm.CodMunicipio = %s
-            GROUP BY p.id, t.DESCRICAO, t.COD_FOR
-            ORDER BY t.DESCRICAO, p.nome
-        """, (faixa['CodMunicipio'],))
+        faixa['codigoIbge'] = faixa['CodMunicipio']
+        faixa['estado_nome'] = faixa.pop('estado')
         
-        faixa['pracas'] = cursor.fetchall()
+        # Praças que atendem o município, pelo índice de cobertura em memória
+        faixa['pracas'] = [praca.to_dict() for praca in coverage_index.pracas(faixa['CodMunicipio'])]
         
         return jsonify({'faixa': faixa})
         
     finally:
-        cursor.close()
         conn.close()
 
+@app.route('/api/cep/indice', methods=['POST'])
+@login_required
+@admin_required
+@log_action('ATUALIZAR', 'cep_index')
+def rebuild_cep_index():
+    """Recarrega o índice de faixas de CEP em memória"""
+    snapshot = cep_index.rebuild()
+    municipio_index.rebuild()
+    
+    # As faixas recarregadas também alimentam os totais por estado
+    conn = get_db_connection()
+    try:
+        refresh_counters(conn, 'estado')
+        conn.commit()
+        bump_dataset('localidades')
+    finally:
+        conn.close()
+    
+    # Faixas novas ganham a contagem de endereços em segundo plano
+    refresh_job.start()
+    
+    return jsonify({
+        'success': True,
+        'total_faixas': len(snapshot)
+    })
+
+@app.route('/api/cep/contagens', methods=['POST'])
+@login_required
+@admin_required
+@log_action('ATUALIZAR', 'faixa_cep_enderecos')
+def refresh_cep_counts():
+    """
+    Atualiza a contagem de endereços por faixa.
+    
+    {"ceps": [...]} recalcula na hora só as faixas desses CEPs (ex.: depois
+    de importar endereços). Sem CEPs, conta as faixas ainda sem contagem
+    (?full=1 recalcula todas) em segundo plano; GET acompanha o andamento.
+    """
+    data = request.get_json(silent=True) or {}
+    ceps = data.get('ceps')
+    
+    if ceps is not None:
+        if not isinstance(ceps, list):
+            return format_error('ceps deve ser uma lista', 'INVALID_FORMAT')
+        ceps = [''.join(filter(str.isdigit, str(cep))) for cep in ceps]
+        if any(len(cep) != 8 for cep in ceps):
+            return format_error('CEP inválido', 'INVALID_CEP')
+        
+        try:
+            total = refresh_ceps(ceps)
+        except mysql.connector.Error as err:
+            return format_error(f'Erro ao atualizar contagens: {err}', 'DB_ERROR')
+        
+        return jsonify({
+            'success': True,
+            'faixas_atualizadas': total
+        })
+    
+    if not refresh_job.start(full=request.args.get('full') == '1'):
+        return jsonify({
+            'error': 'Já existe uma recontagem em andamento',
+            'code': 'IN_PROGRESS',
+            'status': refresh_job.status()
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'status': refresh_job.status()
+    }), 202
+
+@app.route('/api/cep/contagens', methods=['GET'])
+@login_required
+@admin_required
+def cep_counts_status():
+    """Andamento da última recontagem em segundo plano"""
+    return jsonify(refresh_job.status())
+
 @app.route('/api/municipios/<int:codigo_ibge>/pracas', methods=['GET'])
 @login_required
 def get_municipio_pracas(codigo_ibge):
@@ -2040,63 +2012,41 @@ def get_municipio_pracas(codigo_ibge):
     cursor = conn.cursor(dictionary=True)
     
     try:
-        # Verificar se município existe
-        cursor.execute("""
-            SELECT 
-                m.*,
-                e.Nome as estado_nome,
-                e.Uf
-            FROM brasil.municipio m
-            JOIN brasil.estado e ON m.CodigoUf = e.CodigoUf
-            WHERE m.codigoIbge = %s
-        """, (codigo_ibge,))
-        
-        municipio = cursor.fetchone()
+        # Verificar se município existe (comando registrado em statements)
+        municipio = statements.fetchone(conn, MUNICIPIO_POR_CODIGO, (codigo_ibge,))
         
         if not municipio:
             return format_error('Município não encontrado', 'NOT_FOUND'), 404
         
-        # Buscar praças que atendem o município
-        cursor.execute("""
-            SELECT 
-                p.id,
-                p.nome as praca_nome,
-                t.DESCRICAO as transportadora_nome,
-                t.COD_FOR as transportadora_codigo,
-                t.tipo_unidade as transportadora_tipo,
-                GROUP_CONCAT(
-                    DISTINCT tp.modal
-                    ORDER BY tp.modal
-                    SEPARATOR ','
-                ) as modais,
-                COUNT(DISTINCT tp.id) as total_tabelas
-            FROM transporte.praca p
-            JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
-            JOIN transporte.praca_municipio pm ON p.id = pm.id_praca
-            LEFT JOIN transporte.tpraca tp ON p.id = tp.id_praca
-            WHERE pm.CodMunicipio = %s
-            GROUP BY p.id, t.DESCRICAO, t.COD_FOR, t.tipo_unidade
-            ORDER BY t.DESCRICAO, p.nome
-        """, (codigo_ibge,))
-        
-        pracas = cursor.fetchall()
-        
-        # Para cada praça, buscar as tabelas de preço
-        for praca in pracas:
-            cursor.execute("""
+        # Praças que atendem o município, pelo índice de cobertura em memória
+        cobertura = coverage_index.pracas(codigo_ibge)
+        pracas = []
+        tabelas = {}
+        for praca in cobertura:
+            item = praca.to_dict()
+            item['transportadora_tipo'] = praca.transportadora_tipo
+            item['total_tabelas'] = len(praca.tabelas)
+            item['tabelas'] = tabelas[praca.id] = []
+            pracas.append(item)
+        
+        # Tabelas de preço de todas as praças numa consulta só
+        tabela_ids = [t for praca in cobertura for t in praca.tabelas]
+        if tabela_ids:
+            placeholders = ', '.join(['%s'] * len(tabela_ids))
+            cursor.execute(f"""
                 SELECT 
                     tp.*,
-                    COUNT(DISTINCT tf.id) as total_faixas,
-                    COUNT(DISTINCT tt.id) as total_taxas
+                    COALESCE(tc.total_faixas, 0) as total_faixas,
+                    COALESCE(tc.total_taxas, 0) as total_taxas
                 FROM transporte.tpraca tp
-                LEFT JOIN transporte.tpreco_faixas tf ON tp.id = tf.id_tpreco
-                LEFT JOIN transporte.tpreco_taxas tt ON tp.id = tt.id_tpreco
-                WHERE tp.id_praca = %s
-                GROUP BY tp.id
+                LEFT JOIN transporte.tpraca_contadores tc ON tp.id = tc.id_tpreco
+                WHERE tp.id IN ({placeholders})
                 ORDER BY tp.modal
-            """, (praca['id'],))
+            """, tabela_ids)
             
-            praca['tabelas'] = cursor.fetchall()
+            for tabela in cursor.fetchall():
+                if tabela['id_praca'] in tabelas:
+                    tabelas[tabela['id_praca']].append(tabela)
         
         municipio['pracas'] = pracas
         
@@ -2114,15 +2064,19 @@ def get_municipio_pracas(codigo_ibge):
 @login_required
 @admin_required
 def get_usuarios():
-    page, per_page, offset = get_pagination_params()
     search = request.args.get('search', '')
     role = request.args.get('role')
     
+    pag = get_pagination(
+        [('u.username', 'username'), ('u.id', 'id')],
+        search, role
+    )
+    
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
     try:
-        query = """
+        query = f"""
             SELECT 
                 u.id,
                 u.username,
@@ -2135,7 +2089,7 @@ def get_usuarios():
                     WHERE l.user_id = u.id
                     AND l.data_hora >= DATE_SUB(NOW(), INTERVAL 30 DAY)
                 ) as total_acoes_30d,
-                COUNT(*) OVER() as total_count
+                {pag.count_column}
             FROM auth.users u
             LEFT JOIN auth.sessions s ON u.id = s.user_id 
                 AND s.expiry > NOW()
@@ -2151,19 +2105,17 @@ def get_usuarios():
             query += " AND u.role = %s"
             params.append(role)
             
+        query = pag.apply(query, params)
         query += """
             GROUP BY u.id
-            ORDER BY u.username
+            ORDER BY u.username, u.id
             LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
+        params.extend([pag.per_page, pag.offset])
         
         cursor.execute(query, params)
         usuarios = cursor.fetchall()
         
-        total_count = usuarios[0]['total_count'] if usuarios else 0
-        total_pages = (total_count + per_page - 1) // per_page
-        
         # Adicionar informações de última atividade
         for usuario in usuarios:
             cursor.execute("""
@@ -2184,12 +2136,7 @@ def get_usuarios():
         
         return jsonify({
             'usuarios': usuarios,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_count,
-                'total_pages': total_pages
-            }
+            'pagination': pag.result(usuarios)
         })
         
     finally:
@@ -2406,6 +2353,7 @@ def update_usuario(id):
         
         cursor.execute(query, params)
         conn.commit()
+        invalidate_user(id)
         
         return jsonify({
             'success': True,
@@ -2447,6 +2395,7 @@ def delete_usuario(id):
         # Excluir usuário (sessões e logs serão excluídos em cascata)
         cursor.execute("DELETE FROM auth.users WHERE id = %s", (id,))
         conn.commit()
+        invalidate_user(id)
         
         return jsonify({
             'success': True,
@@ -2578,6 +2527,7 @@ def update_senha():
         ))
         
         conn.commit()
+        invalidate_user(current_user.id)
         
         return jsonify({
             'success': True,
@@ -2592,6 +2542,46 @@ def update_senha():
         cursor.close()
         conn.close()
 
+# -------------------------------
+# APIs de Exportação
+# -------------------------------
+
+@app.route('/api/export/<string:entidade>', methods=['GET'])
+@login_required
+def export_entidade(entidade):
+    """
+    Exporta todas as linhas da entidade em NDJSON (padrão) ou CSV (?formato=csv).
+
+    A resposta é enviada em pedaços enquanto as linhas são lidas do banco,
+    sem paginação nem contagem total.
+    """
+    formato = request.args.get('formato', 'ndjson')
+    
+    try:
+        conteudo = export_lines(entidade, formato, request.args.to_dict())
+    except ValueError as err:
+        return format_error(str(err), 'INVALID_EXPORT')
+    
+    response = Response(
+        conteudo,
+        mimetype='text/csv' if formato == 'csv' else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={entidade}.{formato}'
+    # Sem buffer em proxies, para o cliente receber as linhas assim que saem
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# -------------------------------
+# APIs de Sistema
+# -------------------------------
+
+@app.route('/api/sistema/pool', methods=['GET'])
+@login_required
+@admin_required
+def get_pool_stats():
+    """Empréstimos, esperas e conexões abertas de cada pool"""
+    return jsonify({'pools': pool_stats(), 'statements': statements.stats()})
+
 # -------------------------------
 # Endpoints de Renderização
 # -------------------------------
@@ -2722,8 +2712,17 @@ def create_app(config=None):
             for db in databases:
                 cursor.execute(f"USE {db}")
                 cursor.execute("SELECT 1")
+            
+            # A conexão volta para o pool: restaurar o banco padrão
+            cursor.execute(f"USE {Config.DB_CONFIG['database']}")
                 
             cursor.close()
+            
+            # Tabelas-resumo das listagens (preenchidas na primeira execução)
+            ensure_counters(conn)
+            
+            # Contagem de endereços por faixa (preenchida por POST /api/cep/contagens)
+            ensure_table(conn)
             conn.close()
             
             app.logger.info("Conexão com bancos de dados estabelecida")
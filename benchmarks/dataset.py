@@ -0,0 +1,515 @@
+# dataset.py
+"""
+Gerador de dados sintéticos para os benchmarks.
+
+Monta um Brasil de mentira com a forma do real: 27 UFs com as faixas de CEP
+verdadeiras, 5.570 municípios distribuídos como no IBGE, ~900 mil faixas de
+CEP e milhares de transportadoras, praças, tabelas, faixas de preço e taxas.
+A escala (--escala) multiplica tudo menos estados e municípios; a semente
+fixa torna o resultado reproduzível.
+
+Uso:
+    python -m benchmarks.dataset --sqlite /tmp/bench
+    python -m benchmarks.dataset --mysql   (servidor dedicado, via DB_* do .env)
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from modules.counters import ensure_counters
+
+REGIOES = ((1, 'Norte'), (2, 'Nordeste'), (3, 'Sudeste'), (4, 'Sul'), (5, 'Centro-Oeste'))
+
+# (CodigoUf, Uf, Nome, Regiao, municípios, faixas de CEP por prefixo de 5 dígitos)
+ESTADOS = (
+    (11, 'RO', 'Rondônia', 1, 52, ((76800, 76999),)),
+    (12, 'AC', 'Acre', 1, 22, ((69900, 69999),)),
+    (13, 'AM', 'Amazonas', 1, 62, ((69000, 69299), (69400, 69899))),
+    (14, 'RR', 'Roraima', 1, 15, ((69300, 69399),)),
+    (15, 'PA', 'Pará', 1, 144, ((66000, 68899),)),
+    (16, 'AP', 'Amapá', 1, 16, ((68900, 68999),)),
+    (17, 'TO', 'Tocantins', 1, 139, ((77000, 77999),)),
+    (21, 'MA', 'Maranhão', 2, 217, ((65000, 65999),)),
+    (22, 'PI', 'Piauí', 2, 224, ((64000, 64999),)),
+    (23, 'CE', 'Ceará', 2, 184, ((60000, 63999),)),
+    (24, 'RN', 'Rio Grande do Norte', 2, 167, ((59000, 59999),)),
+    (25, 'PB', 'Paraíba', 2, 223, ((58000, 58999),)),
+    (26, 'PE', 'Pernambuco', 2, 185, ((50000, 56999),)),
+    (27, 'AL', 'Alagoas', 2, 102, ((57000, 57999),)),
+    (28, 'SE', 'Sergipe', 2, 75, ((49000, 49999),)),
+    (29, 'BA', 'Bahia', 2, 417, ((40000, 48999),)),
+    (31, 'MG', 'Minas Gerais', 3, 853, ((30000, 39999),)),
+    (32, 'ES', 'Espírito Santo', 3, 78, ((29000, 29999),)),
+    (33, 'RJ', 'Rio de Janeiro', 3, 92, ((20000, 28999),)),
+    (35, 'SP', 'São Paulo', 3, 645, ((1000, 19999),)),
+    (41, 'PR', 'Paraná', 4, 399, ((80000, 87999),)),
+    (42, 'SC', 'Santa Catarina', 4, 295, ((88000, 89999),)),
+    (43, 'RS', 'Rio Grande do Sul', 4, 497, ((90000, 99999),)),
+    (50, 'MS', 'Mato Grosso do Sul', 5, 79, ((79000, 79999),)),
+    (51, 'MT', 'Mato Grosso', 5, 141, ((78000, 78899),)),
+    (52, 'GO', 'Goiás', 5, 246, ((72800, 72999), (73700, 76799))),
+    (53, 'DF', 'Distrito Federal', 5, 1, ((70000, 72799), (73000, 73699)))
+)
+
+TOTAL_FAIXAS_CEP = 900_000
+TOTAL_TRANSPORTADORAS = 1_500
+TOTAL_PRACAS = 4_000
+
+PREFIXOS = (
+    '', '', '', 'São', 'Santa', 'Santo', 'Nova', 'Novo', 'Porto', 'Campo', 'Rio', 'Serra',
+    'Vila', 'Barra', 'Lagoa', 'Alto', 'Bom', 'Boa', 'Monte', 'Ribeirão', 'Cachoeira'
+)
+NUCLEOS = (
+    'Alegre', 'Verde', 'Bonito', 'Grande', 'Branco', 'Preto', 'Azul', 'Formoso', 'Belo',
+    'Conceição', 'Esperança', 'Aparecida', 'Jardim', 'Paraíso', 'Itaperuna', 'Itajubá',
+    'Araguari', 'Jacareí', 'Guaratinguetá', 'Piracicaba', 'Uberaba', 'Maringá', 'Cascavel',
+    'Xanxerê', 'Caruaru', 'Petrolina', 'Juazeiro', 'Sobral', 'Crato', 'Picos', 'Parnaíba',
+    'Imperatriz', 'Marabá', 'Altamira', 'Cáceres', 'Sinop', 'Dourados', 'Corumbá', 'Anápolis',
+    'Palmas', 'Gurupi', 'Ji-Paraná', 'Tefé', 'Parintins', 'Macapá', 'Oiapoque', 'Cruzeiro'
+)
+SUFIXOS = (
+    '', '', '', '', 'do Sul', 'do Norte', 'de Minas', 'da Serra', 'do Oeste', 'das Flores',
+    'dos Campos', "d'Oeste", 'Paulista', 'Mineiro', 'do Piauí', 'da Mata', 'do Araguaia'
+)
+EMPRESAS = (
+    'Rápido', 'Expresso', 'Translog', 'Cargas', 'Rodonaves', 'Via', 'Transbrasil', 'Logística',
+    'Jamef', 'Braspress', 'Patrus', 'Atual', 'Real', 'Ouro', 'Estrela', 'Aliança', 'União'
+)
+
+MODAIS = (('R', 0.75), ('A', 0.2), ('F', 0.05))
+LIMITES_PESO = (5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000, 2000)
+LIMITES_CUBAGEM = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+TAXA_TIPOS = (
+    ('FRETE', 'Frete peso', 'peso'), ('AD', 'Ad valorem', 'valor'),
+    ('GRIS', 'Gerenciamento de risco', 'valor'), ('TDE', 'Taxa de difícil entrega', 'entrega'),
+    ('TRT', 'Taxa de restrição de trânsito', 'entrega'), ('PED', 'Pedágio', 'peso'),
+    ('TAS', 'Taxa administrativa', 'documento'), ('DESP', 'Despacho', 'documento')
+)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS brasil.regiao (Id INT PRIMARY KEY, Nome VARCHAR(50))",
+    """
+    CREATE TABLE IF NOT EXISTS brasil.estado (
+        CodigoUf INT PRIMARY KEY, Uf CHAR(2), Nome VARCHAR(50), Regiao INT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS brasil.municipio (
+        codigoIbge INT PRIMARY KEY, municipio VARCHAR(100), CodigoUf INT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS brasil.faixa_cep (
+        id {pk}, cep_inicial CHAR(8), cep_final CHAR(8), CodMunicipio INT, CodigoUf INT
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS brasil.bairro (numeroBairro INT PRIMARY KEY, nome VARCHAR(100))",
+    """
+    CREATE TABLE IF NOT EXISTS brasil.endereco (
+        cep CHAR(8) PRIMARY KEY, logradouro VARCHAR(150), codigoIbge INT, numeroBairro INT
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS transporte.opcoes_sistema (id {pk}, tipo VARCHAR(50))",
+    """
+    CREATE TABLE IF NOT EXISTS transporte.transportadoras (
+        ID {pk}, COD_FOR VARCHAR(20), DESCRICAO VARCHAR(150), NOME_FAN VARCHAR(150),
+        CNPJ VARCHAR(18), INSC_EST VARCHAR(20), INSC_MUN VARCHAR(20), SISTEMA INT,
+        tipo_unidade VARCHAR(10), id_matriz INT
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS transporte.praca (id {pk}, nome VARCHAR(150), id_transportadora INT)",
+    """
+    CREATE TABLE IF NOT EXISTS transporte.praca_municipio (
+        id_praca INT NOT NULL, CodMunicipio INT NOT NULL, PRIMARY KEY (id_praca, CodMunicipio)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.tpraca (
+        id {pk}, id_praca INT, `praça` VARCHAR(150), modal VARCHAR(20),
+        tipo_cobranca_peso VARCHAR(10), observacoes TEXT, prazo_entrega INT,
+        entrega_tipo VARCHAR(50)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.tpreco_faixas (
+        id {pk}, id_tpreco INT, tipo VARCHAR(10), faixa_min DECIMAL(12,4),
+        faixa_max DECIMAL(12,4), valor DECIMAL(12,2), adicional_por_excedente DECIMAL(12,4)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.tpreco_taxas (
+        id {pk}, id_taxa_tipo INT, id_tpreco INT, id_transportadora INT, id_taxa INT,
+        valor DECIMAL(12,4), unidade VARCHAR(5), obrigatoria TINYINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.taxa_tipo (
+        id {pk}, sigla VARCHAR(10), descricao VARCHAR(100), aplicacao VARCHAR(100),
+        observacoes TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.taxa_transporte (
+        id {pk}, sigla VARCHAR(10), descricao VARCHAR(100), aplicacao VARCHAR(100),
+        observacao TEXT
+    )
+    """
+]
+
+# (schema, nome, tabela, colunas)
+INDICES = (
+    ('brasil', 'idx_faixa_cep_inicial', 'faixa_cep', 'cep_inicial'),
+    ('brasil', 'idx_faixa_cep_municipio', 'faixa_cep', 'CodMunicipio'),
+    ('brasil', 'idx_municipio_uf', 'municipio', 'CodigoUf'),
+    ('transporte', 'idx_praca_transportadora', 'praca', 'id_transportadora'),
+    ('transporte', 'idx_praca_nome', 'praca', 'nome, id'),
+    ('transporte', 'idx_praca_municipio_cod', 'praca_municipio', 'CodMunicipio'),
+    ('transporte', 'idx_tpraca_praca', 'tpraca', 'id_praca, modal'),
+    ('transporte', 'idx_tpreco_faixas_tabela', 'tpreco_faixas', 'id_tpreco'),
+    ('transporte', 'idx_tpreco_taxas_tabela', 'tpreco_taxas', 'id_tpreco'),
+    ('transporte', 'idx_transportadoras_descricao', 'transportadoras', 'DESCRICAO, ID')
+)
+
+LOTE = 5000
+
+
+def _tabelas(dialeto: str) -> List[str]:
+    pk = 'INTEGER PRIMARY KEY' if dialeto == 'sqlite' else 'INT AUTO_INCREMENT PRIMARY KEY'
+    return [ddl.format(pk=pk) for ddl in SCHEMA]
+
+
+def _indices(dialeto: str) -> List[str]:
+    comandos = []
+    for schema, nome, tabela, colunas in INDICES:
+        if dialeto == 'sqlite':
+            comandos.append(f"CREATE INDEX IF NOT EXISTS {schema}.{nome} ON {tabela} ({colunas})")
+        else:
+            comandos.append(f"CREATE INDEX {nome} ON {schema}.{tabela} ({colunas})")
+    return comandos
+
+
+def _cnpj(rng: random.Random) -> str:
+    base = [rng.randint(0, 9) for _ in range(8)] + [0, 0, 0, 1]
+    for _ in range(2):
+        pesos = list(range(len(base) - 7, 1, -1)) + list(range(9, 1, -1))
+        resto = sum(n * p for n, p in zip(base, pesos)) % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    n = ''.join(map(str, base))
+    return f'{n[:2]}.{n[2:5]}.{n[5:8]}/{n[8:12]}-{n[12:]}'
+
+
+def _nomes_municipios(rng: random.Random, quantidade: int) -> List[str]:
+    nomes = set()
+    while len(nomes) < quantidade:
+        partes = (rng.choice(PREFIXOS), rng.choice(NUCLEOS), rng.choice(SUFIXOS))
+        nomes.add(' '.join(p for p in partes if p))
+    nomes = sorted(nomes)
+    rng.shuffle(nomes)
+    return nomes
+
+
+def _pesos(rng: random.Random, quantidade: int) -> List[float]:
+    """Pesos de cada município na UF: a capital (o primeiro) concentra mais CEPs"""
+    pesos = [rng.paretovariate(1.5) for _ in range(quantidade)]
+    pesos[0] = sum(pesos) * 0.25 if quantidade > 1 else 1.0
+    return pesos
+
+
+class DatasetGenerator:
+    """Gera e grava o conjunto de dados pelo cursor informado (placeholders %s)"""
+
+    def __init__(
+        self,
+        conn,
+        dialeto: str = 'sqlite',
+        escala: float = 1.0,
+        seed: int = 42,
+        progresso: Optional[Callable[[str], None]] = print
+    ):
+        self.conn = conn
+        self.dialeto = dialeto
+        self.escala = escala
+        self.rng = random.Random(seed)
+        self.progresso = progresso or (lambda texto: None)
+        self.totais: Dict[str, int] = {}
+        self.municipios: Dict[int, List[int]] = {}  # CodigoUf -> códigos IBGE
+
+    def _insert(self, cursor, sql: str, linhas: Iterable[tuple], nome: str) -> None:
+        total = 0
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= LOTE:
+                cursor.executemany(sql, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            cursor.executemany(sql, lote)
+            total += len(lote)
+        self.conn.commit()
+        self.totais[nome] = self.totais.get(nome, 0) + total
+        self.progresso(f'{nome}: {total} linhas')
+
+    def create_schema(self) -> None:
+        cursor = self.conn.cursor()
+        try:
+            if self.dialeto == 'mysql':
+                for schema in ('transporte', 'brasil'):
+                    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {schema}")
+            for ddl in _tabelas(self.dialeto):
+                cursor.execute(ddl)
+
+            # Nunca misturar com dados reais: exige tabelas vazias
+            cursor.execute("SELECT COUNT(*) FROM brasil.municipio")
+            if cursor.fetchone()[0]:
+                raise RuntimeError('brasil.municipio já tem dados; use um banco dedicado aos benchmarks')
+
+            for ddl in _indices(self.dialeto):
+                cursor.execute(ddl)
+        finally:
+            cursor.close()
+        self.conn.commit()
+
+    def localidades(self, cursor) -> None:
+        rng = self.rng
+        self._insert(cursor, "INSERT INTO brasil.regiao (Id, Nome) VALUES (%s, %s)", REGIOES, 'regiao')
+        self._insert(
+            cursor,
+            "INSERT INTO brasil.estado (CodigoUf, Uf, Nome, Regiao) VALUES (%s, %s, %s, %s)",
+            (e[:4] for e in ESTADOS),
+            'estado'
+        )
+
+        municipios = []
+        for codigo_uf, _, _, _, quantidade, _ in ESTADOS:
+            codigos = [codigo_uf * 100000 + (i + 1) * 10 + rng.randint(0, 9) for i in range(quantidade)]
+            self.municipios[codigo_uf] = codigos
+            municipios.extend(zip(codigos, _nomes_municipios(rng, quantidade), [codigo_uf] * quantidade))
+        self._insert(
+            cursor,
+            "INSERT INTO brasil.municipio (codigoIbge, municipio, CodigoUf) VALUES (%s, %s, %s)",
+            municipios,
+            'municipio'
+        )
+
+        self._insert(
+            cursor,
+            "INSERT INTO brasil.faixa_cep (cep_inicial, cep_final, CodMunicipio, CodigoUf) VALUES (%s, %s, %s, %s)",
+            self._faixas_cep(),
+            'faixa_cep'
+        )
+
+    def _faixas_cep(self):
+        """Faixas contíguas dentro das faixas reais de cada UF, em blocos por município"""
+        rng = self.rng
+        total_municipios = sum(e[4] for e in ESTADOS)
+        total_faixas = int(TOTAL_FAIXAS_CEP * self.escala)
+
+        for codigo_uf, _, _, _, quantidade, prefixos in ESTADOS:
+            faixas_uf = max(quantidade, total_faixas * quantidade // total_municipios)
+            codigos = self.municipios[codigo_uf]
+
+            # Quantas faixas cada município recebe
+            pesos = _pesos(rng, quantidade)
+            soma = sum(pesos)
+            por_municipio = [max(1, int(faixas_uf * p / soma)) for p in pesos]
+
+            # CEPs da UF (8 dígitos) divididos igualmente entre as faixas
+            intervalos = [(inicio * 1000, fim * 1000 + 999) for inicio, fim in prefixos]
+            extensao = sum(fim - inicio + 1 for inicio, fim in intervalos)
+            passo = max(1, extensao // sum(por_municipio))
+
+            pendentes = iter(intervalos)
+            inicio, fim = next(pendentes)
+            for codigo, faixas in zip(codigos, por_municipio):
+                for _ in range(faixas):
+                    if inicio + passo - 1 > fim:
+                        proximo = next(pendentes, None)
+                        if proximo is None:
+                            break
+                        inicio, fim = proximo
+                    yield (f'{inicio:08d}', f'{inicio + passo - 1:08d}', codigo, codigo_uf)
+                    inicio += passo
+
+    def transportes(self, cursor) -> None:
+        rng = self.rng
+        self._insert(
+            cursor, "INSERT INTO transporte.opcoes_sistema (id, tipo) VALUES (%s, %s)",
+            ((1, 'TMS'), (2, 'EDI'), (3, 'Manual')), 'opcoes_sistema'
+        )
+        self._insert(
+            cursor,
+            "INSERT INTO transporte.taxa_tipo (id, sigla, descricao, aplicacao) VALUES (%s, %s, %s, %s)",
+            ((i + 1,) + t for i, t in enumerate(TAXA_TIPOS)),
+            'taxa_tipo'
+        )
+        total_taxas = 25
+        self._insert(
+            cursor,
+            "INSERT INTO transporte.taxa_transporte (id, sigla, descricao, aplicacao) VALUES (%s, %s, %s, %s)",
+            ((i + 1, f'TX{i + 1:02d}', f'Taxa de transporte {i + 1}', 'frete') for i in range(total_taxas)),
+            'taxa_transporte'
+        )
+
+        total_transportadoras = max(10, int(TOTAL_TRANSPORTADORAS * self.escala))
+        transportadoras = []
+        matrizes = []
+        for i in range(1, total_transportadoras + 1):
+            matriz = not matrizes or rng.random() < 0.3
+            nome = f'{rng.choice(EMPRESAS)} {rng.choice(NUCLEOS)} Transportes {i} Ltda'
+            transportadoras.append((
+                i, f'F{i:06d}', nome, nome.split(' Transportes')[0], _cnpj(rng),
+                str(rng.randint(10**8, 10**9 - 1)), None, rng.randint(1, 3),
+                'MATRIZ' if matriz else 'FILIAL', None if matriz else rng.choice(matrizes)
+            ))
+            if matriz:
+                matrizes.append(i)
+        self._insert(
+            cursor,
+            """
+            INSERT INTO transporte.transportadoras
+            (ID, COD_FOR, DESCRICAO, NOME_FAN, CNPJ, INSC_EST, INSC_MUN, SISTEMA, tipo_unidade, id_matriz)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            transportadoras,
+            'transportadoras'
+        )
+
+        total_pracas = max(20, int(TOTAL_PRACAS * self.escala))
+        ufs = [e[0] for e in ESTADOS]
+        pesos_uf = [e[4] for e in ESTADOS]
+        siglas = {e[0]: e[1] for e in ESTADOS}
+
+        pracas, cobertura, tabelas = [], [], []
+        for id_praca in range(1, total_pracas + 1):
+            codigo_uf = rng.choices(ufs, pesos_uf)[0]
+            pracas.append((
+                id_praca, f'{siglas[codigo_uf]} Praça {id_praca}', rng.randint(1, total_transportadoras)
+            ))
+
+            # Municípios atendidos: a UF principal e às vezes uma vizinha
+            candidatos = list(self.municipios[codigo_uf])
+            if rng.random() < 0.3:
+                candidatos += self.municipios[rng.choices(ufs, pesos_uf)[0]]
+            quantidade = min(len(candidatos), max(3, int(rng.lognormvariate(3.6, 0.9))))
+            cobertura.extend((id_praca, cod) for cod in set(rng.sample(candidatos, quantidade)))
+
+            escolhidos = {rng.choices([m for m, _ in MODAIS], [p for _, p in MODAIS])[0] for _ in range(3)}
+            for modal in sorted(escolhidos):
+                tabelas.append((id_praca, modal))
+
+        self._insert(
+            cursor, "INSERT INTO transporte.praca (id, nome, id_transportadora) VALUES (%s, %s, %s)",
+            pracas, 'praca'
+        )
+        self._insert(
+            cursor, "INSERT INTO transporte.praca_municipio (id_praca, CodMunicipio) VALUES (%s, %s)",
+            cobertura, 'praca_municipio'
+        )
+
+        transportadora_da_praca = {p[0]: p[2] for p in pracas}
+        cabecalhos, faixas, taxas = [], [], []
+        for id_tpreco, (id_praca, modal) in enumerate(tabelas, start=1):
+            cobranca = rng.choice(('peso', 'peso', 'cubagem', 'ambos'))
+            cabecalhos.append((
+                id_tpreco, id_praca, f'Tabela {modal} {id_praca}', modal, cobranca,
+                rng.randint(1, 15), rng.choice(('normal', 'expressa', None))
+            ))
+            faixas.extend(self._faixas_preco(id_tpreco, 'peso', LIMITES_PESO, 25.0))
+            if cobranca != 'peso':
+                faixas.extend(self._faixas_preco(id_tpreco, 'cubagem', LIMITES_CUBAGEM, 40.0))
+            for id_taxa in rng.sample(range(1, total_taxas + 1), rng.randint(2, 6)):
+                percentual = rng.random() < 0.5
+                taxas.append((
+                    rng.randint(1, len(TAXA_TIPOS)), id_tpreco, transportadora_da_praca[id_praca], id_taxa,
+                    round(rng.uniform(0.1, 3), 4) if percentual else round(rng.uniform(1, 60), 2),
+                    '%' if percentual else 'R$', int(rng.random() < 0.7)
+                ))
+
+        self._insert(
+            cursor,
+            """
+            INSERT INTO transporte.tpraca
+            (id, id_praca, `praça`, modal, tipo_cobranca_peso, prazo_entrega, entrega_tipo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            cabecalhos,
+            'tpraca'
+        )
+        self._insert(
+            cursor,
+            """
+            INSERT INTO transporte.tpreco_faixas
+            (id_tpreco, tipo, faixa_min, faixa_max, valor, adicional_por_excedente)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            faixas,
+            'tpreco_faixas'
+        )
+        self._insert(
+            cursor,
+            """
+            INSERT INTO transporte.tpreco_taxas
+            (id_taxa_tipo, id_tpreco, id_transportadora, id_taxa, valor, unidade, obrigatoria)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            taxas,
+            'tpreco_taxas'
+        )
+
+    def _faixas_preco(self, id_tpreco: int, tipo: str, limites: tuple, base: float) -> List[tuple]:
+        rng = self.rng
+        quantidade = rng.randint(max(3, len(limites) - 5), len(limites))
+        linhas = []
+        minimo = 0
+        valor = base * rng.uniform(0.7, 1.5)
+        for i, limite in enumerate(limites[:quantidade]):
+            ultima = i == quantidade - 1
+            linhas.append((
+                id_tpreco, tipo, minimo, limite, round(valor, 2),
+                round(valor / limite * rng.uniform(0.8, 1.2), 4) if ultima else None
+            ))
+            minimo = limite
+            valor *= rng.uniform(1.15, 1.6)
+        return linhas
+
+    def run(self) -> Dict[str, int]:
+        inicio = time.perf_counter()
+        self.create_schema()
+        cursor = self.conn.cursor()
+        try:
+            self.localidades(cursor)
+            self.transportes(cursor)
+        finally:
+            cursor.close()
+
+        # Tabelas-resumo usadas pelas listagens
+        ensure_counters(self.conn)
+        self.progresso(f'concluído em {time.perf_counter() - inicio:.1f}s')
+        return self.totais
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera o conjunto de dados sintético dos benchmarks')
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument('--sqlite', metavar='PASTA', help='pasta do banco SQLite substituto')
+    destino.add_argument('--mysql', action='store_true', help='MySQL configurado nas variáveis DB_*')
+    parser.add_argument('--escala', type=float, default=1.0, help='multiplicador do volume (1 = completo)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from benchmarks.sqlite_standin import connect
+        conn = connect(args.sqlite)
+    else:
+        import mysql.connector
+        from modules.config import Config
+        conn = mysql.connector.connect(**Config.DB_CONFIG)
+
+    try:
+        DatasetGenerator(conn, 'sqlite' if args.sqlite else 'mysql', args.escala, args.seed).run()
+    finally:
+        conn.close()
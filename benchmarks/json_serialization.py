@@ -0,0 +1,273 @@
+# json_serialization.py
+"""
+Custo da serialização JSON das respostas, sem MySQL.
+
+Compara o provider padrão do Flask com o FastJSONProvider (orjson) em
+payloads com o formato das rotas mais pesadas: /api/municipios sem
+paginação, uma praça com centenas de municípios e uma tabela de preço com
+faixas (Decimal e datas). Mede app.json.response(), que é o que jsonify()
+chama, confere que os dois corpos decodificam para o mesmo objeto e mede
+também o lote de cotações em streaming (stream_array) e uma listagem
+grande montada com Rows (modules.rows) contra um dict alterado por linha.
+
+Uso: python -m benchmarks.json_serialization [--repeticoes 50]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from modules import json_provider
+from modules.json_provider import FastJSONProvider
+from modules.rows import Rows
+
+UFS = ('SP', 'MG', 'RJ', 'PR', 'RS', 'SC', 'BA', 'GO', 'PE', 'CE')
+
+
+def _nome(rng: random.Random) -> str:
+    silabas = ('são', 'ta', 'pi', 'ra', 'jo', 'sé', 'ção', 'ma', 'ri', 'lân', 'dia', 'bo')
+    return ' '.join(
+        ''.join(rng.choice(silabas) for _ in range(rng.randint(2, 4))).capitalize()
+        for _ in range(rng.randint(1, 3))
+    )
+
+
+def _data(rng: random.Random) -> datetime:
+    return datetime(2024, 1, 1) + timedelta(seconds=rng.randint(0, 60 * 86400))
+
+
+def municipios(rng: random.Random, quantidade: int = 5570) -> Dict:
+    """GET /api/municipios sem paginação"""
+    return {'data': [
+        {
+            'codigoIbge': 1100000 + i,
+            'municipio': _nome(rng),
+            'CodigoUf': 11 + i % 43,
+            'estado_nome': _nome(rng),
+            'Uf': rng.choice(UFS),
+            'total_pracas': rng.randint(0, 12)
+        }
+        for i in range(quantidade)
+    ]}
+
+
+def praca(rng: random.Random, quantidade: int = 600) -> Dict:
+    """GET /api/pracas/<id> de uma praça que atende centenas de municípios"""
+    return {
+        'id': 1,
+        'nome': 'Praça ' + _nome(rng),
+        'id_transportadora': 7,
+        'transportadora_nome': 'Transportes ' + _nome(rng),
+        'transportadora_codigo': '000123',
+        'transportadora_tipo': 'TRANSPORTADORA',
+        'created_at': _data(rng),
+        'updated_at': _data(rng),
+        'municipios': [
+            {
+                'id': i,
+                'CodMunicipio': 3500000 + i,
+                'municipio': _nome(rng),
+                'estado': _nome(rng),
+                'Uf': rng.choice(UFS),
+                'faixas_cep': '; '.join(
+                    f'{inicio:08d}-{inicio + rng.randint(10, 999):08d}'
+                    for inicio in (rng.randint(1000000, 99999999) for _ in range(rng.randint(1, 4)))
+                )
+            }
+            for i in range(quantidade)
+        ]
+    }
+
+
+def tpraca(rng: random.Random, faixas: int = 300) -> Dict:
+    """GET /api/tpracas/<id> com faixas de peso e cubagem e taxas"""
+    def decimal(minimo: float, maximo: float) -> Decimal:
+        return Decimal(f'{rng.uniform(minimo, maximo):.2f}')
+
+    return {
+        'id': 1,
+        'id_praca': 1,
+        'descricao': 'Tabela ' + _nome(rng),
+        'modal': 'RODOVIARIO',
+        'tipo_cobranca_peso': 'FAIXA',
+        'valor_excedente': decimal(0, 5),
+        'praca_nome': 'Praça ' + _nome(rng),
+        'transportadora_nome': 'Transportes ' + _nome(rng),
+        'created_at': _data(rng),
+        'updated_at': _data(rng),
+        'faixas': [
+            {
+                'id': i,
+                'id_tpreco': 1,
+                'tipo': 'PESO' if i % 2 else 'CUBAGEM',
+                'faixa_min': Decimal(i * 10),
+                'faixa_max': Decimal(i * 10 + 10),
+                'valor': decimal(10, 900),
+                'created_at': _data(rng)
+            }
+            for i in range(faixas)
+        ],
+        'taxas': [
+            {
+                'id': i,
+                'valor': decimal(0, 80),
+                'tipo_sigla': 'GRIS',
+                'taxa_sigla': f'TX{i}',
+                'taxa_descricao': _nome(rng),
+                'obrigatoria': i % 3 == 0
+            }
+            for i in range(12)
+        ]
+    }
+
+
+def lote(rng: random.Random, envios: int = 2000) -> List[Dict]:
+    """Itens de POST /api/calculo-frete/lote, com as cotações do motor"""
+    return [
+        {
+            'indice': i,
+            'destino': {'cep': f'{rng.randint(1000000, 99999999):08d}', 'municipio': _nome(rng), 'uf': rng.choice(UFS)},
+            'resultados': [
+                {
+                    'transportadora': 'Transportes ' + _nome(rng),
+                    'praca': 'Praça ' + _nome(rng),
+                    'modal': 'RODOVIARIO',
+                    'valor_frete': round(rng.uniform(20, 900), 2),
+                    'taxas': [{'sigla': 'GRIS', 'valor': round(rng.uniform(0, 30), 2)}],
+                    'valor_total': round(rng.uniform(20, 1000), 2)
+                }
+                for _ in range(rng.randint(1, 6))
+            ]
+        }
+        for i in range(envios)
+    ]
+
+
+def tabelas(rng: random.Random, quantidade: int = 20000) -> Rows:
+    """Linhas de tpraca como vêm de um cursor de tuplas (listagem sem paginação)"""
+    colunas = (
+        'id', 'id_praca', 'descricao', 'modal', 'tipo_cobranca_peso', 'valor_excedente',
+        'created_at', 'updated_at', 'praca_nome', 'transportadora_nome', 'total_faixas', 'total_taxas'
+    )
+    linhas = [
+        (
+            i, rng.randint(1, 900), 'Tabela ' + _nome(rng), rng.choice('RAF'), 'FAIXA',
+            Decimal(f'{rng.uniform(0, 5):.2f}'), _data(rng), _data(rng),
+            'Praça ' + _nome(rng), 'Transportes ' + _nome(rng), rng.randint(0, 40), rng.randint(0, 12)
+        )
+        for i in range(quantidade)
+    ]
+    return Rows(colunas, linhas)
+
+
+def _tempo(fn: Callable, repeticoes: int) -> float:
+    """Melhor de 5 rodadas, em milissegundos por chamada"""
+    melhor = float('inf')
+    for _ in range(5):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / repeticoes * 1e3
+
+
+def bench_response(app: Flask, padrao: DefaultJSONProvider, rapido: FastJSONProvider, repeticoes: int) -> None:
+    rng = random.Random(42)
+    payloads = {
+        'municipios (5570)': municipios(rng),
+        'praça (600 municípios)': praca(rng),
+        'tpraca (300 faixas)': tpraca(rng)
+    }
+
+    with app.app_context():
+        for nome, payload in payloads.items():
+            corpo_padrao = padrao.response(payload).get_data()
+            corpo_rapido = rapido.response(payload).get_data()
+            if json.loads(corpo_padrao) != json.loads(corpo_rapido):
+                raise AssertionError(f'{nome}: corpos diferentes entre os providers')
+
+            antes = _tempo(lambda: padrao.response(payload).get_data(), repeticoes)
+            depois = _tempo(lambda: rapido.response(payload).get_data(), repeticoes)
+            print(
+                f'{nome:24} padrão {antes:7.2f} ms  rápido {depois:7.2f} ms  '
+                f'({antes / depois:4.1f}x, {len(corpo_padrao) / 1024:.0f} KiB -> {len(corpo_rapido) / 1024:.0f} KiB)'
+            )
+
+
+def bench_stream(app: Flask, padrao: DefaultJSONProvider, rapido: FastJSONProvider, repeticoes: int) -> None:
+    itens = lote(random.Random(7))
+    envelope = {'total': len(itens), 'total_erros': 0}
+
+    with app.app_context():
+        inteiro = padrao.response({'resultados': itens, **envelope}).get_data()
+        pedacos = list(rapido.stream_array('resultados', itens, envelope))
+        if json.loads(inteiro) != json.loads(b''.join(pedacos)):
+            raise AssertionError('lote: streaming diferente do documento inteiro')
+
+        antes = _tempo(lambda: padrao.response({'resultados': itens, **envelope}).get_data(), repeticoes)
+        depois = _tempo(lambda: b''.join(rapido.stream_array('resultados', itens, envelope)), repeticoes)
+        maior = max(len(p) for p in pedacos)
+        print(
+            f'{"lote (2000 envios)":24} padrão {antes:7.2f} ms  stream {depois:7.2f} ms  '
+            f'({antes / depois:4.1f}x, {len(pedacos)} pedaços, maior {maior / 1024:.0f} KiB)'
+        )
+
+
+def bench_rows(app: Flask, padrao: DefaultJSONProvider, rapido: FastJSONProvider, repeticoes: int) -> None:
+    """Um dict por linha alterado no handler contra Rows com colunas constantes e calculadas"""
+    base = tabelas(random.Random(3))
+    modais = {'R': 'Rodoviário', 'A': 'Aéreo', 'F': 'Fluvial'}
+
+    def com_dicts(provider) -> bytes:
+        linhas = [dict(zip(base.columns, linha)) for linha in base.rows]
+        for linha in linhas:
+            linha['created_by'] = 'willianskymsen'
+            linha['updated_at'] = '2025-04-11 03:43:54'
+            linha['modal_descricao'] = modais.get(linha['modal'], 'Desconhecido')
+        return provider.response({'tabelas': linhas}).get_data()
+
+    def com_rows() -> bytes:
+        rows = Rows(base.columns, base.rows)
+        rows.set('created_by', 'willianskymsen')
+        rows.set('updated_at', '2025-04-11 03:43:54')
+        rows.derive('modal_descricao', 'modal', lambda modal: modais.get(modal, 'Desconhecido'))
+        return b''.join(rapido.stream_array('tabelas', rows.dicts()))
+
+    with app.app_context():
+        if json.loads(com_dicts(padrao)) != json.loads(com_rows()):
+            raise AssertionError('tabelas: Rows diferente dos dicts')
+
+        dicts_padrao = _tempo(lambda: com_dicts(padrao), repeticoes)
+        dicts_rapido = _tempo(lambda: com_dicts(rapido), repeticoes)
+        colunas = _tempo(com_rows, repeticoes)
+        print(
+            f'{"tabelas (20000 linhas)":24} dicts/padrão {dicts_padrao:7.2f} ms  dicts/rápido {dicts_rapido:7.2f} ms  '
+            f'Rows {colunas:7.2f} ms'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo da serialização JSON das respostas')
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    if json_provider.orjson is None:
+        print('orjson não instalado: o FastJSONProvider usa o json da biblioteca padrão')
+
+    app = Flask(__name__)
+    padrao = DefaultJSONProvider(app)
+    rapido = FastJSONProvider(app)
+    bench_response(app, padrao, rapido, args.repeticoes)
+    bench_stream(app, padrao, rapido, max(1, args.repeticoes // 5))
+    bench_rows(app, padrao, rapido, max(1, args.repeticoes // 5))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# metrics_overhead.py
+"""
+Custo da instrumentação de métricas, sem MySQL.
+
+Mede um execute() no cursor real contra o TimedCursor com o observador das
+métricas, e uma requisição Flask que faz N consultas com e sem
+metrics.init_app(). Uso: python -m benchmarks.metrics_overhead [--queries 5]
+"""
+
+import argparse
+import time
+
+from flask import Flask, jsonify
+
+from modules import db
+from modules.db import ConnectionPool, TimedCursor
+from modules.metrics import Metrics
+
+
+class FakeCursor:
+    def execute(self, operation, params=None):
+        pass
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, *args, **kwargs):
+        return FakeCursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePool(ConnectionPool):
+    def __init__(self):
+        super().__init__('bench', {}, size=4, timeout=1, recycle=0, ping=False)
+
+    def _connect(self):
+        return FakeConnection(), time.monotonic()
+
+
+def _tempo(fn, repeticoes: int) -> float:
+    """Melhor de 5 rodadas, em microssegundos por chamada"""
+    melhor = float('inf')
+    for _ in range(5):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / repeticoes * 1e6
+
+
+def bench_cursor(repeticoes: int) -> None:
+    metrics = Metrics()
+    db.add_observer(metrics.observe_db)
+    try:
+        cru = FakeCursor()
+        medido = TimedCursor(FakeCursor(), 'bench')
+        base = _tempo(lambda: cru.execute('SELECT 1'), repeticoes)
+        instrumentado = _tempo(lambda: medido.execute('SELECT 1'), repeticoes)
+    finally:
+        db._observers.remove(metrics.observe_db)
+
+    print(f'execute() sem métricas: {base:8.2f} µs')
+    print(f'execute() com métricas: {instrumentado:8.2f} µs  (+{instrumentado - base:.2f} µs por consulta)')
+
+
+def _app(pool: ConnectionPool, consultas: int, metrics=None) -> Flask:
+    app = Flask(__name__)
+
+    @app.route('/bench')
+    def bench():
+        conn = pool.get_connection()
+        cursor = conn.cursor()
+        for _ in range(consultas):
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return jsonify({'ok': True})
+
+    if metrics is not None:
+        metrics.init_app(app)
+    return app
+
+
+def bench_request(repeticoes: int, consultas: int) -> None:
+    pool = FakePool()
+    base = _app(pool, consultas).test_client()
+    metrics = Metrics()
+    instrumentado = _app(pool, consultas, metrics).test_client()
+
+    try:
+        sem = _tempo(lambda: base.get('/bench'), repeticoes)
+        com = _tempo(lambda: instrumentado.get('/bench'), repeticoes)
+    finally:
+        db._observers.remove(metrics.observe_db)
+
+    inicio = time.perf_counter()
+    texto = metrics.render()
+    render = (time.perf_counter() - inicio) * 1e3
+
+    print(f'requisição ({consultas} consultas) sem métricas: {sem:8.1f} µs')
+    print(f'requisição ({consultas} consultas) com métricas: {com:8.1f} µs  ({(com - sem) / sem * 100:+.1f}%)')
+    print(f'render de /metrics: {render:.2f} ms, {len(texto.splitlines())} linhas')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo da instrumentação de métricas')
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=5, help='consultas por requisição')
+    args = parser.parse_args()
+
+    bench_cursor(args.repeticoes * 50)
+    bench_request(args.repeticoes, args.queries)
+
+
+if __name__ == '__main__':
+    main()
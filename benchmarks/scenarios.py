@@ -0,0 +1,253 @@
+# scenarios.py
+"""
+Cenários de benchmark sobre as rotas da aplicação.
+
+As requisições passam pelo test client do Flask (roteamento, handler e
+serialização JSON, sem rede) contra o MySQL configurado ou o substituto em
+SQLite gerado por benchmarks.dataset. O login é desligado (LOGIN_DISABLED);
+a importação de tabelas roda direto pelo TariffImport, que é o que a rota
+de importação chama.
+
+Uso:
+    python -m benchmarks.scenarios --sqlite /tmp/bench
+    python -m benchmarks.scenarios --sqlite /tmp/bench --json atual.json --comparar base.json
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+CENARIOS: Dict[str, Callable] = {}
+
+
+def cenario(nome: str):
+    def decorator(f):
+        CENARIOS[nome] = f
+        return f
+    return decorator
+
+
+class Contexto:
+    """Apps com login desligado e amostras de dados para montar as requisições"""
+
+    def __init__(self, seed: int = 7):
+        import app as app1
+        import app2
+        from modules.cep_index import cep_index
+        from modules.municipio_search import municipio_index
+
+        for modulo in (app1, app2):
+            modulo.app.config.update(TESTING=True, LOGIN_DISABLED=True, WTF_CSRF_ENABLED=False)
+        self.app1 = app1.app.test_client()
+        self.app2 = app2.app.test_client()
+        self.rng = random.Random(seed)
+
+        ceps = cep_index.snapshot()
+        self.faixas = list(zip(ceps.inicio, ceps.fim))
+        self.nomes = list(municipio_index.snapshot().nomes)
+        if not self.faixas or not self.nomes:
+            raise RuntimeError('Banco sem dados: rode python -m benchmarks.dataset antes')
+
+    def cep(self) -> str:
+        inicio, fim = self.rng.choice(self.faixas)
+        return f'{self.rng.randint(inicio, fim):08d}'
+
+    def envio(self) -> Dict:
+        return {
+            'cep_destino': self.cep(),
+            'peso': round(self.rng.lognormvariate(2.5, 1.2), 2),
+            'cubagem': round(self.rng.uniform(0, 0.5), 3)
+        }
+
+    def termo(self) -> str:
+        palavras = self.rng.choice(self.nomes).split()
+        palavra = self.rng.choice([p for p in palavras if len(p) >= 3] or palavras)
+        return palavra[:self.rng.randint(3, max(3, len(palavra)))]
+
+
+def _ok(resposta, *aceitos: int):
+    aceitos = aceitos or (200,)
+    if resposta.status_code not in aceitos:
+        raise AssertionError(f'{resposta.request.path}: HTTP {resposta.status_code} {resposta.get_data(as_text=True)[:200]}')
+    return resposta
+
+
+@cenario('cotacao')
+def cotacao(ctx: Contexto) -> Callable:
+    """POST /api/calculo-frete com destino e peso aleatórios"""
+    return lambda: _ok(ctx.app1.post('/api/calculo-frete', json=ctx.envio()), 200, 404)
+
+
+@cenario('cotacao_ordenada')
+def cotacao_ordenada(ctx: Contexto) -> Callable:
+    """POST /api/calculo-frete com as 3 mais baratas, as mais rápidas ou só a fronteira de Pareto"""
+    ordenacoes = ({'ordem': 'custo', 'limite': 3}, {'ordem': 'prazo', 'limite': 1}, {'pareto': True})
+    return lambda: _ok(ctx.app1.post(
+        '/api/calculo-frete',
+        json={**ctx.envio(), **ctx.rng.choice(ordenacoes)}
+    ), 200, 404)
+
+
+@cenario('cotacao_lote')
+def cotacao_lote(ctx: Contexto, tamanho: int = 500) -> Callable:
+    """POST /api/calculo-frete/lote com 500 envios"""
+    return lambda: _ok(ctx.app1.post(
+        '/api/calculo-frete/lote',
+        json={'envios': [ctx.envio() for _ in range(tamanho)]}
+    ))
+
+
+@cenario('cep')
+def cep(ctx: Contexto) -> Callable:
+    """GET /api/cep/<cep> (faixa em memória e praças do município)"""
+    return lambda: _ok(ctx.app2.get(f'/api/cep/{ctx.cep()}'))
+
+
+@cenario('busca_municipio')
+def busca_municipio(ctx: Contexto) -> Callable:
+    """GET /api/municipios/search com prefixos e trechos de nomes reais do banco"""
+    return lambda: _ok(ctx.app2.get('/api/municipios/search', query_string={'q': ctx.termo()}))
+
+
+@cenario('listas')
+def listas(ctx: Contexto) -> Callable:
+    """Listagens paginadas: página por offset e a seguinte pelo cursor (?after=)"""
+    rotas = ('/api/transportadoras', '/api/pracas', '/api/tpracas')
+
+    def op():
+        rota = ctx.rng.choice(rotas)
+        pagina = _ok(ctx.app2.get(rota, query_string={'page': ctx.rng.randint(1, 30), 'per_page': 50}))
+        proxima = pagina.get_json()['pagination']['next']
+        if proxima:
+            _ok(ctx.app2.get(rota, query_string={'after': proxima, 'per_page': 50}))
+    return op
+
+
+@cenario('importacao')
+def importacao(ctx: Contexto, tabelas: int = 50) -> Callable:
+    """TariffImport de um CSV com 50 tabelas (as regravações substituem as faixas e taxas)"""
+    from modules.tariff_import import TariffImport, read_rows
+
+    linhas = ['id_praca;modal;tipo_cobranca_peso;prazo_entrega;registro;tipo;faixa_min;faixa_max;'
+              'valor;adicional_por_excedente;id_taxa_tipo;id_taxa;unidade;obrigatoria']
+    for id_praca in range(1, tabelas + 1):
+        prefixo = f'{id_praca};R;peso;{ctx.rng.randint(1, 10)}'
+        minimo = 0
+        for limite in (5, 10, 20, 30, 50, 75, 100, 150, 200, 300):
+            linhas.append(f'{prefixo};faixa;peso;{minimo};{limite};{limite * 1.7:.2f};;;;;')
+            minimo = limite
+        for id_taxa in (1, 2, 3):
+            linhas.append(f'{prefixo};taxa;;;;0,35;;{id_taxa};{id_taxa};%;1')
+    conteudo = ('\n'.join(linhas) + '\n').encode()
+
+    def op():
+        resumo = TariffImport(chunk_size=500).run(read_rows(io.BytesIO(conteudo), 'bench.csv'))
+        if resumo['erros']:
+            raise AssertionError(resumo['detalhes_erros'][:3])
+    return op
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir(op: Callable, duracao: float, aquecimento: int, minimo: int) -> Dict:
+    """Roda op até completar a duração (e pelo menos minimo vezes); tempos em ms"""
+    for _ in range(aquecimento):
+        op()
+
+    tempos = []
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < duracao or len(tempos) < minimo:
+        t0 = time.perf_counter()
+        op()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - inicio
+
+    tempos.sort()
+    return {
+        'operacoes': len(tempos),
+        'ops_s': round(len(tempos) / total, 2),
+        'p50_ms': round(percentil(tempos, 50), 3),
+        'p90_ms': round(percentil(tempos, 90), 3),
+        'p99_ms': round(percentil(tempos, 99), 3),
+        'max_ms': round(tempos[-1], 3)
+    }
+
+
+def comparar(atual: Dict[str, Dict], base: Dict[str, Dict], tolerancia: float) -> List[str]:
+    """Cenários cujo p50 ou p90 piorou mais que a tolerância em relação à base"""
+    regressoes = []
+    for nome, resultado in atual.items():
+        anterior = base.get(nome)
+        if not anterior:
+            continue
+        for chave in ('p50_ms', 'p90_ms'):
+            if anterior[chave] and resultado[chave] > anterior[chave] * (1 + tolerancia):
+                regressoes.append(
+                    f'{nome}: {chave} {anterior[chave]} -> {resultado[chave]} '
+                    f'(+{(resultado[chave] / anterior[chave] - 1) * 100:.0f}%)'
+                )
+    return regressoes
+
+
+def configurar_sqlite(pasta: str) -> None:
+    """Aponta os pools de conexão para o substituto em SQLite"""
+    from benchmarks.sqlite_standin import connect
+    from modules.db import auth_pool, db_pool
+
+    for pool in (db_pool, auth_pool):
+        pool.connector = partial(connect, pasta)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks das rotas principais')
+    parser.add_argument('--sqlite', metavar='PASTA', help='usa o substituto em SQLite (senão o MySQL das variáveis DB_*)')
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--duracao', type=float, default=5.0, help='segundos medidos por cenário')
+    parser.add_argument('--aquecimento', type=int, default=5)
+    parser.add_argument('--minimo', type=int, default=20, help='operações mínimas por cenário')
+    parser.add_argument('--json', metavar='ARQUIVO', help='grava os resultados')
+    parser.add_argument('--comparar', metavar='ARQUIVO', help='resultados anteriores para detectar regressões')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='piora aceita no p50/p90 (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        configurar_sqlite(args.sqlite)
+
+    inicio = time.perf_counter()
+    ctx = Contexto()
+    print(f'carga inicial (índices em memória): {time.perf_counter() - inicio:.1f}s')
+    print(f"{'cenário':<18}{'ops':>8}{'ops/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+
+    resultados = {}
+    for nome in args.cenarios:
+        resultado = medir(CENARIOS[nome](ctx), args.duracao, args.aquecimento, args.minimo)
+        resultados[nome] = resultado
+        print(
+            f"{nome:<18}{resultado['operacoes']:>8}{resultado['ops_s']:>10}{resultado['p50_ms']:>10}"
+            f"{resultado['p90_ms']:>10}{resultado['p99_ms']:>10}{resultado['max_ms']:>10}"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia)
+        for linha in regressoes:
+            print(f'REGRESSÃO {linha}', file=sys.stderr)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# sqlite_standin.py
+"""
+Substituto do MySQL em SQLite para os benchmarks.
+
+Cada schema (transporte, brasil, auth) é um arquivo anexado com ATTACH, então
+as consultas qualificadas (transporte.praca) rodam sem alteração. O cursor
+imita o do mysql.connector no que a aplicação usa: placeholders %s,
+dictionary=True, column_names, fetchmany, lastrowid e rowcount. Serve para
+comparar versões do código, não para estimar a latência do MySQL.
+"""
+
+import os
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+
+SCHEMAS = ('transporte', 'brasil', 'auth')
+
+sqlite3.register_adapter(Decimal, float)
+
+_PLACEHOLDER = re.compile(r'%s|%\((\w+)\)s')
+_GROUP_CONCAT = re.compile(
+    r"GROUP_CONCAT\(\s*(DISTINCT\s+)?([\w.]+)\s+ORDER\s+BY\s+[\w.]+(?:\s+(?:ASC|DESC))?"
+    r"\s+SEPARATOR\s+'([^']*)'\s*\)",
+    re.IGNORECASE
+)
+
+
+def _group_concat(match) -> str:
+    distinct, coluna, separador = match.groups()
+    # O SQLite não aceita ORDER BY nem separador junto com DISTINCT
+    if distinct:
+        return f'GROUP_CONCAT(DISTINCT {coluna})'
+    return f"GROUP_CONCAT({coluna}, '{separador}')"
+
+
+@lru_cache(maxsize=1024)
+def translate(sql: str) -> str:
+    """Converte placeholders e o GROUP_CONCAT do MySQL para o SQLite"""
+    sql = _GROUP_CONCAT.sub(_group_concat, sql)
+    return _PLACEHOLDER.sub(lambda m: f':{m.group(1)}' if m.group(1) else '?', sql)
+
+
+class StandinCursor:
+    def __init__(self, raw: sqlite3.Cursor, dictionary: bool = False):
+        self._raw = raw
+        self._dictionary = dictionary
+        self._lidas = 0
+        self._alteradas = -1
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def column_names(self) -> tuple:
+        return tuple(d[0] for d in self._raw.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        # Como no cursor sem buffer do MySQL: linhas lidas até agora num SELECT
+        return self._lidas if self._raw.description else self._alteradas
+
+    def execute(self, operation, params=()):
+        self._lidas = 0
+        self._raw.execute(translate(operation), params or ())
+        self._alteradas = self._raw.rowcount
+
+    def executemany(self, operation, seq_params):
+        self._lidas = 0
+        self._raw.executemany(translate(operation), seq_params)
+        self._alteradas = self._raw.rowcount
+
+    def _rows(self, rows: list) -> list:
+        self._lidas += len(rows)
+        if self._dictionary and rows:
+            colunas = self.column_names
+            return [dict(zip(colunas, row)) for row in rows]
+        return rows
+
+    def fetchone(self):
+        row = self._raw.fetchone()
+        if row is None:
+            return None
+        return self._rows([row])[0]
+
+    def fetchmany(self, size: int = 1) -> list:
+        return self._rows(self._raw.fetchmany(size))
+
+    def fetchall(self) -> list:
+        return self._rows(self._raw.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self) -> None:
+        self._raw.close()
+
+
+class StandinConnection:
+    def __init__(self, pasta: str):
+        os.makedirs(pasta, exist_ok=True)
+        self._raw = sqlite3.connect(
+            os.path.join(pasta, 'main.db'),
+            check_same_thread=False,
+            timeout=30
+        )
+        for schema in SCHEMAS:
+            self._raw.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(pasta, f'{schema}.db'),))
+            self._raw.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            self._raw.execute(f"PRAGMA {schema}.synchronous = OFF")
+        self._raw.create_function('NOW', 0, lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self._raw.create_function('CONCAT', -1, lambda *partes: ''.join(str(p) for p in partes if p is not None))
+
+    def cursor(self, dictionary: bool = False, buffered=None, **kwargs) -> StandinCursor:
+        return StandinCursor(self._raw.cursor(), dictionary)
+
+    def commit(self) -> None:
+        self._raw.commit()
+
+    def rollback(self) -> None:
+        self._raw.rollback()
+
+    def ping(self, reconnect: bool = False, **kwargs) -> None:
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._raw.close()
+
+
+def connect(pasta: str, **kwargs) -> StandinConnection:
+    """Abre o banco de benchmark na pasta (os demais argumentos do MySQL são ignorados)"""
+    return StandinConnection(pasta)
@@ -0,0 +1,225 @@
+# audit.py
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import mysql.connector
+from modules.config import Config
+from modules.db import get_db_connection
+
+INSERT_LOG = """
+    INSERT INTO auth.logs
+    (user_id, acao, entidade, entidade_id, descricao, ip, user_agent, data_hora)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+logger = logging.getLogger('transporte.audit')
+
+
+class AuditWriter:
+    """
+    Gravação assíncrona (write-behind) de auth.logs.
+
+    Os eventos entram numa fila limitada e uma thread de fundo grava em lotes
+    com INSERT de várias linhas. Se o MySQL estiver fora ou a fila encher, os
+    eventos vão para um spool local (JSON por linha), reprocessado quando o
+    banco volta. No encerramento do processo a fila é descarregada.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_db_connection,
+        queue_size: int = Config.AUDIT_QUEUE_SIZE,
+        batch_size: int = Config.AUDIT_BATCH_SIZE,
+        flush_interval: float = Config.AUDIT_FLUSH_INTERVAL,
+        spool_path: str = Config.AUDIT_SPOOL_PATH
+    ):
+        self._connection_factory = connection_factory
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self._spool_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def depth(self) -> int:
+        """Quantidade de eventos aguardando gravação"""
+        return self._queue.qsize()
+
+    def enqueue(self, user_id, acao, entidade, entidade_id, descricao, ip, user_agent) -> None:
+        """Registra um evento sem bloquear a requisição"""
+        evento = (user_id, acao, entidade, entidade_id, descricao, ip, user_agent, datetime.now())
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(evento)
+        except queue.Full:
+            self._spool([evento])
+
+    def _ensure_started(self) -> None:
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._worker.start()
+                atexit.register(self.shutdown)
+
+    def _drain(self, timeout: Optional[float]) -> List[tuple]:
+        """Retira até batch_size eventos da fila, esperando no máximo timeout pelo primeiro"""
+        try:
+            lote = [self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(lote) < self.batch_size:
+            try:
+                lote.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _safe(self, etapa: Callable, *args):
+        """Executa uma etapa do worker; uma exceção inesperada é registrada sem encerrar a thread"""
+        try:
+            return etapa(*args)
+        except Exception:
+            logger.exception('Auditoria: falha em %s', etapa.__name__)
+            return None
+
+    def _run(self) -> None:
+        self._safe(self._replay_spool)
+        while not self._stopping.is_set():
+            lote = self._drain(self.flush_interval)
+            if lote:
+                # Lote não gravado (erro do MySQL ou qualquer outro) vai para o spool
+                if self._safe(self._write, lote):
+                    self._safe(self._replay_spool)
+                else:
+                    self._safe(self._spool, lote)
+
+    def _write(self, lote: List[tuple]) -> bool:
+        """Grava um lote com um único INSERT de várias linhas"""
+        try:
+            conn = self._connection_factory()
+        except mysql.connector.Error:
+            return False
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(INSERT_LOG, lote)
+            conn.commit()
+            return True
+        except mysql.connector.Error:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                # Conexão perdida: o pool a descarta na devolução
+                pass
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+            conn.close()
+
+    def _spool(self, lote: List[tuple]) -> None:
+        with self._spool_lock:
+            pasta = os.path.dirname(self.spool_path)
+            if pasta and not os.path.exists(pasta):
+                os.makedirs(pasta, exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as arquivo:
+                for evento in lote:
+                    *campos, data_hora = evento
+                    arquivo.write(json.dumps(campos + [data_hora.isoformat()]) + '\n')
+
+    def _replay_spool(self) -> None:
+        """Reenvia ao banco os eventos gravados no spool"""
+        with self._spool_lock:
+            if os.path.exists(self.spool_path):
+                os.replace(self.spool_path, f'{self.spool_path}.{int(time.time() * 1000)}')
+
+        # Além do spool recém-renomeado, retoma arquivos de reenvio que uma
+        # execução interrompida (exceção ou queda do processo) deixou para trás
+        pasta = os.path.dirname(self.spool_path) or '.'
+        prefixo = os.path.basename(self.spool_path) + '.'
+        try:
+            nomes = os.listdir(pasta)
+        except FileNotFoundError:
+            return
+        pendentes = sorted(
+            (int(nome[len(prefixo):]), os.path.join(pasta, nome))
+            for nome in nomes
+            if nome.startswith(prefixo) and nome[len(prefixo):].isdigit()
+        )
+
+        for _, processando in pendentes:
+            if not self._replay_file(processando):
+                break
+
+    def _replay_file(self, processando: str) -> bool:
+        """Reenvia um arquivo de spool já renomeado; False se o banco continua indisponível"""
+        with open(processando, encoding='utf-8') as arquivo:
+            linhas = [linha for linha in arquivo if linha.strip()]
+
+        validas, eventos, corrompidas = [], [], []
+        for linha in linhas:
+            try:
+                *campos, data_hora = json.loads(linha)
+                eventos.append(tuple(campos) + (datetime.fromisoformat(data_hora),))
+                validas.append(linha)
+            except (ValueError, TypeError):
+                corrompidas.append(linha)
+
+        if corrompidas:
+            # Linhas ilegíveis (ex.: escrita interrompida) ficam em quarentena
+            # para análise, sem travar o reenvio das demais
+            with open(f'{self.spool_path}.corrompido', 'a', encoding='utf-8') as arquivo:
+                arquivo.writelines(linha if linha.endswith('\n') else linha + '\n' for linha in corrompidas)
+            logger.warning('Auditoria: %d linha(s) corrompida(s) do spool em quarentena', len(corrompidas))
+
+        enviados = 0
+        try:
+            for inicio in range(0, len(eventos), self.batch_size):
+                lote = eventos[inicio:inicio + self.batch_size]
+                if not self._write(lote):
+                    break
+                enviados = inicio + len(lote)
+        finally:
+            # Banco indisponível ou erro inesperado: o que não foi gravado
+            # volta ao spool antes de descartar o arquivo de reenvio
+            if enviados < len(validas):
+                with self._spool_lock:
+                    with open(self.spool_path, 'a', encoding='utf-8') as arquivo:
+                        arquivo.writelines(validas[enviados:])
+            os.remove(processando)
+
+        return enviados == len(validas)
+
+    def flush(self) -> None:
+        """Grava imediatamente tudo o que está na fila (ou envia ao spool)"""
+        while True:
+            lote = self._drain(None)
+            if not lote:
+                break
+            if not self._write(lote):
+                self._spool(lote)
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._worker is not None and self._worker.is_alive():
+            self._worker.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+audit_writer = AuditWriter()
@@ -0,0 +1,17 @@
+# auth_utils.py
+
+from modules.cache import TTLCache
+from modules.config import Config
+
+# user_id -> User já carregado pelo user_loader do Flask-Login
+user_cache = TTLCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+
+def get_cached_user(user_id):
+    return user_cache.get(str(user_id))
+
+def cache_user(user):
+    user_cache.set(str(user.id), user)
+
+def invalidate_user(user_id):
+    """Remove o usuário do cache (chamar após alterar ou excluir em auth.users)"""
+    user_cache.delete(str(user_id))
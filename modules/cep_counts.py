@@ -0,0 +1,234 @@
+# cep_counts.py
+
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from modules.db import get_db_connection
+
+# Quantidade de endereços por faixa de CEP, pré-calculada para não varrer
+# brasil.endereco a cada listagem de municípios
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS brasil.faixa_cep_enderecos (
+        id_faixa INT NOT NULL PRIMARY KEY,
+        total_enderecos INT NOT NULL,
+        atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+COUNT_SELECT = """
+    SELECT
+        fc.id,
+        (
+            SELECT COUNT(*)
+            FROM brasil.endereco e
+            WHERE e.cep >= fc.cep_inicial
+            AND e.cep <= fc.cep_final
+        )
+    FROM brasil.faixa_cep fc
+"""
+
+UPSERT = """
+    INSERT INTO brasil.faixa_cep_enderecos (id_faixa, total_enderecos)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE total_enderecos = VALUES(total_enderecos)
+"""
+
+
+def ensure_table(conn) -> None:
+    """Cria brasil.faixa_cep_enderecos (idempotente; as listagens fazem LEFT JOIN nela)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_TABLE)
+    finally:
+        cursor.close()
+
+
+def _store(conn, rows: List[tuple]) -> int:
+    if not rows:
+        return 0
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(UPSERT, rows)
+        conn.commit()
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def refresh_missing(
+    connection_factory: Callable = get_db_connection,
+    chunk_size: int = 1000
+) -> int:
+    """Calcula as faixas ainda sem contagem (incremental); retorna quantas foram gravadas"""
+    conn = connection_factory()
+    total = 0
+
+    try:
+        ensure_table(conn)
+
+        while True:
+            cursor = conn.cursor()
+            cursor.execute(COUNT_SELECT + """
+                LEFT JOIN brasil.faixa_cep_enderecos fe ON fe.id_faixa = fc.id
+                WHERE fe.id_faixa IS NULL
+                LIMIT %s
+            """, (chunk_size,))
+            rows = cursor.fetchall()
+            cursor.close()
+
+            total += _store(conn, rows)
+            if len(rows) < chunk_size:
+                return total
+
+    finally:
+        conn.close()
+
+
+def refresh_all(
+    connection_factory: Callable = get_db_connection,
+    chunk_size: int = 1000
+) -> int:
+    """Recalcula todas as faixas, em blocos por id"""
+    conn = connection_factory()
+    total = 0
+    ultimo_id = 0
+
+    try:
+        ensure_table(conn)
+
+        while True:
+            cursor = conn.cursor()
+            cursor.execute(COUNT_SELECT + """
+                WHERE fc.id > %s
+                ORDER BY fc.id
+                LIMIT %s
+            """, (ultimo_id, chunk_size))
+            rows = cursor.fetchall()
+            cursor.close()
+
+            total += _store(conn, rows)
+            if len(rows) < chunk_size:
+                return total
+            ultimo_id = rows[-1][0]
+
+    finally:
+        conn.close()
+
+
+def refresh_ceps(ceps: Iterable[str], connection_factory: Callable = get_db_connection) -> int:
+    """Recalcula apenas as faixas que contêm os CEPs informados (ex.: endereços importados)"""
+    ceps = list(ceps)
+    if not ceps:
+        return 0
+
+    conn = connection_factory()
+    try:
+        ensure_table(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            COUNT_SELECT + " WHERE " + " OR ".join(
+                ['%s BETWEEN fc.cep_inicial AND fc.cep_final'] * len(ceps)
+            ),
+            ceps
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        return _store(conn, rows)
+
+    finally:
+        conn.close()
+
+
+class RefreshJob:
+    """
+    Recontagem em segundo plano, uma por vez. A completa (e a primeira
+    incremental) varre brasil.endereco para milhares de faixas e não cabe
+    no tempo de uma requisição; status() acompanha a última execução.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {}
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, full: bool = False) -> bool:
+        """Inicia a recontagem; False se já houver uma em andamento"""
+        with self._lock:
+            if self.running():
+                return False
+            self._status = {
+                'modo': 'completa' if full else 'incremental',
+                'iniciado_em': datetime.now(),
+                'concluido_em': None,
+                'faixas_atualizadas': None,
+                'erro': None
+            }
+            self._thread = threading.Thread(target=self._run, args=(full,), name='cep-counts', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, full: bool) -> None:
+        try:
+            resultado = {'faixas_atualizadas': refresh_all() if full else refresh_missing()}
+        except Exception as err:
+            resultado = {'erro': str(err)}
+        with self._lock:
+            self._status.update(resultado, concluido_em=datetime.now())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status, em_andamento=self.running())
+
+
+refresh_job = RefreshJob()
+
+
+def faixas_por_municipio(cursor, codigos: List[int]) -> Dict[int, List[Dict]]:
+    """Busca em uma única consulta as faixas de CEP (com total de endereços) dos municípios"""
+    faixas: Dict[int, List[Dict]] = {codigo: [] for codigo in codigos}
+    if not codigos:
+        return faixas
+
+    cursor.execute(f"""
+        SELECT
+            fc.CodMunicipio,
+            fc.cep_inicial,
+            fc.cep_final,
+            fe.total_enderecos
+        FROM brasil.faixa_cep fc
+        LEFT JOIN brasil.faixa_cep_enderecos fe ON fe.id_faixa = fc.id
+        WHERE fc.CodMunicipio IN ({', '.join(['%s'] * len(codigos))})
+        ORDER BY fc.CodMunicipio, fc.cep_inicial
+    """, list(codigos))
+
+    # Cursor de tuplas: as linhas chegam na ordem das colunas do SELECT
+    for cod_municipio, cep_inicial, cep_final, total_enderecos in cursor.fetchall():
+        faixas[cod_municipio].append({
+            'cep_inicial': cep_inicial,
+            'cep_final': cep_final,
+            'total_enderecos': total_enderecos
+        })
+    return faixas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Atualiza a contagem de endereços por faixa de CEP'
+    )
+    parser.add_argument('--full', action='store_true', help='recalcula todas as faixas')
+    parser.add_argument('--cep', action='append', default=[], help='recalcula só a faixa deste CEP (repetível)')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.cep:
+        gravadas = refresh_ceps(args.cep)
+    elif args.full:
+        gravadas = refresh_all(chunk_size=args.chunk_size)
+    else:
+        gravadas = refresh_missing(chunk_size=args.chunk_size)
+    print(f'{gravadas} faixas de CEP atualizadas')
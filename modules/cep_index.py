@@ -0,0 +1,158 @@
+# cep_index.py
+
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Optional
+
+from modules.db import get_db_connection
+
+
+def parse_cep(cep) -> Optional[int]:
+    """Converte um CEP (com ou sem formatação) para inteiro"""
+    digitos = ''.join(filter(str.isdigit, str(cep)))
+    if not digitos or len(digitos) > 8:
+        return None
+    return int(digitos)
+
+
+def format_cep(cep: int) -> str:
+    return f'{cep:08d}'
+
+
+class CepSnapshot:
+    """Faixas de CEP em arrays paralelos ordenados por cep_inicial"""
+    __slots__ = ('ids', 'inicio', 'fim', 'fim_max', 'municipio', 'uf', 'municipios', 'estados')
+
+    def __init__(self):
+        self.ids = array('i')
+        self.inicio = array('i')
+        self.fim = array('i')
+        # Maior cep_final até cada posição: permite parar cedo quando há faixas sobrepostas
+        self.fim_max = array('i')
+        self.municipio = array('i')
+        self.uf = array('i')
+        self.municipios: Dict[int, str] = {}
+        self.estados: Dict[int, tuple] = {}
+
+    def __len__(self):
+        return len(self.inicio)
+
+    def find(self, cep: int) -> int:
+        """Posição da faixa que contém o CEP, ou -1"""
+        i = bisect_right(self.inicio, cep) - 1
+        while i >= 0 and self.fim_max[i] >= cep:
+            if self.fim[i] >= cep:
+                return i
+            i -= 1
+        return -1
+
+
+class CepIndex:
+    """
+    Resolve CEP -> município por busca binária sobre brasil.faixa_cep em memória.
+
+    rebuild() monta uma nova fotografia e a publica com uma única troca de
+    referência, de modo que consultas em andamento nunca veem arrays parciais.
+    """
+
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self._connection_factory = connection_factory
+        self._lock = threading.RLock()
+        self._snapshot: Optional[CepSnapshot] = None
+
+    def rebuild(self) -> CepSnapshot:
+        """Recarrega todas as faixas de CEP do banco"""
+        with self._lock:
+            snapshot = self._build()
+            self._snapshot = snapshot
+        return snapshot
+
+    def _build(self) -> CepSnapshot:
+        snapshot = CepSnapshot()
+        conn = self._connection_factory()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT codigoIbge, municipio FROM brasil.municipio")
+            snapshot.municipios = dict(cursor.fetchall())
+
+            cursor.execute("SELECT CodigoUf, Uf, Nome FROM brasil.estado")
+            snapshot.estados = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+            cursor.execute("""
+                SELECT id, cep_inicial, cep_final, CodMunicipio, CodigoUf
+                FROM brasil.faixa_cep
+                ORDER BY cep_inicial
+            """)
+            rows = cursor.fetchmany(10000)
+            while rows:
+                for id, cep_inicial, cep_final, cod_municipio, codigo_uf in rows:
+                    snapshot.ids.append(id)
+                    snapshot.inicio.append(int(cep_inicial))
+                    snapshot.fim.append(int(cep_final))
+                    snapshot.municipio.append(cod_municipio)
+                    snapshot.uf.append(codigo_uf)
+                rows = cursor.fetchmany(10000)
+
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._ensure_sorted(snapshot)
+
+        fim_max = 0
+        for fim in snapshot.fim:
+            fim_max = max(fim_max, fim)
+            snapshot.fim_max.append(fim_max)
+
+        return snapshot
+
+    @staticmethod
+    def _ensure_sorted(snapshot: CepSnapshot) -> None:
+        """Reordena os arrays caso o ORDER BY do banco não seja numérico (ex.: CEP em VARCHAR)"""
+        inicio = snapshot.inicio
+        if all(inicio[i] <= inicio[i + 1] for i in range(len(inicio) - 1)):
+            return
+
+        ordem = sorted(range(len(inicio)), key=inicio.__getitem__)
+        for nome in ('ids', 'inicio', 'fim', 'municipio', 'uf'):
+            atual = getattr(snapshot, nome)
+            setattr(snapshot, nome, array('i', (atual[i] for i in ordem)))
+
+    def snapshot(self) -> CepSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self.rebuild()
+        return snapshot
+
+    def lookup(self, cep) -> Optional[Dict]:
+        """Retorna a faixa de CEP com município e estado, ou None"""
+        cep = parse_cep(cep)
+        if cep is None:
+            return None
+
+        snapshot = self.snapshot()
+        i = snapshot.find(cep)
+        if i < 0:
+            return None
+
+        cod_municipio = snapshot.municipio[i]
+        codigo_uf = snapshot.uf[i]
+        uf, estado = snapshot.estados.get(codigo_uf, (None, None))
+        return {
+            'id': snapshot.ids[i],
+            'cep_inicial': format_cep(snapshot.inicio[i]),
+            'cep_final': format_cep(snapshot.fim[i]),
+            'CodMunicipio': cod_municipio,
+            'CodigoUf': codigo_uf,
+            'municipio': snapshot.municipios.get(cod_municipio),
+            'estado': estado,
+            'Uf': uf
+        }
+
+
+cep_index = CepIndex()
@@ -21,5 +21,96 @@ class Config:
         'database': os.getenv('AUTH_DB_NAME'),
         'auth_plugin': os.getenv('DB_AUTH_PLUGIN')
     }
+
+    # Pool de conexões (por banco): tamanho, espera máxima no empréstimo (s),
+    # idade máxima da conexão (s) e ping de verificação ao emprestar
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+    DB_POOL_PING = os.getenv('DB_POOL_PING', 'true').lower() == 'true'
+
+    # Comandos frequentes preparados no servidor (modules/statements.py):
+    # liga/desliga e quantos ficam preparados por conexão do pool. Desligado
+    # por padrão: cada execução preparada custa um COM_STMT_RESET a mais
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', '0') == '1'
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 32))
+
     SESSION_COOKIE_NAME = 'session'
     PERMANENT_SESSION_LIFETIME = int(os.getenv('SESSION_LIFETIME_SECONDS', 3600))
+
+    # Cache de validação de sessões: por quanto tempo (s) uma sessão validada
+    # dispensa nova consulta a auth.sessions em cada processo
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+    SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL', 60))
+
+    # Cache do user_loader do Flask-Login (LRU + TTL em segundos)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 5000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+
+    # Motor de frete em memória: idade máxima da fotografia das tabelas (0 = sem expiração)
+    # e destinos com as tabelas já ordenadas pelo piso para as cotações ordenadas
+    RATE_ENGINE_MAX_AGE = int(os.getenv('RATE_ENGINE_MAX_AGE', 300))
+    RATE_ENGINE_RANKING_CACHE = int(os.getenv('RATE_ENGINE_RANKING_CACHE', 20000))
+
+    # Cache de cotações (destino, transportadora, peso/cubagem arredondados):
+    # entradas, TTL (s) e casas decimais do arredondamento
+    QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', 50000))
+    QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', os.getenv('RATE_ENGINE_MAX_AGE', 300)))
+    QUOTE_CACHE_DECIMAIS = int(os.getenv('QUOTE_CACHE_DECIMAIS', 3))
+
+    # Quantidade máxima de envios por chamada de /api/calculo-frete/lote
+    FRETE_LOTE_MAX_ITENS = int(os.getenv('FRETE_LOTE_MAX_ITENS', 50000))
+
+    # Peso do prazo (0 a 1) no score das cotações ordenadas por ordem=score
+    FRETE_PESO_PRAZO = float(os.getenv('FRETE_PESO_PRAZO', 0.5))
+
+    # Auditoria assíncrona (auth.logs): tamanho da fila, linhas por INSERT,
+    # intervalo máximo entre gravações (s) e spool local para falhas do MySQL
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 200))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1))
+    AUDIT_SPOOL_PATH = os.getenv('AUDIT_SPOOL_PATH', 'logs/audit_spool.jsonl')
+
+    # Cache dos totais das listagens, usado pela paginação por cursor (?after=)
+    COUNT_CACHE_SIZE = int(os.getenv('COUNT_CACHE_SIZE', 2000))
+    COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 300))
+
+    # Importação de tabelas de preço: linhas por transação (commit entre tabelas)
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+
+    # Exportação (/api/export): linhas lidas do cursor por pedaço da resposta
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+    # Cobertura das praças em memória (município -> praças e tabelas): idade
+    # máxima (s) da carga completa, para escritas de outros processos (0 = sem expiração)
+    COVERAGE_INDEX_MAX_AGE = int(os.getenv('COVERAGE_INDEX_MAX_AGE', 300))
+
+    # Dados de referência (estados, regiões, municípios, taxas): respostas em
+    # cache por versão do dataset (TTL cobre escritas de outros processos) e
+    # max-age do Cache-Control (0 = o navegador sempre revalida pelo ETag)
+    REFERENCE_CACHE_SIZE = int(os.getenv('REFERENCE_CACHE_SIZE', 500))
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 3600))
+    REFERENCE_MAX_AGE = int(os.getenv('REFERENCE_MAX_AGE', 0))
+
+    # Respostas JSON com orjson (se instalado), datas em ISO 8601 em vez do
+    # formato HTTP do Flask e itens por pedaço nas respostas em streaming
+    JSON_FAST = os.getenv('JSON_FAST', '1') == '1'
+    JSON_ISO_DATES = os.getenv('JSON_ISO_DATES', '0') == '1'
+    JSON_STREAM_BATCH = int(os.getenv('JSON_STREAM_BATCH', 500))
+
+    # Métricas no formato do Prometheus em GET /metrics (latência, consultas,
+    # pools, fila de auditoria); com METRICS_TOKEN exige "Authorization: Bearer",
+    # sem ele só responde aos endereços de METRICS_ALLOW_FROM (padrão: localhost)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    METRICS_ALLOW_FROM = [ip.strip() for ip in os.getenv('METRICS_ALLOW_FROM', '127.0.0.1,::1').split(',') if ip.strip()]
+
+    # Rastreamento de SQL por requisição (X-Query-Count / Server-Timing e um
+    # registro por requisição com os comandos no log) e log de consultas
+    # lentas em JSON por linha (SQL_SLOW_QUERY_MS > 0 liga, ex.: 500); os dois
+    # vêm desligados. Com o rastreamento ligado, avisa quando o mesmo SQL se
+    # repete N vezes (N+1)
+    SQL_TRACE = os.getenv('SQL_TRACE', '0') == '1'
+    SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', 0))
+    SQL_SLOW_LOG_PATH = os.getenv('SQL_SLOW_LOG_PATH', 'logs/slow_queries.jsonl')
+    SQL_TRACE_REPEAT_WARN = int(os.getenv('SQL_TRACE_REPEAT_WARN', 20))
@@ -0,0 +1,213 @@
+# counters.py
+
+from typing import Dict, Iterable, Optional, Set
+
+from modules.db import get_db_connection
+
+# Tabelas-resumo com os totais exibidos nas listagens. Cada linha é
+# recalculada a partir das tabelas de origem dentro da mesma transação da
+# escrita que a afetou, então os totais não se desviam com o tempo.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS transporte.praca_contadores (
+        id_praca INT NOT NULL PRIMARY KEY,
+        total_municipios INT NOT NULL DEFAULT 0,
+        total_tabelas INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.tpraca_contadores (
+        id_tpreco INT NOT NULL PRIMARY KEY,
+        total_faixas INT NOT NULL DEFAULT 0,
+        total_taxas INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.taxa_tipo_contadores (
+        id_taxa_tipo INT NOT NULL PRIMARY KEY,
+        total_tabelas INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transporte.taxa_transporte_contadores (
+        id_taxa INT NOT NULL PRIMARY KEY,
+        total_tabelas INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS brasil.estado_contadores (
+        CodigoUf INT NOT NULL PRIMARY KEY,
+        total_municipios INT NOT NULL DEFAULT 0,
+        total_faixas_cep INT NOT NULL DEFAULT 0
+    )
+    """
+]
+
+# entidade -> (tabela-resumo, coluna chave, SELECT que recalcula, chave no SELECT)
+REFRESH = {
+    'praca': (
+        'transporte.praca_contadores', 'id_praca',
+        """
+        SELECT
+            p.id,
+            (SELECT COUNT(DISTINCT pm.CodMunicipio) FROM transporte.praca_municipio pm
+             WHERE pm.id_praca = p.id),
+            (SELECT COUNT(*) FROM transporte.tpraca tp WHERE tp.id_praca = p.id)
+        FROM transporte.praca p
+        """,
+        'p.id'
+    ),
+    'tpraca': (
+        'transporte.tpraca_contadores', 'id_tpreco',
+        """
+        SELECT
+            tp.id,
+            (SELECT COUNT(*) FROM transporte.tpreco_faixas tf WHERE tf.id_tpreco = tp.id),
+            (SELECT COUNT(*) FROM transporte.tpreco_taxas tt WHERE tt.id_tpreco = tp.id)
+        FROM transporte.tpraca tp
+        """,
+        'tp.id'
+    ),
+    'taxa_tipo': (
+        'transporte.taxa_tipo_contadores', 'id_taxa_tipo',
+        """
+        SELECT
+            tt.id,
+            (SELECT COUNT(*) FROM transporte.tpreco_taxas tpt WHERE tpt.id_taxa_tipo = tt.id)
+        FROM transporte.taxa_tipo tt
+        """,
+        'tt.id'
+    ),
+    'taxa_transporte': (
+        'transporte.taxa_transporte_contadores', 'id_taxa',
+        """
+        SELECT
+            tx.id,
+            (SELECT COUNT(*) FROM transporte.tpreco_taxas tpt WHERE tpt.id_taxa = tx.id)
+        FROM transporte.taxa_transporte tx
+        """,
+        'tx.id'
+    ),
+    'estado': (
+        'brasil.estado_contadores', 'CodigoUf',
+        """
+        SELECT
+            e.CodigoUf,
+            (SELECT COUNT(*) FROM brasil.municipio m WHERE m.CodigoUf = e.CodigoUf),
+            (SELECT COUNT(*) FROM brasil.faixa_cep fc WHERE fc.CodigoUf = e.CodigoUf)
+        FROM brasil.estado e
+        """,
+        'e.CodigoUf'
+    )
+}
+
+
+def refresh_counters(conn, entidade: str, ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Recalcula os contadores da entidade para os ids informados (todos se None).
+
+    Não faz commit: deve rodar na transação da escrita que alterou os dados.
+    Ids que não existem mais apenas têm a linha removida.
+    """
+    tabela, chave, select, chave_select = REFRESH[entidade]
+
+    if ids is not None:
+        ids = [i for i in set(ids) if i is not None]
+        if not ids:
+            return
+
+    cursor = conn.cursor()
+    try:
+        if ids is None:
+            cursor.execute(f"DELETE FROM {tabela}")
+            cursor.execute(f"INSERT INTO {tabela} {select}")
+        else:
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM {tabela} WHERE {chave} IN ({placeholders})", ids)
+            cursor.execute(
+                f"INSERT INTO {tabela} {select} WHERE {chave_select} IN ({placeholders})",
+                ids
+            )
+    finally:
+        cursor.close()
+
+
+def tabela_refs(conn, tabela_id: int) -> Dict[str, Set[int]]:
+    """Praça, tipos de taxa e taxas referenciados por uma tabela de preço"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT id_praca FROM transporte.tpraca WHERE id = %s",
+            (tabela_id,)
+        )
+        pracas = {row[0] for row in cursor.fetchall()}
+
+        cursor.execute(
+            "SELECT id_taxa_tipo, id_taxa FROM transporte.tpreco_taxas WHERE id_tpreco = %s",
+            (tabela_id,)
+        )
+        linhas = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return {
+        'praca': pracas,
+        'taxa_tipo': {row[0] for row in linhas},
+        'taxa_transporte': {row[1] for row in linhas}
+    }
+
+
+def refresh_tabela_counters(conn, tabela_id: int, antes: Optional[Dict[str, Set[int]]] = None) -> None:
+    """
+    Recalcula os contadores afetados por uma escrita em tpraca e suas faixas/taxas.
+
+    antes é o resultado de tabela_refs() lido antes da alteração, para que
+    praças e taxas que deixaram de ser referenciadas também sejam ajustadas.
+    """
+    refs = tabela_refs(conn, tabela_id)
+    for entidade, ids in (antes or {}).items():
+        refs[entidade] |= ids
+
+    refresh_counters(conn, 'tpraca', [tabela_id])
+    for entidade, ids in refs.items():
+        refresh_counters(conn, entidade, ids)
+
+
+def ensure_counters(conn) -> bool:
+    """Cria as tabelas-resumo; retorna True se estavam vazias e foram preenchidas"""
+    cursor = conn.cursor()
+    try:
+        for ddl in SCHEMA:
+            cursor.execute(ddl)
+        cursor.execute("SELECT COUNT(*) FROM transporte.praca_contadores")
+        vazias = cursor.fetchone()[0] == 0
+    finally:
+        cursor.close()
+
+    if vazias:
+        rebuild_counters(conn)
+    return vazias
+
+
+def rebuild_counters(conn) -> None:
+    """Recalcula todos os contadores em uma única transação"""
+    try:
+        for entidade in REFRESH:
+            refresh_counters(conn, entidade)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+if __name__ == '__main__':
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for ddl in SCHEMA:
+            cursor.execute(ddl)
+        cursor.close()
+        rebuild_counters(conn)
+        print('Contadores recalculados')
+    finally:
+        conn.close()
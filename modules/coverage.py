@@ -0,0 +1,224 @@
+# coverage.py
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from modules.config import Config
+from modules.db import get_db_connection
+
+
+class PracaCoverage:
+    """Praça com a transportadora, as tabelas de preço e os municípios atendidos"""
+    __slots__ = (
+        'id', 'nome', 'id_transportadora', 'transportadora_nome',
+        'transportadora_codigo', 'transportadora_tipo', 'tabelas', 'modais', 'municipios'
+    )
+
+    def __init__(self, row: tuple):
+        (self.id, self.nome, self.id_transportadora, self.transportadora_nome,
+         self.transportadora_codigo, self.transportadora_tipo) = row
+        self.tabelas: Tuple[int, ...] = ()
+        self.modais: Tuple[str, ...] = ()
+        self.municipios: frozenset = frozenset()
+
+    def sort_key(self) -> tuple:
+        # Mesma ordem das consultas antigas: transportadora e nome da praça
+        return ((self.transportadora_nome or '').casefold(), (self.nome or '').casefold(), self.id)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'praca_nome': self.nome,
+            'transportadora_nome': self.transportadora_nome,
+            'transportadora_codigo': self.transportadora_codigo,
+            'modais': ','.join(self.modais) or None
+        }
+
+
+class CoverageSnapshot:
+    """Praças por id e, por município, as praças e as tabelas que o atendem"""
+    __slots__ = ('pracas', 'por_municipio', 'tabelas', 'loaded_at')
+
+    def __init__(self):
+        self.pracas: Dict[int, PracaCoverage] = {}
+        self.por_municipio: Dict[int, Tuple[PracaCoverage, ...]] = {}
+        self.tabelas: Dict[int, Tuple[int, ...]] = {}
+        self.loaded_at = time.monotonic()
+
+    def index_all(self) -> None:
+        """Monta as entradas de todos os municípios a partir das praças"""
+        atendem: Dict[int, List[PracaCoverage]] = {}
+        for praca in self.pracas.values():
+            for cod in praca.municipios:
+                atendem.setdefault(cod, []).append(praca)
+        self._store(atendem)
+
+    def reindex(self, codigos: Iterable[int], alteradas: Set[int]) -> None:
+        """
+        Recalcula as entradas dos municípios afetados por praças alteradas:
+        mantém as demais praças que já os atendiam e inclui as alteradas
+        que (ainda) os atendem.
+        """
+        novas = [self.pracas[i] for i in alteradas if i in self.pracas]
+        atendem = {}
+        for cod in codigos:
+            atendem[cod] = [
+                p for p in self.por_municipio.get(cod, ()) if p.id not in alteradas
+            ] + [p for p in novas if cod in p.municipios]
+        self._store(atendem)
+
+    def _store(self, atendem: Dict[int, List[PracaCoverage]]) -> None:
+        for cod, pracas in atendem.items():
+            if not pracas:
+                self.por_municipio.pop(cod, None)
+                self.tabelas.pop(cod, None)
+                continue
+            pracas.sort(key=PracaCoverage.sort_key)
+            self.por_municipio[cod] = tuple(pracas)
+            self.tabelas[cod] = tuple(sorted(t for praca in pracas for t in praca.tabelas))
+
+
+def _fetch(conn, praca_ids: Optional[List[int]] = None) -> Dict[int, PracaCoverage]:
+    """Lê praças (todas ou as informadas) com tabelas e municípios"""
+    filtro, params = '', ()
+    if praca_ids is not None:
+        placeholders = ', '.join(['%s'] * len(praca_ids))
+        filtro, params = f'WHERE {{}} IN ({placeholders})', tuple(praca_ids)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT p.id, p.nome, p.id_transportadora, t.DESCRICAO, t.COD_FOR, t.tipo_unidade
+            FROM transporte.praca p
+            LEFT JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
+            {filtro.format('p.id')}
+        """, params)
+        pracas = {row[0]: PracaCoverage(row) for row in cursor.fetchall()}
+
+        cursor.execute(f"""
+            SELECT id_praca, id, modal FROM transporte.tpraca
+            {filtro.format('id_praca')}
+            ORDER BY id
+        """, params)
+        tabelas: Dict[int, List[tuple]] = {}
+        for id_praca, tabela_id, modal in cursor.fetchall():
+            tabelas.setdefault(id_praca, []).append((tabela_id, modal))
+
+        cursor.execute(f"""
+            SELECT id_praca, CodMunicipio FROM transporte.praca_municipio
+            {filtro.format('id_praca')}
+        """, params)
+        municipios: Dict[int, Set[int]] = {}
+        for id_praca, cod in cursor.fetchall():
+            municipios.setdefault(id_praca, set()).add(cod)
+    finally:
+        cursor.close()
+
+    for praca in pracas.values():
+        lista = tabelas.get(praca.id, ())
+        praca.tabelas = tuple(t for t, _ in lista)
+        praca.modais = tuple(sorted({m for _, m in lista if m}))
+        praca.municipios = frozenset(municipios.get(praca.id, ()))
+    return pracas
+
+
+class CoverageIndex:
+    """
+    Cobertura das praças em memória: município -> praças (transportadora,
+    tabelas e modais) que o atendem, sem joins na consulta.
+
+    A carga completa acontece uma vez (e de novo após invalidate() ou
+    max_age, que cobre escritas de outros processos). As escritas em praças
+    e tabelas chamam refresh_pracas(), que relê só as praças alteradas.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_db_connection,
+        max_age: Optional[float] = Config.COVERAGE_INDEX_MAX_AGE
+    ):
+        self._connection_factory = connection_factory
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._snapshot: Optional[CoverageSnapshot] = None
+        self._stale = True
+
+    def invalidate(self) -> None:
+        """Força a recarga completa na próxima consulta"""
+        self._stale = True
+
+    def load(self) -> CoverageSnapshot:
+        conn = self._connection_factory()
+        try:
+            pracas = _fetch(conn)
+        finally:
+            conn.close()
+
+        snapshot = CoverageSnapshot()
+        snapshot.pracas = pracas
+        snapshot.index_all()
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> CoverageSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and (
+            not self.max_age or time.monotonic() - snapshot.loaded_at < self.max_age
+        ):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or self._stale or (
+                self.max_age and time.monotonic() - snapshot.loaded_at >= self.max_age
+            ):
+                self._stale = False
+                try:
+                    snapshot = self.load()
+                except Exception:
+                    self._stale = True
+                    raise
+            return snapshot
+
+    def refresh_pracas(self, conn, praca_ids: Iterable[int]) -> Set[int]:
+        """
+        Relê as praças após o commit de uma escrita (praça, municípios ou
+        tabelas) e retorna os municípios afetados, antes e depois da escrita.
+        """
+        ids = list({int(i) for i in praca_ids if i is not None})
+        if not ids:
+            return set()
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                # Nada carregado ainda: a primeira consulta já lerá o estado novo
+                return set()
+
+            novas = _fetch(conn, ids)
+            afetados = set()
+            for praca_id in ids:
+                antiga = snapshot.pracas.pop(praca_id, None)
+                if antiga:
+                    afetados.update(antiga.municipios)
+                nova = novas.get(praca_id)
+                if nova:
+                    snapshot.pracas[praca_id] = nova
+                    afetados.update(nova.municipios)
+            snapshot.reindex(afetados, set(ids))
+        return afetados
+
+    def pracas(self, cod_municipio: int) -> Tuple[PracaCoverage, ...]:
+        """Praças que atendem o município, por transportadora e nome"""
+        return self.snapshot().por_municipio.get(cod_municipio, ())
+
+    def tabelas(self, cod_municipio: int) -> Tuple[int, ...]:
+        """Ids das tabelas de preço das praças que atendem o município"""
+        return self.snapshot().tabelas.get(cod_municipio, ())
+
+    def total_pracas(self, cod_municipio: int) -> int:
+        return len(self.pracas(cod_municipio))
+
+
+coverage_index = CoverageIndex()
@@ -1,10 +1,302 @@
 # db.py
 
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
 import mysql.connector
+from flask import g, has_app_context
+from mysql.connector.errors import PoolError
 from modules.config import Config
 
+
+class PoolTimeoutError(PoolError):
+    """Nenhuma conexão ficou livre dentro do tempo de espera do pool"""
+
+
+# Observadores do tempo gasto no banco:
+#   fn(tipo, pool, segundos, cursor, operation, params)
+# com tipo 'execute', 'executemany' ou 'callproc' (cursor é o cursor real,
+# operation/params os argumentos do comando) ou 'connect' (abertura de
+# conexão, com cursor, operation e params None)
+Observer = Callable[[str, str, float, Any, Any, Any], None]
+_observers: List[Observer] = []
+
+
+def add_observer(observer: Observer) -> None:
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def _notify(tipo: str, pool: str, segundos: float, cursor=None, operation=None, params=None) -> None:
+    for observer in _observers:
+        observer(tipo, pool, segundos, cursor, operation, params)
+
+
+class TimedCursor:
+    """
+    Cursor que mede o tempo de cada comando e avisa os observadores.
+
+    Em cursores sem buffer o tempo de execute() não inclui a leitura das
+    linhas, que acontece depois nos fetch*.
+    """
+
+    def __init__(self, raw, pool_name: str):
+        self._raw = raw
+        self._pool_name = pool_name
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._raw.close()
+
+    def _timed(self, tipo: str, metodo, operation, params, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(operation, params, *args, **kwargs)
+        finally:
+            _notify(tipo, self._pool_name, time.perf_counter() - inicio, self._raw, operation, params)
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        return self._timed('execute', self._raw.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed('executemany', self._raw.executemany, operation, seq_params, *args, **kwargs)
+
+    def callproc(self, procname, args=(), *rest, **kwargs):
+        return self._timed('callproc', self._raw.callproc, procname, args, *rest, **kwargs)
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool.
+
+    Repassa tudo para a conexão real; close() devolve a conexão ao pool em vez
+    de encerrá-la, de modo que os handlers continuam usando conn.close().
+    Conexões esquecidas abertas voltam ao pool no teardown do contexto da
+    aplicação (release_connections) ou, em último caso, no __del__.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    @property
+    def raw(self):
+        """Conexão real, para estado que dura entre empréstimos (ex.: comandos preparados)"""
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise mysql.connector.errors.OperationalError('Conexão já devolvida ao pool')
+        return raw
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        # Sem observadores (métricas desligadas) o cursor real vai direto
+        if _observers:
+            return TimedCursor(cursor, self._pool.name)
+        return cursor
+
+    def close(self) -> None:
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Último recurso: o objeto foi coletado sem close()
+        if self.__dict__.get('_raw') is not None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões MySQL com tamanho máximo, tempo de espera no empréstimo,
+    verificação de saúde (ping) ao emprestar e reciclagem por idade.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        size: int = Config.DB_POOL_SIZE,
+        timeout: float = Config.DB_POOL_TIMEOUT,
+        recycle: float = Config.DB_POOL_RECYCLE,
+        ping: bool = Config.DB_POOL_PING,
+        connector: Optional[Callable] = None
+    ):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping = ping
+        self._config = config
+        # Função que abre a conexão real (mysql.connector.connect se None);
+        # os benchmarks trocam por um substituto em SQLite
+        self.connector = connector
+        self._cond = threading.Condition()
+        self._idle = []  # (conexão, criada_em), usada como pilha
+        self._total = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'connect_time_total': 0.0,
+            'recycled': 0,
+            'health_check_failures': 0
+        }
+
+    def _connect(self):
+        inicio = time.monotonic()
+        raw = (self.connector or mysql.connector.connect)(**self._config)
+        agora = time.monotonic()
+        with self._cond:
+            self._stats['created'] += 1
+            self._stats['connect_time_total'] += agora - inicio
+        _notify('connect', self.name, agora - inicio)
+        return raw, agora
+
+    def _discard(self, raw) -> None:
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def _validate(self, raw, created_at: float):
+        """Recicla conexões antigas e descarta as que não respondem ao ping"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._cond:
+                self._stats['recycled'] += 1
+            return self._connect()
+
+        if self.ping:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._discard(raw)
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                return self._connect()
+
+        return raw, created_at
+
+    def get_connection(self) -> PooledConnection:
+        inicio = time.monotonic()
+        esperou = False
+
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'Pool {self.name} esgotado: nenhuma conexão livre em {self.timeout}s'
+                    )
+                esperou = True
+                self._cond.wait(restante)
+
+            if self._idle:
+                raw, created_at = self._idle.pop()
+            else:
+                raw, created_at = None, None
+                self._total += 1
+
+        try:
+            if raw is None:
+                raw, created_at = self._connect()
+            else:
+                raw, created_at = self._validate(raw, created_at)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._stats['checkouts'] += 1
+            if esperou:
+                self._stats['waits'] += 1
+            self._stats['wait_time_total'] += espera
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], espera)
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at: float) -> None:
+        # Desfaz transações abertas e consome resultados pendentes antes de reutilizar
+        try:
+            raw.rollback()
+            reutilizar = True
+        except mysql.connector.Error:
+            self._discard(raw)
+            reutilizar = False
+
+        with self._cond:
+            if reutilizar:
+                self._idle.append((raw, created_at))
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._total
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._total - len(self._idle)
+        stats['wait_time_avg'] = (
+            stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+
+db_pool = ConnectionPool('transporte', Config.DB_CONFIG)
+auth_pool = ConnectionPool('auth', Config.AUTH_DB_CONFIG)
+
+
+def _track(conn: PooledConnection) -> PooledConnection:
+    # Dentro de uma requisição, anota a conexão para o teardown devolvê-la
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
+    return conn
+
 def get_db_connection():
-    return mysql.connector.connect(**Config.DB_CONFIG)
+    return _track(db_pool.get_connection())
 
 def get_auth_connection():
-    return mysql.connector.connect(**Config.AUTH_DB_CONFIG)
+    return _track(auth_pool.get_connection())
+
+def release_connections(exc=None) -> None:
+    """
+    teardown_appcontext: devolve ao pool as conexões que o handler não
+    fechou (ex.: exceção que não é mysql.connector.Error antes do close()).
+    close() repetido não faz nada, então as já devolvidas são ignoradas.
+    """
+    for conn in g.pop('_db_connections', ()):
+        conn.close()
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {pool.name: pool.stats() for pool in (db_pool, auth_pool)}
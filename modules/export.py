@@ -0,0 +1,182 @@
+# export.py
+
+import csv
+import io
+import json
+from typing import Any, Callable, Dict, Iterator
+
+import mysql.connector
+from modules.config import Config
+from modules.db import get_db_connection
+from modules.rows import Rows
+
+try:
+    import orjson
+    # Datas pelo default=str, como no json padrão: 2024-01-31 12:00:00
+    _ORJSON_LINHA = orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    orjson = None
+
+# entidade -> (consulta, filtros aceitos na query string -> condição SQL)
+# Sempre ordenadas pela chave primária, para o MySQL enviar as linhas na
+# ordem do índice sem precisar ordenar a tabela inteira antes.
+EXPORTS = {
+    'transportadoras': (
+        """
+        SELECT t.*, m.DESCRICAO as matriz_nome
+        FROM transporte.transportadoras t
+        LEFT JOIN transporte.transportadoras m ON t.id_matriz = m.ID
+        WHERE 1=1 {filtros}
+        ORDER BY t.ID
+        """,
+        {'tipo': 't.tipo_unidade = %s'}
+    ),
+    'pracas': (
+        """
+        SELECT
+            p.*,
+            t.DESCRICAO as transportadora_nome,
+            COALESCE(pc.total_municipios, 0) as total_municipios,
+            COALESCE(pc.total_tabelas, 0) as total_tabelas
+        FROM transporte.praca p
+        JOIN transporte.transportadoras t ON p.id_transportadora = t.ID
+        LEFT JOIN transporte.praca_contadores pc ON p.id = pc.id_praca
+        WHERE 1=1 {filtros}
+        ORDER BY p.id
+        """,
+        {'transportadora_id': 'p.id_transportadora = %s'}
+    ),
+    'praca_municipios': (
+        """
+        SELECT pm.id_praca, pm.CodMunicipio
+        FROM transporte.praca_municipio pm
+        WHERE 1=1 {filtros}
+        ORDER BY pm.id_praca, pm.CodMunicipio
+        """,
+        {'praca_id': 'pm.id_praca = %s'}
+    ),
+    'tpracas': (
+        """
+        SELECT
+            tp.*,
+            p.nome as praca_nome,
+            p.id_transportadora,
+            COALESCE(tc.total_faixas, 0) as total_faixas,
+            COALESCE(tc.total_taxas, 0) as total_taxas
+        FROM transporte.tpraca tp
+        JOIN transporte.praca p ON tp.id_praca = p.id
+        LEFT JOIN transporte.tpraca_contadores tc ON tp.id = tc.id_tpreco
+        WHERE 1=1 {filtros}
+        ORDER BY tp.id
+        """,
+        {
+            'praca_id': 'tp.id_praca = %s',
+            'transportadora_id': 'p.id_transportadora = %s',
+            'modal': 'tp.modal = %s'
+        }
+    ),
+    'faixas': (
+        """
+        SELECT tf.*
+        FROM transporte.tpreco_faixas tf
+        WHERE 1=1 {filtros}
+        ORDER BY tf.id
+        """,
+        {'tabela_id': 'tf.id_tpreco = %s'}
+    ),
+    'taxas': (
+        """
+        SELECT tt.*
+        FROM transporte.tpreco_taxas tt
+        WHERE 1=1 {filtros}
+        ORDER BY tt.id
+        """,
+        {'tabela_id': 'tt.id_tpreco = %s'}
+    )
+}
+
+FORMATOS = ('ndjson', 'csv')
+
+
+def _ndjson(colunas: tuple, lote: list) -> str:
+    """Um lote de linhas em NDJSON, serializado direto das tuplas"""
+    linhas = Rows(colunas, lote).dicts()
+    if orjson is None:
+        return ''.join(json.dumps(linha, default=str, ensure_ascii=False) + '\n' for linha in linhas)
+    return b''.join(orjson.dumps(linha, default=str, option=_ORJSON_LINHA) for linha in linhas).decode()
+
+
+def _rows(
+    entidade: str,
+    filtros: Dict[str, Any],
+    connection_factory: Callable,
+    batch_size: int
+) -> Iterator[Any]:
+    """
+    Gera os nomes das colunas e depois lotes de linhas, direto do cursor.
+
+    O cursor é sem buffer: o MySQL envia as linhas à medida que são lidas,
+    então a memória fica limitada a um lote. Se o cliente desconectar no
+    meio, a conexão com resultado pendente é descartada pelo pool.
+    """
+    consulta, aceitos = EXPORTS[entidade]
+    condicoes, params = [], []
+    for nome, condicao in aceitos.items():
+        if filtros.get(nome) not in (None, ''):
+            condicoes.append(f' AND {condicao}')
+            params.append(filtros[nome])
+
+    conn = connection_factory()
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(consulta.format(filtros=''.join(condicoes)), params)
+        yield cursor.column_names
+        while True:
+            lote = cursor.fetchmany(batch_size)
+            if not lote:
+                break
+            yield lote
+    finally:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass
+        conn.close()
+
+
+def export_lines(
+    entidade: str,
+    formato: str,
+    filtros: Dict[str, Any],
+    connection_factory: Callable = get_db_connection,
+    batch_size: int = Config.EXPORT_BATCH_SIZE
+) -> Iterator[str]:
+    """Gera o conteúdo da exportação em pedaços (um por lote de linhas)"""
+    if entidade not in EXPORTS:
+        raise ValueError(f'Entidade desconhecida: {entidade}')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}')
+
+    def gerar():
+        linhas = _rows(entidade, filtros, connection_factory, batch_size)
+        try:
+            colunas = next(linhas)
+
+            if formato == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(colunas)
+                yield buffer.getvalue()
+                for lote in linhas:
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows(lote)
+                    yield buffer.getvalue()
+            else:
+                for lote in linhas:
+                    yield _ndjson(colunas, lote)
+        finally:
+            # Cliente desconectou: libera cursor e conexão na hora
+            linhas.close()
+
+    return gerar()
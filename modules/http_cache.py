@@ -0,0 +1,67 @@
+# http_cache.py
+
+import hashlib
+import threading
+from functools import wraps
+from typing import Dict
+
+from flask import Response, make_response, request
+
+from modules.cache import TTLCache
+from modules.config import Config
+
+# (dataset, versão, caminho com query string) -> (corpo, mimetype, etag)
+response_cache = TTLCache(Config.REFERENCE_CACHE_SIZE, Config.REFERENCE_CACHE_TTL)
+
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def dataset_version(dataset: str) -> int:
+    return _versions.get(dataset, 0)
+
+
+def bump_dataset(*datasets: str) -> None:
+    """Chamar após o commit de escritas que mudam os dados de um dataset"""
+    with _versions_lock:
+        for dataset in datasets:
+            _versions[dataset] = _versions.get(dataset, 0) + 1
+
+
+def cache_control() -> str:
+    if Config.REFERENCE_MAX_AGE > 0:
+        return f'private, max-age={Config.REFERENCE_MAX_AGE}'
+    # Sem max-age o navegador revalida sempre, recebendo 304 se nada mudou
+    return 'private, no-cache'
+
+
+def conditional(dataset: str):
+    """
+    Cache de resposta versionado para dados de referência, com ETag.
+
+    O corpo gerado fica em memória até a versão do dataset mudar (ou o TTL
+    expirar, que cobre escritas feitas por outros processos). O ETag é o
+    hash do conteúdo; If-None-Match igual responde 304 sem corpo.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (dataset, dataset_version(dataset), request.full_path)
+            item = response_cache.get(key)
+
+            if item is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                item = (body, response.mimetype, hashlib.sha1(body).hexdigest())
+                response_cache.set(key, item)
+
+            body, mimetype, etag = item
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control()
+            return response.make_conditional(request)
+
+        return decorated_function
+    return decorator
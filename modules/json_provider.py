@@ -0,0 +1,130 @@
+# json_provider.py
+
+import decimal
+import uuid
+from datetime import date, datetime, time, timezone
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+from modules.config import Config
+
+try:
+    import orjson
+except ImportError:
+    # Sem orjson as respostas seguem pelo json da biblioteca padrão
+    orjson = None
+
+
+_DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(d: date) -> str:
+    """
+    Mesmo texto do werkzeug.http.http_date (sem hora = meia-noite, sem fuso
+    = UTC), sem passar pelo email.utils: em listagens grandes a formatação
+    das datas era a maior parte da serialização.
+    """
+    if not isinstance(d, datetime):
+        d = datetime.combine(d, time())
+    elif d.tzinfo is not None:
+        d = d.astimezone(timezone.utc)
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        _DIAS[d.weekday()], d.day, _MESES[d.month - 1], d.year, d.hour, d.minute, d.second
+    )
+
+
+def _default(o: Any) -> Any:
+    """Tipos que o orjson não serializa (ou que devem sair como no Flask)"""
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, tuple):
+        # namedtuple e afins, como no json da biblioteca padrão
+        return list(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Serialização das respostas com orjson, quando instalado.
+
+    Mantém o formato do provider padrão do Flask: chaves ordenadas, datas no
+    formato HTTP (ISO 8601 com JSON_ISO_DATES, serializadas pelo próprio
+    orjson), Decimal e UUID como texto. Texto não ASCII sai em UTF-8 em vez
+    de escapes \\u. Chamadas com argumentos do json padrão usam o provider
+    do Flask.
+    """
+
+    def _option(self, compact: bool = True) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if not Config.JSON_ISO_DATES:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj: Any, compact: bool = True) -> bytes:
+        if orjson is None:
+            return super().dumps(obj).encode()
+        return orjson.dumps(obj, default=_default, option=self._option(compact))
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        compact = self.compact if self.compact is not None else not self._app.debug
+        return self._app.response_class(self.dumps_bytes(obj, compact), mimetype=self.mimetype)
+
+    def stream_array(
+        self,
+        chave: str,
+        itens: Iterable[Any],
+        envelope: Optional[Dict[str, Any]] = None,
+        lote: int = Config.JSON_STREAM_BATCH
+    ) -> Iterator[bytes]:
+        """
+        Gera {"chave": [itens...], ...envelope} em pedaços de até `lote`
+        itens, sem montar o documento inteiro em memória.
+        """
+        if orjson is None:
+            serializar = self.dumps_bytes
+        else:
+            option = self._option()
+            serializar = lambda item: orjson.dumps(item, default=_default, option=option)  # noqa: E731
+
+        yield b'{' + serializar(chave) + b':['
+        iterador = iter(itens)
+        primeiro = True
+        while True:
+            pedaco = list(islice(iterador, lote))
+            if not pedaco:
+                break
+            # Um dumps por lote: "[...]" sem os colchetes
+            corpo = serializar(pedaco)[1:-1]
+            yield corpo if primeiro else b',' + corpo
+            primeiro = False
+
+        resto = serializar(envelope)[1:-1] if envelope else b''
+        yield b']' + (b',' + resto if resto else b'') + b'}'
+
+
+def init_app(app) -> None:
+    """Troca o provider JSON do app (JSON_FAST=0 mantém o padrão do Flask)"""
+    if Config.JSON_FAST:
+        app.json = FastJSONProvider(app)
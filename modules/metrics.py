@@ -0,0 +1,275 @@
+# metrics.py
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from flask import Response, abort, request
+
+from modules.config import Config
+from modules.db import add_observer, pool_stats
+from modules.statements import statements
+
+# Limites dos buckets (segundos / quantidade), no padrão "le" do Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+CONNECT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(nomes: Sequence[str], valores: Sequence, extra: str = '') -> str:
+    pares = [f'{nome}="{_escape(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor) -> str:
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    """Contador por combinação de labels"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), valor: float = 1) -> None:
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + valor
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, valor in series:
+            yield f'{self.name}{_labels(self.labels, labels)} {_numero(valor)}'
+
+
+class Histogram:
+    """
+    Histograma por combinação de labels.
+
+    Cada série guarda a contagem por bucket (não acumulada) e a soma; o
+    acúmulo do formato do Prometheus é feito só na exportação.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, valor: float) -> None:
+        # Primeiro bucket com limite >= valor; além do último cai em +Inf
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[i] += 1
+            serie[-1] += valor
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted((labels, list(serie)) for labels, serie in self._series.items())
+        limites = [_numero(b) for b in self.buckets] + ['+Inf']
+        for labels, serie in series:
+            acumulado = 0
+            for limite, quantidade in zip(limites, serie):
+                acumulado += quantidade
+                le = f'le="{limite}"'
+                yield f'{self.name}_bucket{_labels(self.labels, labels, le)} {acumulado}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_numero(serie[-1])}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {acumulado}'
+
+
+class Gauge:
+    """
+    Valor lido na hora da exportação: fn() -> [(valores dos labels, valor)].
+
+    Também serve para contadores mantidos fora daqui (kind='counter'),
+    como as estatísticas do pool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        fn: Callable[[], List[Tuple[tuple, float]]],
+        kind: str = 'gauge'
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for labels, valor in self.fn():
+            yield f'{self.name}{_labels(self.labels, labels)} {_numero(valor)}'
+
+
+def _audit_depth() -> List[Tuple[tuple, float]]:
+    # Import tardio: audit depende de db, e as métricas não devem iniciar o writer
+    from modules.audit import audit_writer
+    return [((), audit_writer.depth())]
+
+
+def _pool_gauge(chave: str) -> Callable[[], List[Tuple[tuple, float]]]:
+    return lambda: [((nome,), stats[chave]) for nome, stats in sorted(pool_stats().items())]
+
+
+def _statement_gauge(chave: str) -> Callable[[], List[Tuple[tuple, float]]]:
+    return lambda: [((nome,), stats[chave]) for nome, stats in sorted(statements.stats().items())]
+
+
+class Metrics:
+    """
+    Métricas do processo no formato texto do Prometheus.
+
+    Latência por endpoint do Flask, quantidade e tempo de consultas por
+    requisição (via TimedCursor do pool), exceções não tratadas, tempo de
+    abertura de conexões, estado dos pools e profundidade da fila de auditoria.
+    """
+
+    def __init__(self):
+        self.requests = Counter(
+            'http_requests_total', 'Requisições atendidas', ('endpoint', 'method', 'status')
+        )
+        self.exceptions = Counter(
+            'http_request_exceptions_total', 'Requisições encerradas por exceção não tratada',
+            ('endpoint', 'exception')
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Latência das requisições por endpoint',
+            ('endpoint', 'method'), LATENCY_BUCKETS
+        )
+        self.request_queries = Histogram(
+            'http_request_db_queries', 'Consultas ao banco por requisição',
+            ('endpoint',), QUERY_COUNT_BUCKETS
+        )
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Tempo em consultas ao banco por requisição',
+            ('endpoint',), LATENCY_BUCKETS
+        )
+        self.queries = Histogram(
+            'db_query_duration_seconds', 'Duração de cada consulta', ('pool',), QUERY_BUCKETS
+        )
+        self.connects = Histogram(
+            'db_connect_duration_seconds', 'Tempo de abertura de conexões com o MySQL',
+            ('pool',), CONNECT_BUCKETS
+        )
+        self.gauges = [
+            Gauge('db_pool_connections_in_use', 'Conexões emprestadas', ('pool',), _pool_gauge('in_use')),
+            Gauge('db_pool_connections_idle', 'Conexões livres no pool', ('pool',), _pool_gauge('idle')),
+            Gauge(
+                'db_pool_waits_total', 'Empréstimos que precisaram esperar',
+                ('pool',), _pool_gauge('waits'), kind='counter'
+            ),
+            Gauge(
+                'db_pool_timeouts_total', 'Empréstimos que estouraram o tempo de espera',
+                ('pool',), _pool_gauge('timeouts'), kind='counter'
+            ),
+            Gauge(
+                'db_statement_prepares_total', 'Comandos preparados no servidor (um por conexão e comando)',
+                ('statement',), _statement_gauge('prepares'), kind='counter'
+            ),
+            Gauge(
+                'db_statement_executes_total', 'Execuções de comandos já preparados',
+                ('statement',), _statement_gauge('executes'), kind='counter'
+            ),
+            Gauge('audit_queue_depth', 'Eventos de auditoria aguardando gravação', (), _audit_depth)
+        ]
+        # Consultas da requisição em andamento nesta thread: [quantidade, segundos]
+        self._local = threading.local()
+
+    def observe_db(self, tipo: str, pool: str, segundos: float, *detalhes) -> None:
+        """Observador registrado em modules.db"""
+        if tipo == 'connect':
+            self.connects.observe((pool,), segundos)
+            return
+        self.queries.observe((pool,), segundos)
+        atual = getattr(self._local, 'atual', None)
+        if atual is not None:
+            atual[0] += 1
+            atual[1] += segundos
+
+    def start_request(self) -> None:
+        self._local.inicio = time.perf_counter()
+        self._local.atual = [0, 0.0]
+
+    def _record(self, status: str) -> None:
+        atual = getattr(self._local, 'atual', None)
+        if atual is None:
+            return
+        self._local.atual = None
+
+        endpoint = request.endpoint or 'none'
+        self.latency.observe((endpoint, request.method), time.perf_counter() - self._local.inicio)
+        self.requests.inc((endpoint, request.method, status))
+        self.request_queries.observe((endpoint,), atual[0])
+        self.request_db_time.observe((endpoint,), atual[1])
+
+    def finish_request(self, response):
+        self._record(str(response.status_code))
+        return response
+
+    def teardown_request(self, exc=None) -> None:
+        if exc is not None:
+            self.exceptions.inc((request.endpoint or 'none', type(exc).__name__))
+        # Exceção propagada sem resposta (ex.: PROPAGATE_EXCEPTIONS): after_request
+        # não rodou e a requisição é contada como 500
+        self._record('500')
+
+    def render(self) -> str:
+        linhas = []
+        for metrica in (
+            self.requests, self.exceptions, self.latency, self.request_queries, self.request_db_time,
+            self.queries, self.connects, *self.gauges
+        ):
+            linhas.extend(metrica.render())
+        return '\n'.join(linhas) + '\n'
+
+    def view(self):
+        token = Config.METRICS_TOKEN
+        if token:
+            enviado = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(enviado, f'Bearer {token}'):
+                abort(401)
+        elif request.remote_addr not in Config.METRICS_ALLOW_FROM:
+            abort(403)
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+    def init_app(self, app) -> None:
+        """Liga a coleta e registra GET /metrics (nada é feito se METRICS_ENABLED=0)"""
+        if not Config.METRICS_ENABLED:
+            return
+        add_observer(self.observe_db)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.view, methods=['GET'])
+
+
+metrics = Metrics()
@@ -0,0 +1,221 @@
+# municipio_search.py
+
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from modules.cep_index import cep_index, format_cep
+from modules.coverage import CoverageIndex, coverage_index
+from modules.db import get_db_connection
+
+# Prefixos indexados por início de palavra; termos maiores usam o prefixo
+# truncado e são confirmados na comparação final
+PREFIXO_MIN = 3
+PREFIXO_MAX = 8
+
+
+def fold(texto: str) -> str:
+    """Remove acentos, ignora maiúsculas e normaliza separadores para espaço"""
+    sem_acento = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '')
+        if not unicodedata.combining(c)
+    )
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in sem_acento.casefold()).split())
+
+
+def trigrams(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class MunicipioSnapshot:
+    """
+    Municípios em listas paralelas com as listas invertidas.
+
+    Os docs são numerados em ordem alfabética, então listas de docs
+    ordenadas já saem na ordem de exibição.
+    """
+    __slots__ = (
+        'codigos', 'nomes', 'nomes_fold', 'ufs', 'estados', 'faixas',
+        'prefixos_nome', 'prefixos_palavra', 'trigramas'
+    )
+
+    def __init__(self):
+        self.codigos: List[int] = []
+        self.nomes: List[str] = []
+        self.nomes_fold: List[str] = []
+        self.ufs: List[str] = []
+        self.estados: List[str] = []
+        self.faixas: List[Optional[str]] = []
+        # prefixo -> docs (tupla ordenada) cujo nome / alguma palavra começa com ele
+        self.prefixos_nome: Dict[str, tuple] = {}
+        self.prefixos_palavra: Dict[str, tuple] = {}
+        self.trigramas: Dict[str, frozenset] = {}
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def search(self, termo: str, uf: Optional[str] = None) -> List[int]:
+        """
+        Docs que contêm o termo, do mais ao menos relevante:
+        nome começando pelo termo, alguma palavra começando por ele, e o resto.
+        """
+        termo = fold(termo)
+        if len(termo) < PREFIXO_MIN:
+            return []
+
+        uf = uf.upper() if uf else None
+        nomes = self.nomes_fold
+        ufs = self.ufs
+        chave = termo[:PREFIXO_MAX]
+        exato = len(termo) <= PREFIXO_MAX
+
+        # 1: o nome começa com o termo
+        inicio = [
+            d for d in self.prefixos_nome.get(chave, ())
+            if (not uf or ufs[d] == uf) and (exato or nomes[d].startswith(termo))
+        ]
+        vistos = set(inicio)
+
+        # 2: outra palavra do nome começa com o termo
+        palavra = [
+            d for d in self.prefixos_palavra.get(chave, ())
+            if d not in vistos and (not uf or ufs[d] == uf)
+            and (exato or ' ' + termo in nomes[d])
+        ]
+        vistos.update(palavra)
+
+        # 3: o termo aparece no meio de uma palavra; candidatos pela
+        # interseção das listas de trigramas, da menor para a maior
+        listas = sorted(
+            (self.trigramas.get(t, frozenset()) for t in trigrams(termo)),
+            key=len
+        )
+        meio = sorted(
+            d for d in listas[0].intersection(*listas[1:])
+            if d not in vistos and (not uf or ufs[d] == uf) and termo in nomes[d]
+        )
+
+        return inicio + palavra + meio
+
+
+class MunicipioIndex:
+    """
+    Índice de busca de municípios em memória (autocomplete).
+
+    Nomes, UF e faixas de CEP mudam raramente e só são relidos em rebuild().
+    O total de praças por município vem do índice de cobertura.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_db_connection,
+        coverage: CoverageIndex = coverage_index
+    ):
+        self._connection_factory = connection_factory
+        self._coverage = coverage
+        self._lock = threading.RLock()
+        self._snapshot: Optional[MunicipioSnapshot] = None
+
+    def rebuild(self) -> MunicipioSnapshot:
+        with self._lock:
+            snapshot = self._build()
+            self._snapshot = snapshot
+        return snapshot
+
+    def _build(self) -> MunicipioSnapshot:
+        snapshot = MunicipioSnapshot()
+        conn = self._connection_factory()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT m.codigoIbge, m.municipio, e.Nome, e.Uf
+                FROM brasil.municipio m
+                JOIN brasil.estado e ON m.CodigoUf = e.CodigoUf
+            """)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        # Faixas de CEP de cada município, reaproveitando o índice de CEP
+        ceps = cep_index.snapshot()
+        faixas = defaultdict(list)
+        for i in range(len(ceps)):
+            faixas[ceps.municipio[i]].append(
+                f'{format_cep(ceps.inicio[i])}-{format_cep(ceps.fim[i])}'
+            )
+
+        # Numeração dos docs em ordem alfabética (desempate do ranking)
+        rows.sort(key=lambda row: (fold(row[1]), row[1]))
+
+        prefixos_nome = defaultdict(list)
+        prefixos_palavra = defaultdict(list)
+        trigramas = defaultdict(set)
+
+        for doc, (codigo, nome, estado, uf) in enumerate(rows):
+            nome_fold = fold(nome)
+            snapshot.codigos.append(codigo)
+            snapshot.nomes.append(nome)
+            snapshot.nomes_fold.append(nome_fold)
+            snapshot.ufs.append(uf)
+            snapshot.estados.append(estado)
+            snapshot.faixas.append('; '.join(dict.fromkeys(faixas.get(codigo, []))) or None)
+
+            for t in trigrams(nome_fold):
+                trigramas[t].add(doc)
+
+            # Prefixos a partir de cada início de palavra (até PREFIXO_MAX letras)
+            chaves_palavra = set()
+            inicio = 0
+            for palavra in nome_fold.split(' '):
+                resto = nome_fold[inicio:]
+                chaves = [resto[:n] for n in range(PREFIXO_MIN, min(PREFIXO_MAX, len(resto)) + 1)]
+                if inicio == 0:
+                    for chave in chaves:
+                        prefixos_nome[chave].append(doc)
+                else:
+                    chaves_palavra.update(chaves)
+                inicio += len(palavra) + 1
+            for chave in chaves_palavra:
+                prefixos_palavra[chave].append(doc)
+
+        snapshot.prefixos_nome = {k: tuple(v) for k, v in prefixos_nome.items()}
+        snapshot.prefixos_palavra = {k: tuple(v) for k, v in prefixos_palavra.items()}
+        snapshot.trigramas = {k: frozenset(v) for k, v in trigramas.items()}
+        return snapshot
+
+    def snapshot(self) -> MunicipioSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self.rebuild()
+        return snapshot
+
+    def search(self, termo: str, uf: Optional[str] = None, offset: int = 0, limit: int = 10) -> Dict:
+        """Página de resultados no formato de /api/municipios/search"""
+        snapshot = self.snapshot()
+        docs = snapshot.search(termo, uf)
+        pagina = docs[offset:offset + limit]
+        cobertura = self._coverage.snapshot().por_municipio if pagina else {}
+
+        return {
+            'total': len(docs),
+            'municipios': [
+                {
+                    'codigoIbge': snapshot.codigos[doc],
+                    'municipio': snapshot.nomes[doc],
+                    'estado_nome': snapshot.estados[doc],
+                    'Uf': snapshot.ufs[doc],
+                    'faixas_cep': snapshot.faixas[doc],
+                    'total_pracas': len(cobertura.get(snapshot.codigos[doc], ()))
+                }
+                for doc in pagina
+            ]
+        }
+
+
+municipio_index = MunicipioIndex()
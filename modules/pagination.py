@@ -0,0 +1,122 @@
+# pagination.py
+
+import base64
+import json
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from modules.cache import TTLCache
+from modules.config import Config
+
+# (endpoint, filtros) -> total de itens da última consulta paginada por offset
+count_cache = TTLCache(Config.COUNT_CACHE_SIZE, Config.COUNT_CACHE_TTL)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> List[Any]:
+    """Decodifica o cursor opaco; ValueError se estiver malformado"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as err:
+        raise ValueError('Cursor inválido') from err
+    if not isinstance(values, list):
+        raise ValueError('Cursor inválido')
+    return values
+
+
+class Pagination:
+    """
+    Paginação por offset (?page=) ou por cursor (?after=).
+
+    keys são pares (expressão SQL, coluna no resultado) na ordem do ORDER BY;
+    a última deve ser única para que o cursor avance sem repetir linhas. No
+    modo cursor a consulta busca direto a partir da última chave vista, sem
+    OFFSET nem COUNT(*) OVER(); o total vem do cache de contagens, se houver.
+    """
+
+    def __init__(
+        self,
+        page: int,
+        per_page: int,
+        keys: List[Tuple[str, str]],
+        after: Optional[str] = None,
+        with_total: bool = True,
+        cache_key: Optional[Hashable] = None
+    ):
+        self.keys = keys
+        self.per_page = per_page
+        self.cache_key = cache_key
+        self.after = decode_cursor(after) if after else None
+        if self.after is not None and len(self.after) != len(keys):
+            raise ValueError('Cursor inválido')
+
+        self.page = 1 if self.keyset else page
+        self.offset = 0 if self.keyset else (page - 1) * per_page
+        self.with_total = with_total and not self.keyset
+
+    @property
+    def keyset(self) -> bool:
+        return self.after is not None
+
+    @property
+    def count_column(self) -> str:
+        return 'COUNT(*) OVER() as total_count' if self.with_total else 'NULL as total_count'
+
+    @staticmethod
+    def _compare(expr: str, valor: Any, operador: str, params: list) -> str:
+        # No ORDER BY ascendente do MySQL o NULL vem antes de qualquer valor:
+        # "= NULL" vira IS NULL e "> NULL" vira IS NOT NULL
+        if valor is None:
+            return f'{expr} IS NULL' if operador == '=' else f'{expr} IS NOT NULL'
+        params.append(valor)
+        return f'{expr} {operador} %s'
+
+    def apply(self, query: str, params: list) -> str:
+        """
+        Acrescenta a condição de busca pelo cursor (k1 > v1 OR (k1 = v1 AND
+        k2 > v2) ...), com chaves NULL (ex.: tp.modal, p.nome) tratadas
+        como menores que qualquer valor, como no ORDER BY.
+        """
+        if not self.keyset:
+            return query
+
+        condicoes = []
+        for i, (expr, _) in enumerate(self.keys):
+            partes = [
+                self._compare(anterior, valor, '=', params)
+                for (anterior, _), valor in zip(self.keys[:i], self.after)
+            ]
+            partes.append(self._compare(expr, self.after[i], '>', params))
+            condicoes.append('(' + ' AND '.join(partes) + ')')
+
+        return query + ' AND (' + ' OR '.join(condicoes) + ')'
+
+    def result(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Monta o bloco 'pagination' da resposta"""
+        if self.with_total:
+            total_count = rows[0]['total_count'] if rows else 0
+            # Uma página vazia além da primeira não informa o total real
+            if self.cache_key is not None and (rows or self.page == 1):
+                count_cache.set(self.cache_key, total_count)
+        else:
+            total_count = count_cache.get(self.cache_key)
+
+        next_cursor = None
+        if len(rows) == self.per_page:
+            ultima = rows[-1]
+            next_cursor = encode_cursor([ultima[coluna] for _, coluna in self.keys])
+
+        return {
+            'page': None if self.keyset else self.page,
+            'per_page': self.per_page,
+            'total_items': total_count,
+            'total_pages': (
+                (total_count + self.per_page - 1) // self.per_page
+                if total_count is not None else None
+            ),
+            'next': next_cursor
+        }
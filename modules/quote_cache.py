@@ -0,0 +1,133 @@
+# quote_cache.py
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import mysql.connector
+from modules.cache import TTLCache
+from modules.config import Config
+from modules.coverage import coverage_index
+from modules.rate_engine import QuoteRanking, RateEngine, rate_engine
+
+_MISSING = object()
+
+
+class QuoteCache:
+    """
+    Cache de cotações por entrada normalizada.
+
+    A chave é (CodMunicipio, geração do município, transportadora, peso e
+    cubagem arredondados). O resultado de um destino só muda quando muda uma
+    tabela ou a cobertura das praças que o atendem; invalidate_municipios(),
+    com os municípios retornados por coverage_index.refresh_pracas(), avança
+    a geração dos municípios afetados e as entradas antigas deixam de
+    ser alcançadas, saindo depois pelo LRU ou pelo TTL. O TTL acompanha a
+    idade máxima do motor de frete, que cobre escritas de outros processos.
+    """
+
+    def __init__(
+        self,
+        engine: RateEngine = rate_engine,
+        maxsize: int = Config.QUOTE_CACHE_SIZE,
+        ttl: float = Config.QUOTE_CACHE_TTL,
+        casas: int = Config.QUOTE_CACHE_DECIMAIS
+    ):
+        self._engine = engine
+        self._cache = TTLCache(maxsize, ttl)
+        self.casas = casas
+        self._lock = threading.Lock()
+        self._geracoes: Dict[int, int] = {}
+        self._geral = 0
+
+    def normalize(self, peso: float, cubagem: float) -> Tuple[float, float]:
+        """Peso e cubagem usados no cálculo (e na chave), com casas decimais fixas"""
+        return round(peso, self.casas), round(cubagem, self.casas)
+
+    def _key(
+        self,
+        cod_municipio: int,
+        peso: float,
+        cubagem: float,
+        transportadora_id: Optional[int],
+        ordenacao: Optional[tuple] = None
+    ) -> tuple:
+        return (
+            cod_municipio, self._geral, self._geracoes.get(cod_municipio, 0),
+            transportadora_id or None, peso, cubagem, ordenacao
+        )
+
+    def quote(
+        self,
+        cod_municipio: int,
+        peso: float,
+        cubagem: float,
+        transportadora_id: Optional[int] = None,
+        ranking: Optional[QuoteRanking] = None
+    ) -> Optional[List[Dict]]:
+        """Cotações do destino; None se nenhuma tabela atende (como em quote_batch)"""
+        return self.quote_batch([(cod_municipio, peso, cubagem, transportadora_id)], ranking)[0]
+
+    def quote_batch(
+        self,
+        envios: List[Tuple],
+        ranking: Optional[QuoteRanking] = None
+    ) -> List[Optional[List[Dict]]]:
+        """Como RateEngine.quote_batch, calculando só as chaves que não estão no cache"""
+        # Listas ordenadas/filtradas ficam em chaves próprias, pelos parâmetros do ranking
+        ordenacao = ranking.key() if ranking is not None else None
+        chaves = []
+        encontrados: Dict[tuple, Optional[List[Dict]]] = {}
+        faltando: Dict[tuple, Tuple] = {}
+        for cod_municipio, peso, cubagem, transportadora_id in envios:
+            peso, cubagem = self.normalize(peso, cubagem)
+            # A geração é lida antes do cálculo: um resultado calculado durante
+            # uma invalidação fica numa chave que já não será consultada
+            chave = self._key(cod_municipio, peso, cubagem, transportadora_id, ordenacao)
+            chaves.append(chave)
+            if chave in encontrados or chave in faltando:
+                continue
+            resultado = self._cache.get(chave, _MISSING)
+            if resultado is _MISSING:
+                faltando[chave] = (cod_municipio, peso, cubagem, transportadora_id)
+            else:
+                encontrados[chave] = resultado
+
+        if faltando:
+            resultados = self._engine.quote_batch(list(faltando.values()), ranking)
+            for chave, resultado in zip(faltando, resultados):
+                self._cache.set(chave, resultado)
+                encontrados[chave] = resultado
+
+        return [encontrados[chave] for chave in chaves]
+
+    def invalidate_municipios(self, codigos: Iterable[int]) -> None:
+        with self._lock:
+            for codigo in codigos:
+                self._geracoes[codigo] = self._geracoes.get(codigo, 0) + 1
+
+    def clear(self) -> None:
+        """Invalida tudo (ex.: siglas e descrições de taxas, que aparecem em todas as cotações)"""
+        with self._lock:
+            self._geral += 1
+            self._geracoes.clear()
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+
+quote_cache = QuoteCache()
+
+
+def refresh_coverage(conn, praca_ids: Iterable[int]) -> None:
+    """
+    Depois do commit de uma escrita: relê as praças na cobertura e invalida
+    as cotações dos municípios afetados. Se a releitura falhar, a escrita
+    continua valendo; a cobertura é recarregada na próxima consulta e
+    todas as cotações são invalidadas.
+    """
+    try:
+        quote_cache.invalidate_municipios(coverage_index.refresh_pracas(conn, praca_ids))
+    except mysql.connector.Error:
+        coverage_index.invalidate()
+        quote_cache.clear()
@@ -0,0 +1,568 @@
+# rate_engine.py
+
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from modules.config import Config
+from modules.coverage import CoverageIndex, coverage_index
+from modules.db import get_db_connection
+
+INFINITO = float('inf')
+
+
+class BandSet:
+    """
+    Faixas de um tipo ('peso' ou 'cubagem') de uma tabela, ordenadas pelo
+    limite superior. Com faixas sobrepostas (uma começa antes de outra de
+    limite menor), find() deixa de confiar só na busca binária.
+    """
+    __slots__ = ('ids', 'minimos', 'maximos', 'faixa_max', 'valores', 'adicionais', 'sobrepostas')
+
+    def __init__(self, faixas: List[tuple]):
+        # faixas: (id, faixa_min, faixa_max, valor, adicional_por_excedente)
+        faixas = sorted(
+            faixas,
+            key=lambda f: (INFINITO if f[2] is None else float(f[2]), float(f[1]), f[0])
+        )
+        self.ids = tuple(f[0] for f in faixas)
+        self.minimos = tuple(float(f[1]) for f in faixas)
+        self.maximos = tuple(INFINITO if f[2] is None else float(f[2]) for f in faixas)
+        self.faixa_max = tuple(f[2] for f in faixas)
+        self.valores = tuple(f[3] for f in faixas)
+        self.adicionais = tuple(f[4] for f in faixas)
+        # Mínimos fora de ordem: uma faixa posterior pode conter o valor
+        # mesmo quando a encontrada pela busca binária começa depois dele
+        self.sobrepostas = any(a > b for a, b in zip(self.minimos, self.minimos[1:]))
+
+    def find(self, valor: float) -> int:
+        """Índice da primeira faixa com faixa_min <= valor <= faixa_max, ou -1"""
+        i = bisect_left(self.maximos, valor)
+        if i < len(self.maximos) and self.minimos[i] <= valor:
+            return i
+        if self.sobrepostas:
+            # Todas a partir de i têm faixa_max >= valor; basta achar o mínimo
+            for j in range(i + 1, len(self.minimos)):
+                if self.minimos[j] <= valor:
+                    return j
+        return -1
+
+
+class Fee:
+    """Taxa de uma tabela de preço já resolvida com siglas e descrição"""
+    __slots__ = ('id', 'descricao', 'sigla', 'tipo', 'unidade', 'valor', 'obrigatoria')
+
+    def __init__(self, id, descricao, sigla, tipo, unidade, valor, obrigatoria):
+        self.id = id
+        self.descricao = descricao
+        self.sigla = sigla
+        self.tipo = tipo
+        self.unidade = unidade
+        self.valor = valor
+        self.obrigatoria = bool(obrigatoria)
+
+
+class TariffTable:
+    """Tabela de preço (tpraca) compilada com suas faixas e taxas"""
+    __slots__ = (
+        'id', 'id_praca', 'praca_nome', 'id_transportadora', 'modal',
+        'tipo_cobranca_peso', 'prazo_entrega', 'bands', 'fees', '_por_faixa', '_piso'
+    )
+
+    def __init__(self, row: tuple):
+        (self.id, self.id_praca, self.praca_nome, self.id_transportadora,
+         self.modal, self.tipo_cobranca_peso, self.prazo_entrega) = row
+        self.bands: Dict[str, BandSet] = {}
+        self.fees: Tuple[Fee, ...] = ()
+        # (tipo_faixa, índice) -> (valor_frete, taxas, valor_total) das faixas sem excedente
+        self._por_faixa: Dict[Tuple[str, int], tuple] = {}
+        self._piso: Optional[float] = None
+
+    @property
+    def prazo(self) -> float:
+        """Prazo de entrega para ordenação (sem prazo informado vai para o fim)"""
+        return INFINITO if self.prazo_entrega is None else self.prazo_entrega
+
+    @property
+    def piso(self) -> float:
+        """
+        Menor valor_total que esta tabela pode cotar: a menor faixa com as
+        taxas obrigatórias. Serve de limite inferior para descartar tabelas
+        na ordenação sem calculá-las; -inf quando excedente ou taxa negativos
+        impedem o limite.
+        """
+        if self._piso is None:
+            valores = [float(v) for bands in self.bands.values() for v in bands.valores if v is not None]
+            fator = 1 + sum(float(f.valor) / 100 for f in self.fees if f.obrigatoria and f.unidade == '%')
+            fixo = sum(float(f.valor) for f in self.fees if f.obrigatoria and f.unidade == 'R$')
+            negativos = any(
+                a is not None and a < 0 for bands in self.bands.values() for a in bands.adicionais
+            )
+            if not valores:
+                # Sem faixas a tabela nunca cota
+                self._piso = INFINITO
+            elif negativos or fator < 0:
+                self._piso = -INFINITO
+            else:
+                # Folga para o arredondamento do float frente ao Decimal do cálculo
+                self._piso = min(valores) * fator + fixo - 1e-6
+        return self._piso
+
+    def charge_basis(self, peso: float, cubagem: float) -> Tuple[str, float]:
+        """Define se a cobrança usa peso ou cubagem"""
+        if self.tipo_cobranca_peso == 'cubagem':
+            return 'cubagem', cubagem
+        if self.tipo_cobranca_peso == 'ambos' and cubagem > peso:
+            return 'cubagem', cubagem
+        return 'peso', peso
+
+    def apply_fees(self, valor_frete) -> Tuple[List[Dict], Any]:
+        """Taxas calculadas sobre o frete e o valor total (frete + obrigatórias)"""
+        taxas_calculadas = []
+        obrigatorias = 0
+        for fee in self.fees:
+            valor_taxa = 0
+            if fee.unidade == '%':
+                valor_taxa = (fee.valor / 100) * valor_frete
+            elif fee.unidade == 'R$':
+                valor_taxa = fee.valor
+
+            taxas_calculadas.append({
+                'id': fee.id,
+                'descricao': fee.descricao,
+                'sigla': fee.sigla,
+                'tipo': fee.tipo,
+                'valor': valor_taxa,
+                'obrigatoria': fee.obrigatoria
+            })
+            if fee.obrigatoria:
+                obrigatorias += valor_taxa
+
+        return taxas_calculadas, valor_frete + obrigatorias
+
+    def evaluate(self, peso: float, cubagem: float) -> Optional[tuple]:
+        """
+        Calcula o frete desta tabela sem montar a cotação: (valor_total,
+        tipo_faixa, valor_utilizado, valor_frete, taxas) ou None se nenhuma
+        faixa atende.
+
+        Sem excedente o frete só depende da faixa, então as taxas de cada
+        faixa são calculadas uma vez por fotografia e a lista de taxas é
+        compartilhada entre as cotações (não deve ser alterada).
+        """
+        tipo_faixa, valor_a_usar = self.charge_basis(peso, cubagem)
+
+        bands = self.bands.get(tipo_faixa)
+        i = bands.find(valor_a_usar) if bands else -1
+        if i < 0:
+            return None
+
+        faixa_max = bands.faixa_max[i]
+        adicional = bands.adicionais[i]
+        if faixa_max and valor_a_usar > faixa_max and adicional:
+            valor_frete = bands.valores[i] + (valor_a_usar - faixa_max) * adicional
+            taxas_calculadas, valor_total = self.apply_fees(valor_frete)
+        else:
+            calculado = self._por_faixa.get((tipo_faixa, i))
+            if calculado is None:
+                valor_frete = bands.valores[i]
+                calculado = (valor_frete,) + self.apply_fees(valor_frete)
+                self._por_faixa[(tipo_faixa, i)] = calculado
+            valor_frete, taxas_calculadas, valor_total = calculado
+
+        return valor_total, tipo_faixa, valor_a_usar, valor_frete, taxas_calculadas
+
+    def to_quote(self, calculo: tuple) -> Dict:
+        """Cotação no formato da API a partir do resultado de evaluate()"""
+        valor_total, tipo_faixa, valor_a_usar, valor_frete, taxas_calculadas = calculo
+        return {
+            'id_tabela': self.id,
+            'praca_nome': self.praca_nome,
+            'modal': self.modal,
+            'prazo_entrega': self.prazo_entrega,
+            'valor_frete': valor_frete,
+            'tipo_calculo': tipo_faixa,
+            'valor_utilizado': valor_a_usar,
+            'taxas': taxas_calculadas,
+            'valor_total': valor_total
+        }
+
+    def price(self, peso: float, cubagem: float) -> Optional[Dict]:
+        """Calcula o frete desta tabela; None se nenhuma faixa atende"""
+        calculo = self.evaluate(peso, cubagem)
+        return self.to_quote(calculo) if calculo else None
+
+
+class QuoteRanking:
+    """
+    Ordenação e filtros das cotações de um destino.
+
+    ordem: 'custo' (valor_total), 'prazo' (prazo_entrega) ou 'score'
+    (média ponderada de custo e prazo, cada um relativo ao melhor da lista,
+    com peso_prazo entre 0 e 1). pareto=True mantém só as opções que nenhuma
+    outra supera em custo e prazo ao mesmo tempo. modal filtra as tabelas
+    antes do cálculo e limite corta a lista ordenada.
+
+    As tabelas são comparadas pelo valor calculado, sem montar a cotação;
+    só as que ficam na resposta viram dict. Com limite (ordem custo ou
+    prazo) elas são percorridas pelo limite inferior (piso e prazo): quando
+    o da próxima já não entra no resultado, as restantes nem são
+    calculadas. Com pareto são puladas as tabelas já dominadas pelo piso.
+    """
+    __slots__ = ('ordem', 'limite', 'modais', 'pareto', 'peso_prazo')
+
+    ORDENS = ('custo', 'prazo', 'score')
+
+    def __init__(
+        self,
+        ordem: str = 'custo',
+        limite: Optional[int] = None,
+        modal: Optional[Iterable[str]] = None,
+        pareto: bool = False,
+        peso_prazo: float = Config.FRETE_PESO_PRAZO
+    ):
+        if ordem not in self.ORDENS:
+            raise ValueError(f'Ordem inválida: {ordem}')
+        if limite is not None and limite < 1:
+            raise ValueError('O limite deve ser maior que zero')
+        if not 0 <= peso_prazo <= 1:
+            raise ValueError('O peso do prazo deve estar entre 0 e 1')
+        self.ordem = ordem
+        self.limite = limite
+        self.modais = frozenset(modal) if modal else None
+        self.pareto = pareto
+        self.peso_prazo = peso_prazo
+
+    def key(self) -> tuple:
+        """Parâmetros em forma de chave (cache de cotações)"""
+        modais = tuple(sorted(self.modais)) if self.modais else None
+        return (self.ordem, self.limite, modais, self.pareto, self.peso_prazo)
+
+    @property
+    def percurso(self) -> str:
+        """Ordem em que as tabelas são percorridas: pelo prazo (ordem prazo e Pareto) ou pelo piso"""
+        return 'prazo' if self.ordem == 'prazo' or self.pareto else 'custo'
+
+    def bound(self, table: TariffTable) -> tuple:
+        """Limite inferior, na ordem do percurso, de qualquer cotação da tabela"""
+        if self.percurso == 'prazo':
+            return (table.prazo, table.piso, table.id)
+        return (table.piso, table.prazo, table.id)
+
+    def _key(self, table: TariffTable, valor_total) -> tuple:
+        if self.ordem == 'prazo':
+            return (table.prazo, valor_total, table.id)
+        return (valor_total, table.prazo, table.id)
+
+    def rank(self, ordenadas: List[Tuple[tuple, TariffTable]], peso: float, cubagem: float) -> List[Dict]:
+        """Cotações das tabelas (pares (bound, tabela) em ordem de bound), filtradas, ordenadas e cortadas"""
+        if self.modais:
+            ordenadas = [par for par in ordenadas if par[1].modal in self.modais]
+
+        if self.pareto:
+            calculos = self._frontier(ordenadas, peso, cubagem)
+        elif self.limite and self.ordem != 'score':
+            calculos = self._best(ordenadas, peso, cubagem)
+        else:
+            calculos = []
+            for _, table in ordenadas:
+                calculo = table.evaluate(peso, cubagem)
+                if calculo:
+                    calculos.append((self._key(table, calculo[0]), table, calculo))
+            calculos.sort(key=lambda c: c[0])
+
+        if self.ordem == 'score':
+            return self._score([table.to_quote(calculo) for _, table, calculo in calculos])[:self.limite]
+        # Só as cotações que ficam na resposta viram dict
+        return [table.to_quote(calculo) for _, table, calculo in calculos[:self.limite]]
+
+    def _best(self, ordenadas: List[Tuple[tuple, TariffTable]], peso: float, cubagem: float) -> List[tuple]:
+        """As `limite` melhores por custo ou prazo, parando no piso da próxima tabela"""
+        melhores: List[tuple] = []
+        for limite, table in ordenadas:
+            if len(melhores) == self.limite and limite > melhores[-1][0]:
+                break
+            calculo = table.evaluate(peso, cubagem)
+            if calculo:
+                insort(melhores, (self._key(table, calculo[0]), table, calculo))
+                del melhores[self.limite:]
+        return melhores
+
+    def _frontier(self, ordenadas: List[Tuple[tuple, TariffTable]], peso: float, cubagem: float) -> List[tuple]:
+        """
+        Fronteira de Pareto em (valor_total, prazo). As tabelas vêm pelo
+        prazo: uma cujo piso não fica abaixo do menor total já calculado (de
+        prazo igual ou menor) está dominada e nem é calculada.
+        """
+        calculos = []
+        menor_total = INFINITO
+        for _, table in ordenadas:
+            if menor_total <= table.piso:
+                continue
+            calculo = table.evaluate(peso, cubagem)
+            if calculo:
+                calculos.append((self._key(table, calculo[0]), table, calculo))
+                menor_total = min(menor_total, calculo[0])
+
+        pontos = sorted(calculos, key=lambda c: (c[2][0], c[1].prazo, c[1].id))
+        fronteira = set()
+        melhor_prazo = None
+        for _, table, _ in pontos:
+            if melhor_prazo is None or table.prazo < melhor_prazo:
+                fronteira.add(table.id)
+                melhor_prazo = table.prazo
+        return sorted((c for c in calculos if c[1].id in fronteira), key=lambda c: c[0])
+
+    def _score(self, resultados: List[Dict]) -> List[Dict]:
+        """
+        Ordena pelo score (menor é melhor) e o inclui em cada cotação. O prazo
+        conta em dias + 1, para que prazo 0 não divida por zero; se nenhuma
+        cotação tiver prazo, vale só o custo. Quando há prazos, as cotações
+        sem prazo ficam com score None e vão para o fim, pelo custo.
+        """
+        if not resultados:
+            return resultados
+        menor_custo = max(min(float(r['valor_total']) for r in resultados), 0.01)
+        prazos = [r['prazo_entrega'] for r in resultados if r['prazo_entrega'] is not None]
+        menor_prazo = min(prazos) + 1 if prazos else None
+
+        for resultado in resultados:
+            custo = float(resultado['valor_total']) / menor_custo
+            if menor_prazo is None:
+                prazo = 1.0
+            elif resultado['prazo_entrega'] is None:
+                resultado['score'] = None
+                continue
+            else:
+                prazo = (resultado['prazo_entrega'] + 1) / menor_prazo
+            resultado['score'] = round((1 - self.peso_prazo) * custo + self.peso_prazo * prazo, 4)
+
+        return sorted(resultados, key=lambda r: (
+            r['score'] is None, r['score'] or 0, r['valor_total'], r['id_tabela']
+        ))
+
+
+class RateSnapshot:
+    """Fotografia imutável das tabelas de preço"""
+    __slots__ = ('tables', 'loaded_at', 'ordenadas')
+
+    def __init__(self, tables: Dict[int, TariffTable]):
+        self.tables = tables
+        self.loaded_at = time.monotonic()
+        # (tabelas do destino, transportadora, percurso) -> pares (bound, tabela) já ordenados
+        self.ordenadas: Dict[tuple, List[Tuple[tuple, TariffTable]]] = {}
+
+
+class RateEngine:
+    """
+    Motor de cálculo de frete em memória.
+
+    Carrega tpraca, tpreco_faixas e tpreco_taxas uma única vez e responde
+    cotações sem acessar o banco; as tabelas de cada município vêm do índice
+    de cobertura. A fotografia é trocada atomicamente quando recarregada;
+    invalidate() força a recarga na próxima cotação.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_db_connection,
+        max_age: Optional[float] = None,
+        coverage: CoverageIndex = coverage_index
+    ):
+        self._connection_factory = connection_factory
+        self._coverage = coverage
+        self._max_age = Config.RATE_ENGINE_MAX_AGE if max_age is None else max_age
+        self._lock = threading.Lock()
+        self._snapshot: Optional[RateSnapshot] = None
+        self._stale = True
+
+    def invalidate(self) -> None:
+        """Marca a fotografia como desatualizada (chamar após alterar tabelas ou praças)"""
+        self._stale = True
+
+    def load(self) -> RateSnapshot:
+        """Lê as tabelas do banco e publica uma nova fotografia"""
+        conn = self._connection_factory()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT tp.id, tp.id_praca, p.nome, p.id_transportadora,
+                    tp.modal, tp.tipo_cobranca_peso, tp.prazo_entrega
+                FROM transporte.tpraca tp
+                JOIN transporte.praca p ON tp.id_praca = p.id
+                ORDER BY tp.id
+            """)
+            tables = {row[0]: TariffTable(row) for row in cursor.fetchall()}
+
+            cursor.execute("""
+                SELECT id_tpreco, tipo, id, faixa_min, faixa_max, valor, adicional_por_excedente
+                FROM transporte.tpreco_faixas
+            """)
+            faixas: Dict[Tuple[int, str], List[tuple]] = {}
+            for id_tpreco, tipo, *faixa in cursor.fetchall():
+                faixas.setdefault((id_tpreco, tipo), []).append(tuple(faixa))
+
+            for (id_tpreco, tipo), lista in faixas.items():
+                table = tables.get(id_tpreco)
+                if table:
+                    table.bands[tipo] = BandSet(lista)
+
+            cursor.execute("""
+                SELECT tt.id_tpreco, tt.id, tx.descricao, tx.sigla, ttp.sigla,
+                    tt.unidade, tt.valor, tt.obrigatoria
+                FROM transporte.tpreco_taxas tt
+                JOIN transporte.taxa_tipo ttp ON tt.id_taxa_tipo = ttp.id
+                JOIN transporte.taxa_transporte tx ON tt.id_taxa = tx.id
+                ORDER BY tt.id_tpreco, tt.id
+            """)
+            taxas: Dict[int, List[Fee]] = {}
+            for id_tpreco, *taxa in cursor.fetchall():
+                taxas.setdefault(id_tpreco, []).append(Fee(*taxa))
+
+            for id_tpreco, lista in taxas.items():
+                table = tables.get(id_tpreco)
+                if table:
+                    table.fees = tuple(lista)
+
+        finally:
+            cursor.close()
+            conn.close()
+
+        snapshot = RateSnapshot(tables)
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> RateSnapshot:
+        """Retorna a fotografia vigente, recarregando se necessário"""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and (
+            not self._max_age or time.monotonic() - snapshot.loaded_at < self._max_age
+        ):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or self._stale or (
+                self._max_age and time.monotonic() - snapshot.loaded_at >= self._max_age
+            ):
+                self._stale = False
+                try:
+                    snapshot = self.load()
+                except Exception:
+                    self._stale = True
+                    raise
+            return snapshot
+
+    def tables_for(
+        self,
+        cod_municipio: int,
+        transportadora_id: Optional[int] = None
+    ) -> List[TariffTable]:
+        """Tabelas de preço das praças que atendem o município"""
+        return self._tables(self.snapshot(), cod_municipio, transportadora_id)
+
+    def _tables(
+        self,
+        snapshot: RateSnapshot,
+        cod_municipio: int,
+        transportadora_id: Optional[int]
+    ) -> List[TariffTable]:
+        # Tabelas criadas depois da fotografia só entram na próxima recarga
+        tables = snapshot.tables
+        tables = [tables[i] for i in self._coverage.tabelas(cod_municipio) if i in tables]
+        if transportadora_id:
+            tables = [t for t in tables if t.id_transportadora == transportadora_id]
+        return tables
+
+    def _ranked_tables(
+        self,
+        snapshot: RateSnapshot,
+        cod_municipio: int,
+        transportadora_id: Optional[int],
+        ranking: QuoteRanking
+    ) -> List[Tuple[tuple, TariffTable]]:
+        """
+        Tabelas do destino em ordem de piso para o ranking, ordenadas uma vez
+        por fotografia. A chave inclui as tabelas do índice de cobertura, que
+        pode mudar sem recarregar a fotografia.
+        """
+        chave = (self._coverage.tabelas(cod_municipio), transportadora_id or None, ranking.percurso)
+        ordenadas = snapshot.ordenadas.get(chave)
+        if ordenadas is None:
+            tables = self._tables(snapshot, cod_municipio, transportadora_id)
+            ordenadas = sorted(((ranking.bound(t), t) for t in tables), key=lambda par: par[0])
+            if len(snapshot.ordenadas) >= Config.RATE_ENGINE_RANKING_CACHE:
+                snapshot.ordenadas.clear()
+            snapshot.ordenadas[chave] = ordenadas
+        return ordenadas
+
+    def quote(
+        self,
+        cod_municipio: int,
+        peso: float,
+        cubagem: float,
+        transportadora_id: Optional[int] = None,
+        ranking: Optional[QuoteRanking] = None
+    ) -> List[Dict]:
+        """Calcula o frete de todas as tabelas que atendem o município (ordenadas com ranking)"""
+        if ranking is not None:
+            snapshot = self.snapshot()
+            ordenadas = self._ranked_tables(snapshot, cod_municipio, transportadora_id, ranking)
+            return ranking.rank(ordenadas, peso, cubagem)
+
+        resultados = []
+        for table in self.tables_for(cod_municipio, transportadora_id):
+            resultado = table.price(peso, cubagem)
+            if resultado:
+                resultados.append(resultado)
+        return resultados
+
+    def quote_batch(
+        self,
+        envios: List[Tuple],
+        ranking: Optional[QuoteRanking] = None
+    ) -> List[Optional[List[Dict]]]:
+        """
+        Calcula vários envios (cod_municipio, peso, cubagem, transportadora_id) de uma vez.
+
+        Os envios são agrupados por destino/transportadora para resolver as
+        tabelas uma única vez por grupo, e pesos repetidos dentro do grupo
+        reaproveitam o mesmo cálculo. Retorna os resultados na ordem de
+        entrada; None indica que nenhuma tabela atende o destino. Com
+        ranking, cada envio recebe as cotações ordenadas e filtradas.
+        """
+        snapshot = self.snapshot()
+
+        grupos: Dict[Tuple, List[int]] = {}
+        for i, (cod_municipio, _, _, transportadora_id) in enumerate(envios):
+            grupos.setdefault((cod_municipio, transportadora_id), []).append(i)
+
+        saida: List[Optional[List[Dict]]] = [None] * len(envios)
+        for (cod_municipio, transportadora_id), indices in grupos.items():
+            if ranking is not None:
+                ordenadas = self._ranked_tables(snapshot, cod_municipio, transportadora_id, ranking)
+                if not ordenadas:
+                    continue
+            else:
+                tables = self._tables(snapshot, cod_municipio, transportadora_id)
+                if not tables:
+                    continue
+
+            calculados: Dict[Tuple[float, float], List[Dict]] = {}
+            for i in indices:
+                _, peso, cubagem, _ = envios[i]
+                resultados = calculados.get((peso, cubagem))
+                if resultados is None:
+                    if ranking is not None:
+                        resultados = ranking.rank(ordenadas, peso, cubagem)
+                    else:
+                        resultados = [r for r in (t.price(peso, cubagem) for t in tables) if r]
+                    calculados[(peso, cubagem)] = resultados
+                saida[i] = resultados
+
+        return saida
+
+
+rate_engine = RateEngine()
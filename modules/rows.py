@@ -0,0 +1,117 @@
+# rows.py
+
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Response, current_app, jsonify
+
+from modules.json_provider import FastJSONProvider
+
+
+@lru_cache(maxsize=128)
+def record_type(colunas: Tuple[str, ...]):
+    """namedtuple (sem __dict__ por instância) para as colunas de uma consulta"""
+    return namedtuple('Record', colunas, rename=True)
+
+
+class Rows:
+    """
+    Resultado de consulta em colunas: nomes e linhas em tuplas, como o cursor
+    sem dictionary=True entrega.
+
+    Colunas acrescentadas ficam à parte, como valor constante (set) ou lista
+    com um valor por linha (add/derive), sem alterar as linhas. Um dict por
+    linha só existe na serialização (dicts), consumido em lotes pelo
+    stream_array do provider JSON.
+    """
+    __slots__ = ('columns', 'rows', '_index', '_extras', '_constantes')
+
+    def __init__(self, columns: Sequence[str], rows: List[tuple]):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self._index = {nome: i for i, nome in enumerate(self.columns)}
+        self._extras: Dict[str, List[Any]] = {}
+        self._constantes: Dict[str, Any] = {}
+
+    @classmethod
+    def fetch(cls, cursor) -> 'Rows':
+        """Lê todas as linhas pendentes de um cursor de tuplas"""
+        return cls(cursor.column_names, cursor.fetchall())
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        # Uma linha como dict (ex.: Pagination.result lê total_count e o cursor)
+        linha = dict(zip(self.columns, self.rows[i]))
+        for nome, valores in self._extras.items():
+            linha[nome] = valores[i]
+        linha.update(self._constantes)
+        return linha
+
+    def column(self, nome: str) -> List[Any]:
+        """Valores de uma coluna, na ordem das linhas"""
+        if nome in self._constantes:
+            return [self._constantes[nome]] * len(self.rows)
+        if nome in self._extras:
+            return self._extras[nome]
+        i = self._index[nome]
+        return [linha[i] for linha in self.rows]
+
+    def set(self, nome: str, valor: Any) -> 'Rows':
+        """Coluna com o mesmo valor em todas as linhas (substitui a da consulta)"""
+        self._extras.pop(nome, None)
+        self._constantes[nome] = valor
+        return self
+
+    def add(self, nome: str, valores: List[Any]) -> 'Rows':
+        """Coluna com um valor por linha (substitui a da consulta)"""
+        self._constantes.pop(nome, None)
+        self._extras[nome] = valores
+        return self
+
+    def derive(self, nome: str, origem: str, funcao: Callable[[Any], Any]) -> 'Rows':
+        """Coluna calculada a partir de outra, aplicada à lista da coluna de uma vez"""
+        return self.add(nome, list(map(funcao, self.column(origem))))
+
+    def records(self) -> List[tuple]:
+        """Linhas da consulta como namedtuples (só as colunas lidas do banco)"""
+        return list(map(record_type(self.columns)._make, self.rows))
+
+    def dicts(self) -> Iterator[Dict[str, Any]]:
+        """Gera um dict por linha, com as colunas acrescentadas, para serialização"""
+        colunas = self.columns + tuple(self._extras)
+        linhas = iter(self.rows)
+        if self._extras:
+            # Repetidas no fim da tupla: no dict vale a última, a acrescentada
+            linhas = map(tuple.__add__, linhas, zip(*self._extras.values()))
+
+        constantes = self._constantes
+        if constantes:
+            return (dict(zip(colunas, linha), **constantes) for linha in linhas)
+        return (dict(zip(colunas, linha)) for linha in linhas)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return list(self.dicts())
+
+
+def rows_response(
+    chave: str,
+    rows: Rows,
+    envelope: Optional[Dict[str, Any]] = None,
+    stream: bool = False
+) -> Response:
+    """
+    Resposta {chave: [linhas...], ...envelope} serializada direto das linhas
+    em lotes. stream=True envia os lotes à medida que ficam prontos (fora do
+    cache do @conditional, que só guarda respostas inteiras).
+    """
+    provider = current_app.json
+    if not isinstance(provider, FastJSONProvider):
+        return jsonify({chave: rows.to_list(), **(envelope or {})})
+
+    partes = provider.stream_array(chave, rows.dicts(), envelope)
+    if stream:
+        return current_app.response_class(partes, mimetype=provider.mimetype)
+    return current_app.response_class(b''.join(partes), mimetype=provider.mimetype)
@@ -5,7 +5,17 @@ from flask import session, redirect, url_for
 from flask_login import current_user, logout_user
 from datetime import datetime
 import mysql.connector
+from modules.cache import TTLCache
+from modules.config import Config
 from modules.db import get_db_connection
+from modules.statements import SESSAO, statements
+
+# sid -> expiry das sessões já validadas no banco
+session_cache = TTLCache(Config.SESSION_CACHE_SIZE, Config.SESSION_CACHE_TTL)
+
+def invalidate_session(session_id):
+    """Remove a sessão do cache (chamar ao excluí-la de auth.sessions)"""
+    session_cache.delete(session_id)
 
 def session_required(f):
     @wraps(f)
@@ -18,18 +28,27 @@ def session_required(f):
             logout_user()
             return redirect(url_for('login'))
 
+        expiry = session_cache.get(session_id)
+        if expiry is not None:
+            if datetime.now() > expiry:
+                invalidate_session(session_id)
+                logout_user()
+                return redirect(url_for('login'))
+            return f(*args, **kwargs)
+
         try:
             conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM auth.sessions WHERE id = %s", (session_id,))
-            session_data = cursor.fetchone()
-            cursor.close()
+            session_data = statements.fetchone(conn, SESSAO, (session_id,))
             conn.close()
 
             if not session_data or datetime.now() > session_data['expiry']:
                 logout_user()
                 return redirect(url_for('login'))
 
+            # O cache nunca ultrapassa a expiração da própria sessão
+            restante = (session_data['expiry'] - datetime.now()).total_seconds()
+            session_cache.set(session_id, session_data['expiry'], ttl=restante)
+
         except mysql.connector.Error as err:
             print('Erro ao validar sessão:', err)
             logout_user()
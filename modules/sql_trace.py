@@ -0,0 +1,192 @@
+# sql_trace.py
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from flask import request
+
+from modules.config import Config
+from modules.db import add_observer
+
+slow_log = logging.getLogger('transporte.sql')
+
+_LITERAIS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_LISTAS_REPETIDAS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_ESPACOS = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql) -> str:
+    """
+    Forma normalizada do comando, para agrupar execuções do mesmo SQL:
+    literais e placeholders viram ?, listas (?, ?, ...) e VALUES de várias
+    linhas colapsam em (...) e os espaços são unificados.
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    texto = _LITERAIS.sub('?', str(sql))
+    texto = _LISTAS.sub('(...)', texto)
+    texto = _LISTAS_REPETIDAS.sub('(...)', texto)
+    return _ESPACOS.sub(' ', texto).strip()
+
+
+def _param_count(tipo: str, params) -> int:
+    if not params:
+        return 0
+    if tipo == 'executemany':
+        return sum(len(linha) for linha in params)
+    return len(params)
+
+
+def _rows(cursor) -> Optional[int]:
+    # rowcount só é conhecido após o buffer ou a leitura das linhas (-1 antes)
+    try:
+        linhas = cursor.rowcount
+    except Exception:
+        return None
+    return linhas if linhas is not None and linhas >= 0 else None
+
+
+class QueryTracer:
+    """
+    Rastreamento opcional dos comandos SQL de cada requisição.
+
+    Com SQL_TRACE ligado, cada comando da requisição é registrado (fingerprint,
+    quantidade de parâmetros, linhas e tempo), a resposta recebe X-Query-Count
+    e Server-Timing e o log recebe um registro por requisição com a lista de
+    comandos. Com SQL_SLOW_QUERY_MS > 0, comandos acima desse tempo vão para o
+    log de consultas lentas (JSON por linha), com ou sem o rastreamento. Com os
+    dois desligados (padrão) nenhum observador é registrado.
+    """
+
+    def __init__(self):
+        self.trace_enabled = Config.SQL_TRACE
+        self.slow_ms = Config.SQL_SLOW_QUERY_MS
+        self.repeat_warn = Config.SQL_TRACE_REPEAT_WARN
+        # Entradas da requisição em andamento nesta thread
+        self._local = threading.local()
+
+    def observe(self, tipo: str, pool: str, segundos: float, cursor, operation, params) -> None:
+        """Observador registrado em modules.db"""
+        if tipo == 'connect':
+            return
+
+        entradas = getattr(self._local, 'entradas', None)
+        lenta = self.slow_ms > 0 and segundos * 1000 >= self.slow_ms
+        if entradas is None and not lenta:
+            return
+
+        entrada = {
+            'pool': pool,
+            'fingerprint': fingerprint(operation),
+            'params': _param_count(tipo, params),
+            'ms': round(segundos * 1000, 3),
+            'lenta': lenta,
+            'cursor': cursor
+        }
+        if entradas is not None:
+            # Linhas resolvidas no fim da requisição, depois dos fetch*
+            entradas.append(entrada)
+        else:
+            self._log_slow(entrada, None)
+
+    @staticmethod
+    def _comando(entrada: Dict) -> Dict:
+        return {
+            'pool': entrada['pool'],
+            'fingerprint': entrada['fingerprint'],
+            'params': entrada['params'],
+            'linhas': _rows(entrada['cursor']),
+            'ms': entrada['ms']
+        }
+
+    def _log_slow(self, entrada: Dict, endpoint: Optional[str]) -> None:
+        slow_log.warning(json.dumps({
+            'evento': 'consulta_lenta',
+            'data_hora': datetime.now().isoformat(timespec='milliseconds'),
+            'endpoint': endpoint,
+            **self._comando(entrada)
+        }, ensure_ascii=False))
+
+    def start_request(self) -> None:
+        self._local.inicio = time.perf_counter()
+        self._local.entradas = []
+
+    def finish_request(self, response):
+        entradas: Optional[List[Dict]] = getattr(self._local, 'entradas', None)
+        if entradas is None:
+            return response
+        self._local.entradas = None
+        total_ms = (time.perf_counter() - self._local.inicio) * 1000
+        endpoint = request.endpoint
+
+        for entrada in entradas:
+            if entrada['lenta']:
+                self._log_slow(entrada, endpoint)
+
+        db_ms = sum(entrada['ms'] for entrada in entradas)
+        slow_log.info(json.dumps({
+            'evento': 'requisicao',
+            'data_hora': datetime.now().isoformat(timespec='milliseconds'),
+            'endpoint': endpoint,
+            'metodo': request.method,
+            'status': response.status_code,
+            'ms': round(total_ms, 3),
+            'db_ms': round(db_ms, 3),
+            'consultas': [self._comando(entrada) for entrada in entradas]
+        }, ensure_ascii=False))
+
+        response.headers['X-Query-Count'] = str(len(entradas))
+        timing = f'db;dur={db_ms:.1f};desc="{len(entradas)} consultas", app;dur={total_ms:.1f}'
+        existente = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existente}, {timing}' if existente else timing
+
+        # Mesmo SQL repetido muitas vezes na requisição: provável N+1
+        if self.repeat_warn and len(entradas) >= self.repeat_warn:
+            for texto, vezes in Counter(e['fingerprint'] for e in entradas).items():
+                if vezes >= self.repeat_warn:
+                    slow_log.warning(json.dumps({
+                        'evento': 'consultas_repetidas',
+                        'data_hora': datetime.now().isoformat(timespec='milliseconds'),
+                        'endpoint': endpoint,
+                        'fingerprint': texto,
+                        'vezes': vezes,
+                        'ms': round(sum(e['ms'] for e in entradas if e['fingerprint'] == texto), 3)
+                    }, ensure_ascii=False))
+        return response
+
+    def init_app(self, app) -> None:
+        """Registra o observador e os hooks conforme SQL_TRACE / SQL_SLOW_QUERY_MS"""
+        if not self.trace_enabled and self.slow_ms <= 0:
+            return
+
+        if Config.SQL_SLOW_LOG_PATH and not slow_log.handlers:
+            pasta = os.path.dirname(Config.SQL_SLOW_LOG_PATH)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            handler = RotatingFileHandler(
+                Config.SQL_SLOW_LOG_PATH, maxBytes=10 * 1024 * 1024, backupCount=5
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            slow_log.addHandler(handler)
+        if self.trace_enabled:
+            # O registro por requisição sai em INFO, as consultas lentas em WARNING
+            slow_log.setLevel(logging.INFO)
+
+        add_observer(self.observe)
+        if self.trace_enabled:
+            app.before_request(self.start_request)
+            app.after_request(self.finish_request)
+
+
+query_tracer = QueryTracer()
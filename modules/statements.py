@@ -0,0 +1,159 @@
+# statements.py
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from modules.config import Config
+
+
+class Statement:
+    """Comando registrado: nome (para as estatísticas), SQL e formato das linhas"""
+    __slots__ = ('nome', 'sql', 'dictionary')
+
+    def __init__(self, nome: str, sql: str, dictionary: bool):
+        self.nome = nome
+        # O cursor preparado só reaproveita o comando se receber o mesmo objeto str
+        self.sql = sql
+        self.dictionary = dictionary
+
+
+class StatementRegistry:
+    """
+    Comandos frequentes preparados no servidor uma vez por conexão do pool.
+
+    Os cursores preparados (protocolo binário) ficam num dicionário fraco
+    por conexão real, em ordem de uso; acima de maxsize o menos usado é
+    fechado, o que libera o comando no servidor. As contagens de
+    prepare/execute mostram quantas vezes o SQL deixou de ser interpretado,
+    não tempo economizado: no mysql-connector cada nova execução de um
+    cursor preparado envia também COM_STMT_RESET, uma ida e volta a mais
+    que a consulta em texto. Vem desligado (DB_PREPARED_STATEMENTS) e os
+    mesmos comandos rodam como texto; só vale ligar depois de medir contra
+    o MySQL real.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = Config.DB_STATEMENT_CACHE_SIZE,
+        enabled: bool = Config.DB_PREPARED_STATEMENTS
+    ):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._statements: Dict[str, Statement] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Conexão real -> OrderedDict(nome -> cursor); some junto com a conexão
+        self._por_conexao: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+    def register(self, nome: str, sql: str, dictionary: bool = True) -> Statement:
+        statement = Statement(nome, sql, dictionary)
+        with self._lock:
+            self._statements[nome] = statement
+            self._stats.setdefault(nome, {'prepares': 0, 'executes': 0, 'evictions': 0})
+        return statement
+
+    def _count(self, nome: str, chave: str) -> None:
+        with self._lock:
+            self._stats[nome][chave] += 1
+
+    def _cache(self, conn) -> OrderedDict:
+        raw = conn.raw
+        cache = self._por_conexao.get(raw)
+        if cache is None:
+            with self._lock:
+                cache = self._por_conexao.setdefault(raw, OrderedDict())
+        return cache
+
+    def _cursor(self, conn, statement: Statement):
+        """Cursor preparado da conexão para o comando, criando (e despejando) se preciso"""
+        cache = self._cache(conn)
+
+        cursor = cache.get(statement.nome)
+        if cursor is not None:
+            cache.move_to_end(statement.nome)
+            return cursor
+
+        cursor = conn.cursor(prepared=True, dictionary=statement.dictionary)
+        cache[statement.nome] = cursor
+        self._count(statement.nome, 'prepares')
+        while len(cache) > self.maxsize:
+            nome, antigo = cache.popitem(last=False)
+            antigo.close()
+            self._count(nome, 'evictions')
+        return cursor
+
+    def _run(self, conn, statement: Statement, params: tuple, metodo: str):
+        if not self.enabled:
+            cursor = conn.cursor(dictionary=statement.dictionary)
+            try:
+                cursor.execute(statement.sql, params)
+                return getattr(cursor, metodo)()
+            finally:
+                cursor.close()
+
+        cursor = self._cursor(conn, statement)
+        try:
+            cursor.execute(statement.sql, params)
+            resultado = getattr(cursor, metodo)()
+            if metodo == 'fetchone':
+                # O resultado precisa ser consumido antes do próximo comando na conexão
+                cursor.fetchall()
+        except Exception:
+            # Cursor em estado desconhecido: sai do cache e é preparado de novo
+            self._cache(conn).pop(statement.nome, None)
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            raise
+        self._count(statement.nome, 'executes')
+        return resultado
+
+    def fetchone(self, conn, statement: Statement, params: tuple = ()) -> Any:
+        return self._run(conn, statement, params, 'fetchone')
+
+    def fetchall(self, conn, statement: Statement, params: tuple = ()) -> List[Any]:
+        return self._run(conn, statement, params, 'fetchall')
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {nome: dict(contagem) for nome, contagem in self._stats.items()}
+
+
+statements = StatementRegistry()
+
+# Comandos de leitura mais frequentes (sessões, usuários e endereços por CEP)
+SESSAO = statements.register(
+    'sessao', "SELECT * FROM auth.sessions WHERE id = %s"
+)
+USUARIO_POR_ID = statements.register(
+    'usuario_por_id', "SELECT * FROM auth.users WHERE id = %s"
+)
+USUARIO_POR_NOME = statements.register(
+    'usuario_por_nome', "SELECT * FROM auth.users WHERE username = %s"
+)
+ENDERECO_POR_CEP = statements.register('endereco_por_cep', """
+    SELECT
+        e.*,
+        m.municipio,
+        m.codigoIbge,
+        es.Nome as estado_nome,
+        es.Uf,
+        b.nome as bairro_nome
+    FROM brasil.endereco e
+    JOIN brasil.municipio m ON e.codigoIbge = m.codigoIbge
+    JOIN brasil.estado es ON m.CodigoUf = es.CodigoUf
+    LEFT JOIN brasil.bairro b ON e.numeroBairro = b.numeroBairro
+    WHERE e.cep = %s
+""")
+MUNICIPIO_POR_CODIGO = statements.register('municipio_por_codigo', """
+    SELECT
+        m.*,
+        e.Nome as estado_nome,
+        e.Uf
+    FROM brasil.municipio m
+    JOIN brasil.estado e ON m.CodigoUf = e.CodigoUf
+    WHERE m.codigoIbge = %s
+""")
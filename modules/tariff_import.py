@@ -0,0 +1,388 @@
+# tariff_import.py
+
+import argparse
+import codecs
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import mysql.connector
+from modules.counters import refresh_tabela_counters, tabela_refs
+from modules.db import get_db_connection
+from modules.http_cache import bump_dataset
+from modules.quote_cache import refresh_coverage
+from modules.rate_engine import rate_engine
+from modules.tariff_writer import insert_faixas, insert_taxas, replace_faixas, replace_taxas
+from modules.validators import validate_modal_type, validate_weight_charge_type
+
+# Uma linha por faixa ou taxa; as colunas da tabela (praça, modal, ...) se
+# repetem em todas as linhas dela, que devem vir em sequência no arquivo
+COLUNAS_OBRIGATORIAS = ('id_praca', 'modal', 'tipo_cobranca_peso', 'registro', 'valor')
+
+MAX_ERROS = 100
+
+
+def _decimal(texto: Any, campo: str) -> Optional[Decimal]:
+    """Converte números no formato 1234.56 ou 1.234,56; vazio vira None"""
+    if texto is None or isinstance(texto, (int, float, Decimal)):
+        return None if texto is None else Decimal(str(texto))
+    texto = str(texto).strip()
+    if not texto:
+        return None
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f'{campo} inválido: {texto}')
+
+
+def _inteiro(texto: Any, campo: str) -> Optional[int]:
+    valor = _decimal(texto, campo)
+    if valor is None:
+        return None
+    if valor != valor.to_integral_value():
+        raise ValueError(f'{campo} deve ser inteiro: {texto}')
+    return int(valor)
+
+
+def _texto(valor: Any) -> Optional[str]:
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _csv_rows(stream: BinaryIO, encoding: str) -> Iterator[List[str]]:
+    """Lê o CSV em streaming; detecta ; , ou tab pela linha de cabeçalho"""
+    texto = codecs.getreader(encoding)(stream)
+    cabecalho = texto.readline()
+    delimitador = max(';,\t', key=cabecalho.count)
+    yield next(csv.reader([cabecalho], delimiter=delimitador))
+    yield from csv.reader(texto, delimiter=delimitador)
+
+
+def _xlsx_rows(stream: BinaryIO) -> Iterator[Tuple[Any, ...]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Importação de XLSX requer o pacote openpyxl')
+
+    # read_only lê as linhas sob demanda, sem montar a planilha inteira
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(stream: BinaryIO, filename: str, encoding: str = 'utf-8-sig') -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Gera (número da linha, dados) a partir de um CSV ou XLSX. encoding vale
+    para o CSV (ex.: cp1252 nas exportações do Excel em português).
+    """
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise ValueError(f'Codificação desconhecida: {encoding}')
+
+    if filename.lower().endswith('.xlsx'):
+        linhas = _xlsx_rows(stream)
+    elif filename.lower().endswith(('.csv', '.txt')):
+        linhas = _csv_rows(stream, encoding)
+    else:
+        raise ValueError('Formato não suportado (use .csv ou .xlsx)')
+
+    cabecalho = [
+        (_texto(c) or '').lower().replace('ç', 'c')
+        for c in next(linhas, [])
+    ]
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in cabecalho]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias faltando: {', '.join(faltando)}")
+
+    def gerar():
+        for numero, valores in enumerate(linhas, start=2):
+            if not any(_texto(v) for v in valores):
+                continue
+            yield numero, dict(zip(cabecalho, valores))
+
+    return gerar()
+
+
+class TariffImport:
+    """
+    Carga de tabelas de preço a partir de linhas já lidas do arquivo.
+
+    Cada tabela (id_praca, modal) é montada em memória só enquanto suas
+    linhas chegam; ao mudar de tabela ela é gravada com INSERTs de várias
+    linhas. Uma tabela existente tem cabeçalho, faixas e taxas substituídos.
+    O commit acontece a cada chunk_size linhas (sempre entre tabelas), e
+    tabelas com qualquer linha inválida não são gravadas.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable = get_db_connection,
+        chunk_size: int = 5000,
+        dry_run: bool = False
+    ):
+        self._connection_factory = connection_factory
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.totais = {
+            'linhas': 0,
+            'tabelas_inseridas': 0,
+            'tabelas_atualizadas': 0,
+            'tabelas_rejeitadas': 0,
+            'faixas': 0,
+            'taxas': 0
+        }
+        self.erros: List[Dict[str, Any]] = []
+        # Ids existentes, lidos em _load_refs para validar as linhas
+        self.pracas_validas = set()
+        self.taxa_tipos = set()
+        self.taxas = set()
+        # Praças com tabelas gravadas, para invalidar as cotações no fim
+        self.pracas = set()
+
+    def _erro(self, linha: Optional[int], mensagem: str) -> None:
+        if len(self.erros) < MAX_ERROS:
+            self.erros.append({'linha': linha, 'erro': mensagem})
+
+    def _progresso(self, concluido: bool = False) -> Dict[str, Any]:
+        return dict(self.totais, erros=len(self.erros), concluido=concluido)
+
+    def _load_refs(self, cursor) -> None:
+        """Ids válidos de praça e taxas, para validar sem depender de erro de FK"""
+        cursor.execute("SELECT id FROM transporte.praca")
+        self.pracas_validas = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT id FROM transporte.taxa_tipo")
+        self.taxa_tipos = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT id FROM transporte.taxa_transporte")
+        self.taxas = {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def _chave(row: Dict[str, Any]) -> tuple:
+        """Identifica a tabela da linha: (id_praca, modal)"""
+        return (_texto(row.get('id_praca')), _texto(row.get('modal')))
+
+    def _parse(self, row: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
+        """Valida a linha; retorna (cabeçalho da tabela, registro, item)"""
+        id_praca = _inteiro(row.get('id_praca'), 'id_praca')
+        modal = _texto(row.get('modal'))
+        tipo_cobranca = _texto(row.get('tipo_cobranca_peso'))
+
+        if id_praca not in self.pracas_validas:
+            raise ValueError(f'Praça não encontrada: {id_praca}')
+        if not validate_modal_type(modal):
+            raise ValueError(f'Modal inválido: {modal}')
+        if not validate_weight_charge_type(tipo_cobranca):
+            raise ValueError(f'Tipo de cobrança inválido: {tipo_cobranca}')
+
+        cabecalho = {
+            'id_praca': id_praca,
+            'praça': _texto(row.get('praca')) or '',
+            'modal': modal,
+            'tipo_cobranca_peso': tipo_cobranca,
+            'prazo_entrega': _inteiro(row.get('prazo_entrega'), 'prazo_entrega'),
+            'entrega_tipo': _texto(row.get('entrega_tipo')),
+            'observacoes': _texto(row.get('observacoes'))
+        }
+
+        registro = (_texto(row.get('registro')) or '').lower()
+        valor = _decimal(row.get('valor'), 'valor')
+        if valor is None:
+            raise ValueError('valor é obrigatório')
+
+        if registro == 'faixa':
+            tipo = (_texto(row.get('tipo')) or '').lower()
+            if tipo not in ('peso', 'cubagem'):
+                raise ValueError(f'Tipo de faixa inválido: {tipo}')
+            faixa_min = _decimal(row.get('faixa_min'), 'faixa_min')
+            faixa_max = _decimal(row.get('faixa_max'), 'faixa_max')
+            if faixa_min is None:
+                raise ValueError('faixa_min é obrigatório')
+            if faixa_max is not None and faixa_max < faixa_min:
+                raise ValueError('faixa_max menor que faixa_min')
+            item = {
+                'tipo': tipo,
+                'faixa_min': faixa_min,
+                'faixa_max': faixa_max,
+                'valor': valor,
+                'adicional_por_excedente': _decimal(row.get('adicional_por_excedente'), 'adicional_por_excedente')
+            }
+        elif registro == 'taxa':
+            id_taxa_tipo = _inteiro(row.get('id_taxa_tipo'), 'id_taxa_tipo')
+            id_taxa = _inteiro(row.get('id_taxa'), 'id_taxa')
+            if id_taxa_tipo not in self.taxa_tipos:
+                raise ValueError(f'Tipo de taxa não encontrado: {id_taxa_tipo}')
+            if id_taxa not in self.taxas:
+                raise ValueError(f'Taxa não encontrada: {id_taxa}')
+            item = {
+                'id_taxa_tipo': id_taxa_tipo,
+                'id_taxa': id_taxa,
+                'id_transportadora': _inteiro(row.get('id_transportadora'), 'id_transportadora'),
+                'valor': valor,
+                'unidade': _texto(row.get('unidade')),
+                'obrigatoria': (_texto(row.get('obrigatoria')) or '').lower() in ('1', 's', 'sim', 'true')
+            }
+        else:
+            raise ValueError(f'registro deve ser faixa ou taxa: {registro}')
+
+        return cabecalho, registro, item
+
+    def _save(self, cursor, conn, cabecalho: Dict[str, Any], faixas: list, taxas: list) -> None:
+        """Grava uma tabela completa (sem commit)"""
+        campos = (
+            cabecalho['praça'], cabecalho['tipo_cobranca_peso'], cabecalho['observacoes'],
+            cabecalho['prazo_entrega'], cabecalho['entrega_tipo']
+        )
+        cursor.execute("""
+            SELECT id FROM transporte.tpraca
+            WHERE id_praca = %s AND modal = %s
+        """, (cabecalho['id_praca'], cabecalho['modal']))
+        existente = cursor.fetchone()
+
+        if existente:
+            tabela_id = existente[0]
+            antes = tabela_refs(conn, tabela_id)
+            cursor.execute("""
+                UPDATE transporte.tpraca SET
+                    praça = %s,
+                    tipo_cobranca_peso = %s,
+                    observacoes = %s,
+                    prazo_entrega = %s,
+                    entrega_tipo = %s
+                WHERE id = %s
+            """, campos + (tabela_id,))
+            replace_faixas(cursor, tabela_id, faixas)
+            replace_taxas(cursor, tabela_id, taxas)
+            refresh_tabela_counters(conn, tabela_id, antes)
+            self.totais['tabelas_atualizadas'] += 1
+        else:
+            cursor.execute("""
+                INSERT INTO transporte.tpraca (
+                    id_praca, modal, praça, tipo_cobranca_peso,
+                    observacoes, prazo_entrega, entrega_tipo
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (cabecalho['id_praca'], cabecalho['modal']) + campos)
+            tabela_id = cursor.lastrowid
+            insert_faixas(cursor, tabela_id, faixas)
+            insert_taxas(cursor, tabela_id, taxas)
+            refresh_tabela_counters(conn, tabela_id)
+            self.totais['tabelas_inseridas'] += 1
+
+        self.pracas.add(cabecalho['id_praca'])
+        self.totais['faixas'] += len(faixas)
+        self.totais['taxas'] += len(taxas)
+
+    def run_iter(self, rows: Iterator[Tuple[int, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """Executa a carga gerando o progresso a cada commit; o último item é o resumo"""
+        conn = self._connection_factory()
+        cursor = conn.cursor()
+        vistas = set()
+        confirmados = dict(self.totais)
+        pendentes = 0
+        numero = None
+
+        atual = None  # [chave, cabeçalho, faixas, taxas, válida]
+
+        def fechar():
+            chave, cabecalho, faixas, taxas, valida = atual
+            if chave in vistas:
+                self._erro(None, f'Linhas da tabela {chave} não estão em sequência no arquivo')
+                valida = False
+            vistas.add(chave)
+            if not valida:
+                self.totais['tabelas_rejeitadas'] += 1
+            elif not self.dry_run:
+                self._save(cursor, conn, cabecalho, faixas, taxas)
+
+        try:
+            self._load_refs(cursor)
+
+            for numero, row in rows:
+                self.totais['linhas'] += 1
+                chave = self._chave(row)
+
+                if atual is None or atual[0] != chave:
+                    if atual is not None:
+                        fechar()
+                        if pendentes >= self.chunk_size:
+                            conn.commit()
+                            confirmados = dict(self.totais)
+                            pendentes = 0
+                            yield self._progresso()
+                    atual = [chave, None, [], [], True]
+
+                try:
+                    cabecalho, registro, item = self._parse(row)
+                except ValueError as err:
+                    self._erro(numero, str(err))
+                    atual[4] = False
+                    continue
+
+                if atual[1] is None:
+                    atual[1] = cabecalho
+                (atual[2] if registro == 'faixa' else atual[3]).append(item)
+                pendentes += 1
+
+            if atual is not None:
+                fechar()
+            conn.commit()
+
+        except mysql.connector.Error as err:
+            # O lote em andamento é desfeito; os já confirmados permanecem
+            conn.rollback()
+            self.totais = dict(confirmados, linhas=self.totais['linhas'])
+            self._erro(None, f'Erro no banco de dados, carga interrompida: {err}')
+
+        except (UnicodeError, csv.Error, ValueError) as err:
+            # Arquivo ilegível no meio da leitura (ex.: codificação errada
+            # depois do primeiro lote): mesmo tratamento do erro de banco
+            conn.rollback()
+            self.totais = dict(confirmados, linhas=self.totais['linhas'])
+            self._erro(numero, f'Erro ao ler o arquivo após a linha {numero or 1}, carga interrompida: {err}')
+
+        finally:
+            cursor.close()
+            if not self.dry_run:
+                rate_engine.invalidate()
+                bump_dataset('taxa_tipos', 'taxa_transportes')
+                refresh_coverage(conn, self.pracas)
+            conn.close()
+
+        resumo = self._progresso(concluido=True)
+        resumo['detalhes_erros'] = self.erros
+        yield resumo
+
+    def run(self, rows: Iterator[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        resumo = None
+        for resumo in self.run_iter(rows):
+            pass
+        return resumo
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importa tabelas de preço de um CSV ou XLSX')
+    parser.add_argument('arquivo')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--encoding', default='utf-8-sig', help='codificação do CSV (ex.: cp1252)')
+    parser.add_argument('--dry-run', action='store_true', help='só valida, sem gravar')
+    args = parser.parse_args()
+
+    with open(args.arquivo, 'rb') as arquivo:
+        try:
+            linhas = read_rows(arquivo, args.arquivo, args.encoding)
+        except (UnicodeError, csv.Error, ValueError) as err:
+            parser.error(str(err))
+
+        importacao = TariffImport(chunk_size=args.chunk_size, dry_run=args.dry_run)
+        for evento in importacao.run_iter(linhas):
+            if evento['concluido']:
+                print(json.dumps(evento, ensure_ascii=False, indent=2))
+            else:
+                print(json.dumps(evento), file=sys.stderr)
@@ -0,0 +1,232 @@
+# tariff_writer.py
+
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Tuple
+
+INSERT_FAIXA = """
+    INSERT INTO transporte.tpreco_faixas (
+        id_tpreco, tipo, faixa_min, faixa_max,
+        valor, adicional_por_excedente
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_TAXA = """
+    INSERT INTO transporte.tpreco_taxas (
+        id_taxa_tipo, id_tpreco, id_transportadora,
+        id_taxa, valor, unidade, obrigatoria
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Campos comparados no modo diff (além da chave de cada linha)
+FAIXA_CAMPOS = ('valor', 'adicional_por_excedente')
+TAXA_CAMPOS = ('id_transportadora', 'valor', 'unidade', 'obrigatoria')
+
+
+def _numero(valor: Any) -> Any:
+    """Normaliza números para comparar o que veio do JSON com o que está no banco"""
+    if valor is None or isinstance(valor, bool):
+        return valor
+    try:
+        return Decimal(str(valor)).normalize()
+    except (InvalidOperation, ValueError):
+        return valor
+
+
+def _id(valor: Any) -> Any:
+    """Normaliza ids da chave (o JSON pode trazer "3" onde o banco tem 3)"""
+    if valor is None or isinstance(valor, bool):
+        return valor
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+def _flag(valor: Any) -> bool:
+    """Lê obrigatoria como o importador: bool/int direto; texto vale 1, s, sim ou true"""
+    if valor is None:
+        return False
+    if isinstance(valor, (bool, int)):
+        return bool(valor)
+    return str(valor).strip().lower() in ('1', 's', 'sim', 'true')
+
+
+def _faixa_row(tabela_id: int, faixa: Dict[str, Any]) -> tuple:
+    return (
+        tabela_id,
+        faixa.get('tipo'),
+        faixa.get('faixa_min'),
+        faixa.get('faixa_max'),
+        faixa.get('valor'),
+        faixa.get('adicional_por_excedente')
+    )
+
+
+def _taxa_row(tabela_id: int, taxa: Dict[str, Any]) -> tuple:
+    return (
+        taxa.get('id_taxa_tipo'),
+        tabela_id,
+        taxa.get('id_transportadora'),
+        taxa.get('id_taxa'),
+        taxa.get('valor'),
+        taxa.get('unidade'),
+        _flag(taxa.get('obrigatoria'))
+    )
+
+
+def insert_faixas(cursor, tabela_id: int, faixas: List[Dict[str, Any]]) -> int:
+    """Insere todas as faixas com um único INSERT de várias linhas"""
+    if not faixas:
+        return 0
+    cursor.executemany(INSERT_FAIXA, [_faixa_row(tabela_id, f) for f in faixas])
+    return len(faixas)
+
+
+def insert_taxas(cursor, tabela_id: int, taxas: List[Dict[str, Any]]) -> int:
+    """Insere todas as taxas com um único INSERT de várias linhas"""
+    if not taxas:
+        return 0
+    cursor.executemany(INSERT_TAXA, [_taxa_row(tabela_id, t) for t in taxas])
+    return len(taxas)
+
+
+def replace_faixas(cursor, tabela_id: int, faixas: List[Dict[str, Any]]) -> int:
+    cursor.execute(
+        "DELETE FROM transporte.tpreco_faixas WHERE id_tpreco = %s",
+        (tabela_id,)
+    )
+    return insert_faixas(cursor, tabela_id, faixas)
+
+
+def replace_taxas(cursor, tabela_id: int, taxas: List[Dict[str, Any]]) -> int:
+    cursor.execute(
+        "DELETE FROM transporte.tpreco_taxas WHERE id_tpreco = %s",
+        (tabela_id,)
+    )
+    return insert_taxas(cursor, tabela_id, taxas)
+
+
+def _diff(
+    atuais: Dict[tuple, List[Tuple[int, Dict[str, Any]]]],
+    novos: List[Dict[str, Any]],
+    chave,
+    campos: Tuple[str, ...]
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Dict[str, Any]]], List[int]]:
+    """
+    Separa o que inserir, o que atualizar (id, dados) e os ids a remover.
+
+    Chaves repetidas são colapsadas: no pedido vale a última ocorrência e,
+    no banco (atuais traz todas as linhas de cada chave), a primeira linha
+    é mantida e as demais são removidas.
+    """
+    inserir, atualizar, remover = [], [], []
+    restantes = dict(atuais)
+
+    unicos: Dict[tuple, Dict[str, Any]] = {}
+    for item in novos:
+        unicos[chave(item)] = item
+
+    for k, item in unicos.items():
+        linhas = restantes.pop(k, None)
+        if not linhas:
+            inserir.append(item)
+            continue
+        (row_id, valores), *repetidas = linhas
+        remover.extend(repetida_id for repetida_id, _ in repetidas)
+        if any(_numero(item.get(c)) != _numero(valores[c]) for c in campos):
+            atualizar.append((row_id, item))
+
+    remover.extend(row_id for linhas in restantes.values() for row_id, _ in linhas)
+    return inserir, atualizar, remover
+
+
+def sync_faixas(cursor, tabela_id: int, faixas: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Aplica só as diferenças entre as faixas gravadas e as informadas.
+
+    As faixas são casadas por (tipo, faixa_min, faixa_max); mudou só o valor
+    ou o adicional, a linha é atualizada no lugar e mantém o id.
+    """
+    cursor.execute("""
+        SELECT id, tipo, faixa_min, faixa_max, valor, adicional_por_excedente
+        FROM transporte.tpreco_faixas
+        WHERE id_tpreco = %s
+        ORDER BY id
+    """, (tabela_id,))
+
+    def chave(f):
+        return (f.get('tipo'), _numero(f.get('faixa_min')), _numero(f.get('faixa_max')))
+
+    atuais = {}
+    for row_id, tipo, faixa_min, faixa_max, valor, adicional in cursor.fetchall():
+        dados = {
+            'tipo': tipo,
+            'faixa_min': faixa_min,
+            'faixa_max': faixa_max,
+            'valor': valor,
+            'adicional_por_excedente': adicional
+        }
+        atuais.setdefault(chave(dados), []).append((row_id, dados))
+
+    inserir, atualizar, remover = _diff(atuais, faixas, chave, FAIXA_CAMPOS)
+
+    if remover:
+        cursor.execute(
+            f"DELETE FROM transporte.tpreco_faixas WHERE id IN ({', '.join(['%s'] * len(remover))})",
+            remover
+        )
+    if atualizar:
+        cursor.executemany("""
+            UPDATE transporte.tpreco_faixas
+            SET valor = %s, adicional_por_excedente = %s
+            WHERE id = %s
+        """, [(f.get('valor'), f.get('adicional_por_excedente'), row_id) for row_id, f in atualizar])
+    insert_faixas(cursor, tabela_id, inserir)
+
+    return {'inseridas': len(inserir), 'atualizadas': len(atualizar), 'removidas': len(remover)}
+
+
+def sync_taxas(cursor, tabela_id: int, taxas: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Como sync_faixas, casando as taxas por (id_taxa_tipo, id_taxa)"""
+    cursor.execute("""
+        SELECT id, id_taxa_tipo, id_taxa, id_transportadora, valor, unidade, obrigatoria
+        FROM transporte.tpreco_taxas
+        WHERE id_tpreco = %s
+        ORDER BY id
+    """, (tabela_id,))
+
+    def chave(t):
+        return (_id(t.get('id_taxa_tipo')), _id(t.get('id_taxa')))
+
+    atuais = {}
+    for row_id, tipo, taxa, transportadora, valor, unidade, obrigatoria in cursor.fetchall():
+        dados = {
+            'id_taxa_tipo': tipo,
+            'id_taxa': taxa,
+            'id_transportadora': transportadora,
+            'valor': valor,
+            'unidade': unidade,
+            'obrigatoria': bool(obrigatoria)
+        }
+        atuais.setdefault(chave(dados), []).append((row_id, dados))
+
+    novas = [dict(t, obrigatoria=_flag(t.get('obrigatoria'))) for t in taxas]
+    inserir, atualizar, remover = _diff(atuais, novas, chave, TAXA_CAMPOS)
+
+    if remover:
+        cursor.execute(
+            f"DELETE FROM transporte.tpreco_taxas WHERE id IN ({', '.join(['%s'] * len(remover))})",
+            remover
+        )
+    if atualizar:
+        cursor.executemany("""
+            UPDATE transporte.tpreco_taxas
+            SET id_transportadora = %s, valor = %s, unidade = %s, obrigatoria = %s
+            WHERE id = %s
+        """, [
+            (t.get('id_transportadora'), t.get('valor'), t.get('unidade'), t['obrigatoria'], row_id)
+            for row_id, t in atualizar
+        ])
+    insert_taxas(cursor, tabela_id, inserir)
+
+    return {'inseridas': len(inserir), 'atualizadas': len(atualizar), 'removidas': len(remover)}
@@ -0,0 +1,42 @@
+# validators.py
+
+import re
+
+# Modais aceitos: códigos gravados em tpraca e os valores usados pelo formulário
+MODAIS = ('R', 'A', 'F', 'rodoviario', 'aereo', 'maritimo')
+
+TIPOS_COBRANCA_PESO = ('peso', 'cubagem', 'ambos')
+
+
+def validate_cnpj(cnpj: str) -> bool:
+    """Valida os dígitos verificadores do CNPJ (aceita com ou sem máscara)"""
+    numeros = re.sub(r'\D', '', cnpj or '')
+    if len(numeros) != 14 or numeros == numeros[0] * 14:
+        return False
+
+    def digito(base: str) -> str:
+        pesos = list(range(len(base) - 7, 1, -1)) + list(range(9, 1, -1))
+        resto = sum(int(n) * p for n, p in zip(base, pesos)) % 11
+        return '0' if resto < 2 else str(11 - resto)
+
+    primeiro = digito(numeros[:12])
+    return numeros[12:] == primeiro + digito(numeros[:12] + primeiro)
+
+
+def validate_cep(cep: str) -> bool:
+    return len(re.sub(r'\D', '', cep or '')) == 8
+
+
+def validate_application_type(aplicacao: str) -> bool:
+    """Aplicação da taxa: um ou mais tipos separados por vírgula"""
+    if not aplicacao:
+        return False
+    return all(re.fullmatch(r'\w+', item.strip()) for item in aplicacao.split(','))
+
+
+def validate_modal_type(modal: str) -> bool:
+    return modal in MODAIS
+
+
+def validate_weight_charge_type(tipo: str) -> bool:
+    return tipo in TIPOS_COBRANCA_PESO